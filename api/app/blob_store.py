@@ -0,0 +1,32 @@
+from functools import lru_cache
+from pathlib import Path
+
+from loguru import logger
+
+
+class BlobReader:
+    """读取scraper写入的按内容寻址的正文(见scraper/app/blob_store.py)
+
+    CSV字段中的 blob:sha256:<哈希> 引用只在需要正文时才解析; blob写入后不再改变,
+    因此读到的正文可以放心缓存。
+    """
+
+    PREFIX = 'blob:sha256:'
+
+    def __init__(self, blob_dir: Path, cache_size: int = 256):
+        self.blob_dir = blob_dir
+        self._read = lru_cache(maxsize=cache_size)(self._read_blob)
+
+    def _read_blob(self, digest: str) -> str:
+        with open(self.blob_dir / digest[:2] / f"{digest}.txt", 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def resolve(self, value: str) -> str:
+        """把CSV中的值还原为正文, 不是引用时原样返回"""
+        if not value or not value.startswith(self.PREFIX):
+            return value
+        try:
+            return self._read(value[len(self.PREFIX):])
+        except FileNotFoundError:
+            logger.warning(f"Missing blob for {value}")
+            return value
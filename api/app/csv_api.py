@@ -1,201 +1,586 @@
-from fastapi import FastAPI, Query, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Query, HTTPException, BackgroundTasks, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timezone
 from pydantic import BaseModel
-import json
+from functools import lru_cache
+import heapq
 import uuid
 import httpx
-import yaml
 import csv
-from pathlib import Path
+import os
+from pathlib import Path, PurePosixPath
 from loguru import logger
 
+from .config import settings
+from .csv_files import (
+    list_partitions, open_data_text, partition_start, read_json,
+    read_rows_at, resolve_data_file
+)
+from .blob_store import BlobReader
+from .csv_cache import CSVFileCache
+from .csv_index import RowIndexReader
+from .csv_export import ConversationRowStream, iter_table_rows
+from .domain_rollup import DomainRollupReader, domain_rankings
+from .entity_index import EntityIndexReader, entity_rankings
+from .run_timeseries import RunTimeseriesReader, bucket_start_hour, parse_bucket, run_timeseries
+from .cursors import RunCursor
+from .encoding import CompressionMiddleware, FastJSONResponse, dumps
+from .events import EventBroadcaster, stats_delta
+from .executor import StorageExecutor
+from .http_cache import (
+    IMMUTABLE_CACHE_CONTROL, conditional_json, is_not_modified, make_etag, not_modified, parse_timestamp,
+    validator_headers
+)
+from .metrics import LatencyMiddleware, metrics_response
+from .projection import parse_fields
+from .question_registry import get_registry
+from .search_index import SearchIndexReader, best_snippet, rank, tokenize
+from .sqlite_storage import SimpleSQLiteStorage
+
 # 简化的CSV存储类
 class SimpleCSVStorage:
-    def __init__(self, data_dir: str = "/app/data"):
+    # 倒序读取对话时容忍的乱序行数
+    OUT_OF_ORDER_SLACK = 32
+    
+    def __init__(self, data_dir: str = "/app/data", partition_format: str = "%Y-%m"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
-        # CSV文件路径
-        self.conversations_file = self.data_dir / "conversations.csv"
-        self.messages_file = self.data_dir / "messages.csv"
-        self.web_searches_file = self.data_dir / "web_searches.csv"
+        # scraper按时间把数据写入分区子目录(如 2025-07/), 根目录下的旧文件是最旧的分区
+        self.partition_format = partition_format
+        self.status_journal_file = self.data_dir / "conversation_status.csv"
         
-        # CSV模块已在顶部导入
-    
-    def get_conversations(self, limit: int = 100):
-        """获取对话列表"""
-        conversations = []
-        if not self.conversations_file.exists():
-            return conversations
+        # scraper维护的行偏移索引与统计计数器
+        self.row_index = RowIndexReader(self.data_dir / "_meta" / "row_index.csv")
+        self.stats_file = self.data_dir / "_meta" / "stats.json"
+        # scraper维护的全文检索倒排索引
+        self.search_index = SearchIndexReader(self.data_dir / "_meta" / "search_postings.csv")
+        # scraper在运行完成时维护的按(问题, 域名, 日期)的引用汇总
+        self.domain_rollup = DomainRollupReader(self.data_dir / "_meta" / "domain_rollup.csv")
+        # scraper在运行完成时从回答中提取的排名实体
+        self.entity_index = EntityIndexReader(self.data_dir / "_meta" / "ranked_entities.csv")
+        # scraper维护的按小时运行数、完成数和耗时直方图
+        self.run_timeseries = RunTimeseriesReader(self.data_dir / "_meta" / "run_timeseries.csv")
         
-        with open(self.conversations_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            
-        # 按开始时间倒序排序
-        rows.sort(key=lambda x: x.get('started_at', ''), reverse=True)
+        # 长正文保存在按内容寻址的blob中, 读取详情时才解析
+        self.blobs = BlobReader(self.data_dir / "_blobs")
         
-        for row in rows[:limit]:
-            duration_seconds = None
-            if row.get('finished_at') and row.get('started_at'):
-                try:
-                    start = datetime.fromisoformat(row['started_at'])
-                    finish = datetime.fromisoformat(row['finished_at'])
-                    duration_seconds = (finish - start).total_seconds()
-                except:
-                    pass
-            
-            conversations.append({
-                'id': int(row['id']) if row.get('id') else 0,
-                'run_uuid': row.get('run_uuid', ''),
-                'question_id': int(row['question_id']) if row.get('question_id') else None,
-                'question_text': row.get('question_text', ''),
-                'started_at': row.get('started_at') if row.get('started_at') else None,
-                'finished_at': row.get('finished_at') if row.get('finished_at') else None,
-                'duration_seconds': duration_seconds
-            })
+        # 问题池, 用于统计问题数量
+        self.questions_file = self.data_dir / "geo_questions.yaml"
         
-        return conversations
-    
-    def get_conversation_details(self, run_uuid: str):
-        """获取对话详情"""
-        # 找到对话
-        conversation = None
-        if self.conversations_file.exists():
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get('run_uuid') == run_uuid:
-                        conversation = row
-                        break
-        
-        if not conversation:
-            return None
+        # 未压缩数据文件的增量读取缓存, 每次请求只解析新追加的数据; 按LRU限制总量
+        self._cache = CSVFileCache(settings.csv_cache_max_mb * 1024 * 1024)
+        # 归档分区不再变化, 缓存最近翻页用到的几个分区的对话行
+        self._archived_rows = lru_cache(maxsize=4)(self._read_archived)
+    
+    def _table_file(self, table, partition=''):
+        """某个分区中一张表的文件路径"""
+        return self.data_dir / partition / f"{table}.csv"
+    
+    def partitions(self):
+        """所有分区, 从旧到新"""
+        return list_partitions(self.data_dir)
+    
+    def data_version(self):
+        """数据状态的廉价指纹, 返回(指纹, 最后修改时间)
         
-        conversation_id = int(conversation['id']) if conversation.get('id') else 0
+        scraper每写入一行数据都会追加行索引, 完成对话时追加状态日志, 因此这些文件和各分区
+        对话文件的(inode, 大小, 修改时间)变化即表示数据变化; 只stat文件, 不读取内容。
+        """
+        files = [self._table_file('conversations', partition) for partition in self.partitions()]
+        files += [self.status_journal_file, self.row_index.path, self.stats_file, self.questions_file,
+                  self.search_index.path, self.domain_rollup.path, self.entity_index.path, self.run_timeseries.path]
+        version = []
+        latest = 0
+        for data_file in files:
+            path = resolve_data_file(data_file) if data_file.suffix == '.csv' else data_file
+            try:
+                st = os.stat(path)
+            except (FileNotFoundError, TypeError):
+                version.append((str(data_file), None))
+                continue
+            version.append((str(path), st.st_ino, st.st_size, st.st_mtime_ns))
+            latest = max(latest, st.st_mtime_ns)
+        last_modified = datetime.fromtimestamp(latest / 1e9, timezone.utc) if latest else None
+        return tuple(version), last_modified
+    
+    def _scan(self, csv_file):
+        """读取表文件的全部行: 未压缩的文件走增量缓存, 归档的压缩文件流式读取"""
+        path = resolve_data_file(csv_file)
+        if path is None:
+            return []
+        if path == csv_file:
+            return self._cache.rows(csv_file)
+        with open_data_text(csv_file) as f:
+            return list(csv.DictReader(f))
+    
+    def _conversation_rows(self, partition):
+        """一个分区的全部对话行(文件顺序): 未压缩的文件走增量缓存, 归档文件按(路径, 修改时间)缓存"""
+        csv_file = self._table_file('conversations', partition)
+        path = resolve_data_file(csv_file)
+        if path is None:
+            return []
+        if path == csv_file:
+            return self._cache.rows(csv_file)
+        st = os.stat(path)
+        return self._archived_rows(csv_file, st.st_mtime_ns, st.st_size)
+    
+    def _read_archived(self, csv_file, mtime_ns, size):
+        with open_data_text(csv_file) as f:
+            return list(csv.DictReader(f))
+    
+    def _read_status_journal(self):
+        """读取scraper写入的对话状态日志, 返回 conversation_id -> {字段: 最新值}"""
+        status = {}
+        for row in self._cache.rows(self.status_journal_file):
+            try:
+                conversation_id = int(row.get('conversation_id', ''))
+            except ValueError:
+                continue
+            status.setdefault(conversation_id, {})[row.get('field', '')] = row.get('value', '')
+        return status
+    
+    @staticmethod
+    def _apply_status(row, status):
+        """把状态日志中的更新合并到对话行, 返回新的字典(缓存中的行不能修改)"""
+        try:
+            updates = status.get(int(row.get('id', '')))
+        except ValueError:
+            return row
+        if updates:
+            row = dict(row)
+            row.update({field: value for field, value in updates.items() if field in row})
+        return row
+    
+    @staticmethod
+    def _row_key(row):
+        """对话的排序键(started_at, id)"""
+        try:
+            return row.get('started_at', ''), int(row.get('id', ''))
+        except ValueError:
+            return row.get('started_at', ''), 0
+    
+    def _resume_position(self, rows, cursor):
+        """从游标所在行之后OUT_OF_ORDER_SLACK行处继续向前读; 提示与文件内容不符时从分区末尾开始"""
+        position = cursor.position
+        if 0 <= position < len(rows) and self._row_key(rows[position]) == cursor.key:
+            return min(len(rows), position + 1 + self.OUT_OF_ORDER_SLACK)
+        return len(rows)
+    
+    def _recent_conversation_rows(self, limit, since=None, cursor=None):
+        """按(started_at, id)倒序返回最多limit条对话, 每项为(排序键, 分区, 行序号, 行)
         
-        # 获取消息
-        messages = []
-        if self.messages_file.exists():
-            with open(self.messages_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row.get('conversation_id', 0)) == conversation_id:
-                            messages.append({
-                                'id': int(row['id']) if row.get('id') else 0,
-                                'role': row.get('role', ''),
-                                'content': row.get('content_md', ''),
-                                'scraped_at': row.get('scraped_at', '')
-                            })
+        对话按开始时间顺序追加, 因此从最新分区的文件末尾向前读, 用大小为limit的小顶堆
+        容纳少量乱序行; 连续OUT_OF_ORDER_SLACK行都比堆中最旧的一行更旧(或早于since)时停止,
+        代价与limit成正比, 与历史总量无关。有游标时跳过更新的分区, 并从游标所在行附近
+        继续读, 逐页遍历全部历史的总代价与历史总量成线性关系。
+        """
+        if limit <= 0:
+            return []
+        # started_at统一以UTC的ISO格式保存, 可以直接按字符串比较
+        since_key = since.astimezone(timezone.utc).isoformat() if since else None
+        before = cursor.key if cursor else None
+        heap = []
+        partitions = self.partitions()
+        if cursor is not None and cursor.partition in partitions:
+            # 对话写入开始时间所在的分区, 更新的分区中的对话都已在之前的页里
+            partitions = partitions[:partitions.index(cursor.partition) + 1]
+        for partition in reversed(partitions):
+            rows = self._conversation_rows(partition)
+            start = len(rows)
+            if cursor is not None and cursor.partition == partition:
+                start = self._resume_position(rows, cursor)
+            older = 0
+            for position in range(start - 1, -1, -1):
+                row = rows[position]
+                key = self._row_key(row)
+                if before is not None and key >= before:
+                    continue
+                if since_key is not None and key[0] < since_key:
+                    older += 1
+                elif len(heap) < limit:
+                    heapq.heappush(heap, (key, partition, position, row))
+                    older = 0
+                elif key > heap[0][0]:
+                    heapq.heapreplace(heap, (key, partition, position, row))
+                    older = 0
+                else:
+                    older += 1
+                if older >= self.OUT_OF_ORDER_SLACK:
+                    break
+            
+            # 更旧的分区中的对话都早于当前结果, 或者已经读到since之前
+            if len(heap) >= limit or older >= self.OUT_OF_ORDER_SLACK:
+                break
+            start = partition_start(partition, self.partition_format)
+            if since is not None and start is not None and start <= since:
+                break
         
-        # 获取网页搜索
-        web_searches = []
-        if self.web_searches_file.exists():
-            with open(self.web_searches_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row.get('conversation_id', 0)) == conversation_id:
-                            web_searches.append({
-                                'id': int(row['id']) if row.get('id') else 0,
-                                'url': row.get('url', ''),
-                                'title': row.get('title', ''),
-                                'fetched_at': row.get('fetched_at', '')
-                            })
+        return sorted(heap, key=lambda entry: entry[0], reverse=True)
+    
+    def _conversation_summary(self, row):
+        """列表中一条对话的字段"""
+        duration_seconds = None
+        if row.get('finished_at') and row.get('started_at'):
+            try:
+                start = datetime.fromisoformat(row['started_at'])
+                finish = datetime.fromisoformat(row['finished_at'])
+                duration_seconds = (finish - start).total_seconds()
+            except:
+                pass
         
-        # 获取思考过程
-        reasoning = []
-        reasoning_file = self.data_dir / "reasoning.csv"
-        if reasoning_file.exists():
-            with open(reasoning_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row.get('conversation_id', 0)) == conversation_id:
-                        # 解码换行符
-                        content = row.get('reasoning_content', '').replace('\\n', '\n').replace('\\r', '\r')
-                        reasoning.append({
-                            'id': int(row['id']) if row.get('id') else 0,
-                            'reasoning_content': content,
-                            'created_at': row.get('created_at', '')
-                        })
+        return {
+            'id': int(row['id']) if row.get('id') else 0,
+            'run_uuid': row.get('run_uuid', ''),
+            'question_id': int(row['question_id']) if row.get('question_id') else None,
+            'question_text': self.blobs.resolve(row.get('question_text', '')),
+            'started_at': row.get('started_at') if row.get('started_at') else None,
+            'finished_at': row.get('finished_at') if row.get('finished_at') else None,
+            'duration_seconds': duration_seconds
+        }
+    
+    def get_conversation_summary(self, conversation_id, status=None):
+        """按id读取列表中的一条对话(通过行偏移索引), 找不到时返回None"""
+        offsets = self.row_index.lookup_id(conversation_id)
+        if offsets is None:
+            return None
+        if status is None:
+            status = self._read_status_journal()
+        for row in self._rows_for_conversation('conversations', conversation_id, offsets):
+            return self._conversation_summary(self._apply_status(row, status))
+        return None
+    
+    def event_source(self):
+        """/events的事件源"""
+        return CSVEventSource(self)
+    
+    def get_conversations_page(self, limit: int = 100, since: Optional[datetime] = None,
+                               cursor: Optional[RunCursor] = None):
+        """按(started_at, id)倒序返回一页对话和下一页的游标(没有更多数据时为None)"""
+        # 先读状态日志再读主文件, 与scraper合并日志时的写入顺序配合
+        status = self._read_status_journal()
         
-        # 获取搜索查询
-        search_queries = []
-        search_queries_file = self.data_dir / "search_queries.csv"
-        if search_queries_file.exists():
-            with open(search_queries_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row.get('conversation_id', 0)) == conversation_id:
-                            search_queries.append({
-                                'id': int(row['id']) if row.get('id') else 0,
-                                'query_text': row.get('query_text', ''),
-                                'created_at': row.get('created_at', '')
-                            })
+        entries = self._recent_conversation_rows(limit, since, cursor)
+        conversations = [self._conversation_summary(self._apply_status(row, status)) for _, _, _, row in entries]
         
-        # 获取访问网站
-        visited_sites = []
-        visited_sites_file = self.data_dir / "visited_sites.csv"
-        if visited_sites_file.exists():
-            with open(visited_sites_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row.get('conversation_id', 0)) == conversation_id:
-                            visited_sites.append({
-                                'id': int(row['id']) if row.get('id') else 0,
-                                'site_url': row.get('site_url', ''),
-                                'site_title': row.get('site_title', ''),
-                                'site_description': row.get('site_description', ''),
-                                'created_at': row.get('created_at', '')
-                            })
+        next_cursor = None
+        if entries and len(entries) == limit:
+            (started_at, run_id), partition, position, _ = entries[-1]
+            next_cursor = RunCursor(started_at, run_id, partition, position).encode()
+        return conversations, next_cursor
+    
+    def get_conversations(self, limit: int = 100, since: Optional[datetime] = None):
+        """获取对话列表, since为带时区的时间, 只返回此后开始的对话"""
+        return self.get_conversations_page(limit, since)[0]
+    
+    # 详情中包含的子表, 以及每张表输出的字段(另有id)
+    DETAIL_TABLES = {
+        'messages': ['role', 'content_md', 'scraped_at'],
+        'web_searches': ['url', 'title', 'fetched_at'],
+        'artifacts': ['type', 'path', 'created_at'],
+        'reasoning': ['reasoning_content', 'created_at'],
+        'search_queries': ['query_text', 'created_at'],
+        'visited_sites': ['site_url', 'site_title', 'site_description', 'created_at'],
+    }
+    
+    def _rows_at(self, csv_file, offsets):
+        """按行起始偏移读取, 未压缩的文件优先从缓存取; 偏移按文件顺序读一遍"""
+        cached = self._cache.rows_at(csv_file, offsets) if csv_file.exists() else None
+        return cached if cached is not None else read_rows_at(csv_file, offsets)
+    
+    def _rows_for_conversation(self, table, conversation_id, offsets):
+        """通过索引中的偏移读取某个对话在一张表中的行
         
-        return {
-            'id': conversation_id,
+        读到的行都核对id; scraper合并状态日志重写conversations.csv之后、取代旧偏移的索引项追加之前,
+        旧偏移指向别的行, 此时扫描索引中的对话文件。
+        """
+        key = 'id' if table == 'conversations' else 'conversation_id'
+        files = [file for file in offsets if PurePosixPath(file).name == f"{table}.csv"]
+        rows = []
+        for file in files:
+            rows.extend(row for row in self._rows_at(self.data_dir / file, offsets[file])
+                        if row.get(key) == str(conversation_id))
+        if table == 'conversations' and files and not rows:
+            for file in files:
+                rows.extend(row for row in self._scan(self.data_dir / file) if row.get('id') == str(conversation_id))
+        return rows
+    
+    def _detail_row(self, table, row):
+        """详情中一条子表记录, 长正文从blob还原"""
+        item = {'id': int(row['id']) if row.get('id') else 0}
+        for field in self.DETAIL_TABLES[table]:
+            value = row.get(field, '')
+            if field == 'content_md':
+                item['content'] = self.blobs.resolve(value)
+                continue
+            if field == 'reasoning_content':
+                # 解码换行符
+                value = self.blobs.resolve(value).replace('\\n', '\n').replace('\\r', '\r')
+            item[field] = value
+        return item
+    
+    def _details(self, conversation, rows, tables):
+        """由对话行和它的子表行({表: [行]})组装详情, 只包含tables中的子表"""
+        details = {
+            'id': int(conversation['id']) if conversation.get('id') else 0,
             'run_uuid': conversation.get('run_uuid', ''),
             'question': {
                 'id': int(conversation['question_id']) if conversation.get('question_id') else None,
-                'text': conversation.get('question_text', ''),
+                'text': self.blobs.resolve(conversation.get('question_text', '')),
                 'cooldown_min': 1440
             },
             'started_at': conversation.get('started_at'),
             'finished_at': conversation.get('finished_at'),
-            'messages': messages,
-            'web_searches': web_searches,
-            'artifacts': [],
-            'reasoning': reasoning,
-            'search_queries': search_queries,
-            'visited_sites': visited_sites
         }
+        for table in tables:
+            details[table] = [self._detail_row(table, row) for row in rows.get(table, [])]
+        return details
+    
+    def get_conversation_details_batch(self, run_uuids, tables=None):
+        """一次读取多个运行的详情, 返回 run_uuid -> 详情, 找不到的运行不包含在内
+        
+        索引中有的运行, 把所有运行在同一文件中的偏移合并后按文件顺序读一遍; 其余运行在
+        对话表中找到所在分区后, 每个分区的每张子表只扫描一遍。tables为要读取的子表,
+        默认全部; 其余子表的文件不会打开。
+        """
+        tables = tuple(self.DETAIL_TABLES if tables is None else tables)
+        status = self._read_status_journal()
+        wanted = set(run_uuids)
+        conversations = {}
+        rows_by_conversation = {}
+        
+        # 通过偏移索引定位, 同一文件的偏移合并读取
+        located = {}
+        file_offsets = {}
+        for run_uuid in wanted:
+            entry = self.row_index.lookup(run_uuid)
+            if entry:
+                conversation_id, offsets = entry
+                located[conversation_id] = run_uuid
+                for file, offsets_in_file in offsets.items():
+                    file_offsets.setdefault(file, set()).update(offsets_in_file)
+        for file, offsets in file_offsets.items():
+            table = PurePosixPath(file).stem
+            if table != 'conversations' and table not in tables:
+                continue
+            for row in self._rows_at(self.data_dir / file, offsets):
+                if table == 'conversations':
+                    if row.get('run_uuid') in wanted:
+                        conversations[row['run_uuid']] = self._apply_status(row, status)
+                    continue
+                try:
+                    conversation_id = int(row.get('conversation_id', ''))
+                except ValueError:
+                    continue
+                if conversation_id in located:
+                    rows_by_conversation.setdefault(conversation_id, {}).setdefault(table, []).append(row)
+        
+        # 索引中没有的运行: 从最新的分区开始在对话表中查找
+        remaining = wanted - set(conversations)
+        by_partition = {}
+        for partition in reversed(self.partitions()):
+            if not remaining:
+                break
+            for row in self._scan(self._table_file('conversations', partition)):
+                if row.get('run_uuid') in remaining:
+                    remaining.discard(row['run_uuid'])
+                    conversations[row['run_uuid']] = self._apply_status(row, status)
+                    conversation_id = int(row.get('id') or 0)
+                    rows_by_conversation.pop(conversation_id, None)
+                    by_partition.setdefault(partition, set()).add(conversation_id)
+        for partition, conversation_ids in by_partition.items():
+            for table in tables:
+                for row in self._scan(self._table_file(table, partition)):
+                    conversation_id = int(row.get('conversation_id', 0))
+                    if conversation_id in conversation_ids:
+                        rows_by_conversation.setdefault(conversation_id, {}).setdefault(table, []).append(row)
+        
+        return {
+            run_uuid: self._details(conversation, rows_by_conversation.get(int(conversation.get('id') or 0), {}), tables)
+            for run_uuid, conversation in conversations.items()
+        }
+    
+    def get_conversation_details(self, run_uuid: str, tables=None):
+        """获取对话详情, tables为要包含的子表, 默认全部"""
+        return self.get_conversation_details_batch([run_uuid], tables).get(run_uuid)
+    
+    # 导出时与对话表归并连接的子表, 以及每张表输出的字段
+    EXPORT_TABLES = {
+        'messages': ['role', 'content_md', 'scraped_at'],
+        'web_searches': ['url', 'title', 'fetched_at'],
+        'reasoning': ['reasoning_content', 'created_at'],
+        'search_queries': ['query_text', 'created_at'],
+        'visited_sites': ['site_url', 'site_title', 'site_description', 'created_at'],
+    }
+    
+    def _export_partitions(self, since=None):
+        """导出需要读取的分区, 从旧到新; 下一个分区的起点不晚于since时, 整个分区都早于since"""
+        partitions = self.partitions()
+        for partition, next_partition in zip(partitions, partitions[1:] + [None]):
+            next_start = partition_start(next_partition, self.partition_format) if next_partition else None
+            if since is not None and next_start is not None and next_start <= since:
+                continue
+            yield partition
+    
+    def _export_child(self, table, row):
+        """导出中一条子表记录, 长正文从blob还原"""
+        item = {field: row.get(field, '') for field in self.EXPORT_TABLES[table]}
+        if table == 'messages':
+            item['content'] = self.blobs.resolve(item.pop('content_md'))
+        elif table == 'reasoning':
+            item['reasoning_content'] = self.blobs.resolve(item['reasoning_content']).replace('\\n', '\n').replace('\\r', '\r')
+        return item
+    
+    def export_conversations(self, since: Optional[datetime] = None, tables=None):
+        """按分区逐个导出对话及其子表记录, 每个对话读完即返回
+        
+        子表的行写在对话所在的分区, 因此每个分区内对对话表和各子表各顺序读一遍, 按
+        conversation_id归并连接, 每个对话读到行偏移索引中记录的行数为止; 内存占用只与并发
+        运行交错的行数有关, 与导出总量无关。索引不可用时子表整个读入后再连接。tables为要
+        导出的子表, 默认全部, 其余子表不读取。
+        """
+        tables = tuple(self.EXPORT_TABLES if tables is None else tables)
+        since_key = since.astimezone(timezone.utc).isoformat() if since else None
+        status = self._read_status_journal()
+        indexed = self.row_index.refresh()
+        
+        for partition in self._export_partitions(since):
+            children = {}
+            for table in tables:
+                table_file = self._table_file(table, partition)
+                counts = self.row_index.row_counts(table_file.relative_to(self.data_dir).as_posix()) if indexed else None
+                children[table] = (ConversationRowStream(iter_table_rows(table_file)), counts)
+            for row in iter_table_rows(self._table_file('conversations', partition)):
+                try:
+                    conversation_id = int(row.get('id', ''))
+                except ValueError:
+                    continue
+                # 早于since的对话也要取走它的子表行, 让子表的读取位置跟上
+                related = {
+                    table: stream.take(conversation_id, None if counts is None else counts.get(conversation_id, 0))
+                    for table, (stream, counts) in children.items()
+                }
+                if since_key is not None and row.get('started_at', '') < since_key:
+                    continue
+                
+                row = self._apply_status(row, status)
+                data = {
+                    'conversation_id': conversation_id,
+                    'run_uuid': row.get('run_uuid', ''),
+                    'question': {
+                        'id': int(row['question_id']) if row.get('question_id') else None,
+                        'text': self.blobs.resolve(row.get('question_text', ''))
+                    },
+                    'started_at': row.get('started_at') or None,
+                    'finished_at': row.get('finished_at') or None,
+                }
+                for table, rows in related.items():
+                    data[table] = [self._export_child(table, child) for child in rows]
+                yield data
+    
+    # 检索的子表及其正文字段
+    SEARCH_SOURCES = {'messages': 'content_md', 'reasoning': 'reasoning_content', 'search_queries': 'query_text'}
+    
+    def search(self, query: str, limit: int = 20):
+        """全文检索回答、思考过程和搜索查询, 返回按相关度排序的对话摘要及命中的片段
+        
+        只读取查询词的倒排项, 再通过行偏移索引读取排名靠前的对话的正文生成摘要, 读取量与
+        limit有关, 与语料总量无关。索引不存在(scraper尚未升级)时返回空列表。
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        found = self.search_index.lookup(tokens) if tokens else None
+        if found is None:
+            return []
+        postings, total_documents = found
+        
+        status = self._read_status_journal()
+        results = []
+        for conversation_id, score, sources in rank(postings, total_documents, limit):
+            summary = self.get_conversation_summary(conversation_id, status)
+            if summary is None:
+                continue
+            
+            offsets = self.row_index.lookup_id(conversation_id)
+            snippets = []
+            for source in sources:
+                texts = [self.blobs.resolve(row.get(self.SEARCH_SOURCES[source], ''))
+                         for row in self._rows_for_conversation(source, conversation_id, offsets)]
+                if source == 'reasoning':
+                    texts = [text.replace('\\n', '\n').replace('\\r', '\r') for text in texts]
+                fragment = best_snippet(texts, query, tokens)
+                if fragment:
+                    snippets.append({'source': source, 'text': fragment})
+            results.append({**summary, 'score': score, 'snippets': snippets})
+        return results
+    
+    def get_domain_rankings(self, question_id: Optional[int] = None, since: Optional[datetime] = None, limit: int = 20):
+        """被引用最多的域名及其声量占比, 只读取按天的汇总
+        
+        since按UTC日期截取, 当天的运行全部计入; 汇总不存在(scraper尚未升级)时返回空排名。
+        """
+        since_day = since.astimezone(timezone.utc).date().isoformat() if since else ''
+        totals = self.domain_rollup.domain_totals(question_id, since_day)
+        return domain_rankings(totals or {}, limit)
+    
+    def get_entity_rankings(self, question_id: int, since: Optional[datetime] = None, limit: int = 20):
+        """回答中排名实体的出现率和平均名次, 只读取按问题索引的实体表
+        
+        since按UTC日期截取; 实体表不存在(scraper尚未升级)时返回空排名。
+        """
+        since_day = since.astimezone(timezone.utc).date().isoformat() if since else ''
+        rankings = self.entity_index.rankings(question_id, since_day, limit)
+        return rankings or entity_rankings({}, {}, dict, limit)
+    
+    def get_run_timeseries(self, bucket_hours: int = 1, since: Optional[datetime] = None):
+        """按桶的运行数、成功率和耗时分位数, 由按小时的汇总合并, 不读取对话文件
+        
+        汇总不存在(scraper尚未升级)时返回空序列。
+        """
+        hours = self.run_timeseries.hours_since(bucket_start_hour(since, bucket_hours))
+        return run_timeseries(hours or {}, bucket_hours, since)
+    
+    def _count_questions(self):
+        """问题池中的问题数量"""
+        return len(get_registry(self.questions_file))
     
     def get_stats(self):
         """获取统计信息"""
+        # 优先读取scraper增量维护的计数器
+        stats = read_json(self.stats_file)
+        if isinstance(stats, dict) and 'rows' in stats:
+            rows = stats['rows']
+            total_conversations = rows.get('conversations', 0)
+            successful_conversations = stats.get('finished_conversations', 0)
+            return {
+                'total_conversations': total_conversations,
+                'successful_conversations': successful_conversations,
+                'success_rate': successful_conversations / total_conversations if total_conversations > 0 else 0,
+                'total_messages': rows.get('messages', 0),
+                'total_web_searches': rows.get('web_searches', 0),
+                'total_questions': self._count_questions()
+            }
+        
+        # 计数器尚未生成时退回全表统计
         total_conversations = 0
         successful_conversations = 0
         total_messages = 0
         total_web_searches = 0
         
         # 统计对话
-        if self.conversations_file.exists():
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    total_conversations += 1
-                    if row.get('finished_at'):
-                        successful_conversations += 1
-        
-        # 统计消息
-        if self.messages_file.exists():
-            with open(self.messages_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                total_messages = sum(1 for _ in reader)
-        
-        # 统计网页搜索
-        if self.web_searches_file.exists():
-            with open(self.web_searches_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                total_web_searches = sum(1 for _ in reader)
+        status = self._read_status_journal()
+        for partition in self.partitions():
+            for row in self._scan(self._table_file('conversations', partition)):
+                total_conversations += 1
+                if self._apply_status(row, status).get('finished_at'):
+                    successful_conversations += 1
+            
+            # 统计消息
+            total_messages += len(self._scan(self._table_file('messages', partition)))
+            
+            # 统计网页搜索
+            total_web_searches += len(self._scan(self._table_file('web_searches', partition)))
         
         return {
             'total_conversations': total_conversations,
@@ -203,11 +588,69 @@ class SimpleCSVStorage:
             'success_rate': successful_conversations / total_conversations if total_conversations > 0 else 0,
             'total_messages': total_messages,
             'total_web_searches': total_web_searches,
-            'total_questions': 5
+            'total_questions': self._count_questions()
         }
 
 
-app = FastAPI(title="PandaRank API", version="1.0.0")
+class CSVEventSource:
+    """追踪数据文件的新增行产生/events事件
+    
+    未压缩的对话表中新追加的行是run_started, 状态日志中新追加的finished_at是run_finished;
+    数据版本(见data_version)有变化时才读取, 读取走增量缓存, 只解析新追加的字节。
+    """
+    
+    def __init__(self, storage: SimpleCSVStorage):
+        self.storage = storage
+        self._version = storage.data_version()[0]
+        self._positions = {csv_file: len(storage._cache.rows(csv_file)) for csv_file in self._live_files()}
+        self._journal_position = len(storage._cache.rows(storage.status_journal_file))
+        self._stats = storage.get_stats()
+    
+    def _live_files(self):
+        """仍在追加的对话表(归档的压缩分区不再变化)"""
+        for partition in self.storage.partitions():
+            csv_file = self.storage._table_file('conversations', partition)
+            if resolve_data_file(csv_file) == csv_file:
+                yield csv_file
+    
+    def poll(self):
+        version = self.storage.data_version()[0]
+        if version == self._version:
+            return []
+        self._version = version
+        
+        events = []
+        status = self.storage._read_status_journal()
+        for csv_file in self._live_files():
+            rows = self.storage._cache.rows(csv_file)
+            # 文件被重写(合并状态日志)时行数不变, 变短时只从新的末尾继续
+            start = min(self._positions.get(csv_file, 0), len(rows))
+            for row in rows[start:]:
+                events.append(('run_started', self.storage._conversation_summary(self.storage._apply_status(row, status))))
+            self._positions[csv_file] = len(rows)
+        
+        journal = self.storage._cache.rows(self.storage.status_journal_file)
+        start = min(self._journal_position, len(journal))
+        for row in journal[start:]:
+            if row.get('field') != 'finished_at' or not row.get('value'):
+                continue
+            try:
+                conversation_id = int(row.get('conversation_id', ''))
+            except ValueError:
+                continue
+            summary = self.storage.get_conversation_summary(conversation_id, status)
+            events.append(('run_finished', summary or {'id': conversation_id, 'finished_at': row['value']}))
+        self._journal_position = len(journal)
+        
+        stats = self.storage.get_stats()
+        delta = stats_delta(self._stats, stats)
+        if delta:
+            events.append(('stats_delta', delta))
+            self._stats = stats
+        return events
+
+
+app = FastAPI(title="PandaRank API", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -217,97 +660,295 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 各接口的耗时分布, 由/metrics导出
+app.add_middleware(LatencyMiddleware)
+# 按Accept-Encoding压缩较大的响应和流式导出
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compress_min_bytes)
+
+# 存储实例, 与scraper使用同一个STORAGE_BACKEND设置
+if settings.storage_backend == "sqlite":
+    storage = SimpleSQLiteStorage(settings.sqlite_path)
+else:
+    storage = SimpleCSVStorage(partition_format=settings.csv_partition_format)
+
+# 问题池, /questions和/trigger按id查找, 与统计中的问题数量使用同一个文件
+question_registry = get_registry(storage.questions_file)
+
+# 存储调用在固定大小的线程池中执行, 列表、详情和批量接口分别限制并发
+executor = StorageExecutor(
+    settings.storage_threads,
+    {'list': settings.concurrency_list, 'detail': settings.concurrency_detail, 'bulk': settings.concurrency_bulk},
+    settings.queue_timeout_sec
+)
 
-# CSV存储实例
-storage = SimpleCSVStorage()
+# /events的推送, 所有连接共享一个轮询任务
+broadcaster = EventBroadcaster(lambda: storage.event_source(), pool=executor.pool)
 
 class TriggerRequest(BaseModel):
     question_id: Optional[int] = None
     custom_question: Optional[str] = None
 
+class BatchRunsRequest(BaseModel):
+    run_uuids: List[str]
+    # 只返回这些子表, 默认全部
+    fields: Optional[List[str]] = None
+
 @app.get("/")
 async def root():
     return {"message": "PandaRank ChatGPT Scraper API", "version": "1.0.0"}
 
 @app.get("/runs")
 async def list_runs(
+    request: Request,
     since: Optional[datetime] = Query(None, description="Filter runs started after this timestamp"),
-    limit: int = Query(100, le=1000)
+    limit: int = Query(100, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
     """List all scraping runs"""
-    conversations = storage.get_conversations(limit)
-    
-    # 如果有since过滤条件
-    if since:
-        conversations = [
-            conv for conv in conversations 
-            if conv['started_at'] and datetime.fromisoformat(conv['started_at']) >= since
-        ]
+    # 没有时区的since按UTC处理
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    try:
+        run_cursor = RunCursor.decode(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return await executor.run('list', _list_runs, request, since, limit, run_cursor)
+
+def _list_runs(request, since, limit, run_cursor):
+    def build():
+        conversations, next_cursor = storage.get_conversations_page(limit, since, run_cursor)
+        return {"runs": conversations, "count": len(conversations), "next_cursor": next_cursor}
     
-    return {"runs": conversations, "count": len(conversations)}
+    # 数据没有变化时不读取任何数据文件, 直接返回304
+    version, last_modified = storage.data_version()
+    etag = make_etag(version, request.url.query)
+    return conditional_json(request, etag, last_modified, build)
 
 @app.get("/runs/{run_uuid}")
-async def get_run_details(run_uuid: str):
+async def get_run_details(
+    request: Request,
+    run_uuid: str,
+    fields: Optional[str] = Query(None, description="Comma-separated child tables to include, e.g. messages,web_searches"),
+    include: Optional[str] = Query(None, description="Alias of fields")
+):
     """Get detailed information about a specific run"""
-    conversation = storage.get_conversation_details(run_uuid)
+    tables = parse_fields(fields, include, list(storage.DETAIL_TABLES))
+    return await executor.run('detail', _run_details, request, run_uuid, tables)
+
+def _run_details(request, run_uuid, tables):
+    # 已完成的运行不会再变化, 客户端持有它的ETag时无需查找即可返回304
+    final_etag = make_etag('finished', run_uuid, request.url.query)
+    if is_not_modified(request, final_etag):
+        return not_modified(validator_headers(final_etag, cache_control=IMMUTABLE_CACHE_CONTROL))
+    
+    version, last_modified = storage.data_version()
+    etag = make_etag(version, run_uuid, request.url.query)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(validator_headers(etag, last_modified))
+    
+    conversation = storage.get_conversation_details(run_uuid, tables)
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Run not found")
     
-    return conversation
+    if conversation.get('finished_at'):
+        headers = validator_headers(final_etag, parse_timestamp(conversation['finished_at']), IMMUTABLE_CACHE_CONTROL)
+    else:
+        headers = validator_headers(etag, last_modified)
+    return FastJSONResponse(conversation, headers=headers)
+
+@app.post("/runs/batch")
+async def get_runs_batch(request: BatchRunsRequest):
+    """Get detailed information about many runs in one call"""
+    if len(request.run_uuids) > settings.batch_max_runs:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_runs} run_uuids per batch")
+    tables = parse_fields(None if request.fields is None else ','.join(request.fields), None, list(storage.DETAIL_TABLES))
+    details = await executor.run('bulk', storage.get_conversation_details_batch, request.run_uuids, tables)
+    
+    # 按请求中的顺序返回, 找不到的运行列在missing中
+    runs = [details[run_uuid] for run_uuid in dict.fromkeys(request.run_uuids) if run_uuid in details]
+    missing = [run_uuid for run_uuid in dict.fromkeys(request.run_uuids) if run_uuid not in details]
+    return {"runs": runs, "count": len(runs), "missing": missing}
+
+@app.get("/export/ndjson")
+async def export_ndjson(
+    since: Optional[datetime] = Query(None, description="Export runs started after this timestamp"),
+    fields: Optional[str] = Query(None, description="Comma-separated child tables to include, e.g. messages"),
+    include: Optional[str] = Query(None, description="Alias of fields")
+):
+    """Export all data as newline-delimited JSON"""
+    tables = parse_fields(fields, include, list(storage.EXPORT_TABLES))
+    # 没有时区的since按UTC处理
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    
+    def generate():
+        for data in storage.export_conversations(since, tables):
+            yield dumps(data) + b"\n"
+    
+    # 导出期间一直占用一个批量名额(开始发送时取得), 名额已满时在开始发送前返回503
+    executor.check_available('bulk')
+    return StreamingResponse(
+        executor.iterate('bulk', generate()),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition": f"attachment; filename=chatgpt_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+        }
+    )
+
+@app.get("/events")
+async def events():
+    """Server-sent events: run_started, run_finished and stats_delta"""
+    return StreamingResponse(
+        broadcaster.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/questions")
 async def list_questions():
     """List all questions in the pool"""
-    questions_file = Path("/app/data/geo_questions.yaml")
-    questions = []
-    
-    if questions_file.exists():
-        with open(questions_file, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            if data:
-                for q in data:
-                    questions.append({
-                        "id": q.get('id', 0),
-                        "text": q.get('text', ''),
-                        "cooldown_min": q.get('cooldown_min', 1440),
-                        "last_asked_at": None,
-                        "created_at": "2025-07-08T00:00:00+00:00"
-                    })
+    return await executor.run('list', _list_questions)
+
+def _list_questions():
+    questions = [
+        {
+            "id": q.get('id', 0),
+            "text": q.get('text', ''),
+            "cooldown_min": q.get('cooldown_min', 1440),
+            "last_asked_at": None,
+            "created_at": "2025-07-08T00:00:00+00:00"
+        }
+        for q in question_registry.all()
+    ]
     
     return {"questions": questions, "count": len(questions)}
 
+@app.get("/search")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Words or phrase to search for, Chinese or Latin"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Full-text search over answers, reasoning and search queries"""
+    return await executor.run('list', _search, request, q, limit)
+
+def _search(request, q, limit):
+    def build():
+        results = storage.search(q, limit)
+        return {"query": q, "results": results, "count": len(results)}
+    
+    version, last_modified = storage.data_version()
+    return conditional_json(request, make_etag(version, request.url.query), last_modified, build)
+
+@app.get("/rankings/domains")
+async def rank_domains(
+    request: Request,
+    question_id: Optional[int] = Query(None, description="Only runs of this question, default all questions"),
+    since: Optional[datetime] = Query(None, description="Only runs started on or after this day (UTC)"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Most cited domains with their share of voice"""
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return await executor.run('list', _rank_domains, request, question_id, since, limit)
+
+def _rank_domains(request, question_id, since, limit):
+    def build():
+        rankings = storage.get_domain_rankings(question_id, since, limit)
+        rankings['count'] = len(rankings['domains'])
+        return {"question_id": question_id, "since": since.astimezone(timezone.utc).date().isoformat() if since else None, **rankings}
+    
+    version, last_modified = storage.data_version()
+    return conditional_json(request, make_etag(version, request.url.query), last_modified, build)
+
+@app.get("/rankings/entities")
+async def rank_entities(
+    request: Request,
+    question_id: int = Query(..., description="Question whose answers are ranked"),
+    since: Optional[datetime] = Query(None, description="Only runs started on or after this day (UTC)"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Entities named in the ranked lists of answers, with average position and appearance rate per day"""
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return await executor.run('list', _rank_entities, request, question_id, since, limit)
+
+def _rank_entities(request, question_id, since, limit):
+    def build():
+        rankings = storage.get_entity_rankings(question_id, since, limit)
+        rankings['count'] = len(rankings['entities'])
+        return {"question_id": question_id, "since": since.astimezone(timezone.utc).date().isoformat() if since else None, **rankings}
+    
+    version, last_modified = storage.data_version()
+    return conditional_json(request, make_etag(version, request.url.query), last_modified, build)
+
 @app.get("/stats")
-async def get_stats():
+async def get_stats(request: Request):
     """Get overall statistics"""
-    return storage.get_stats()
+    return await executor.run('list', _stats, request)
+
+def _stats(request):
+    version, last_modified = storage.data_version()
+    return conditional_json(request, make_etag(version), last_modified, storage.get_stats)
+
+@app.get("/metrics/runs/timeseries")
+async def run_timeseries_metrics(
+    request: Request,
+    bucket: str = Query("1h", description="Bucket width in whole hours or days, e.g. 1h, 6h, 1d"),
+    since: Optional[datetime] = Query(None, description="Only buckets containing or after this timestamp")
+):
+    """Run count, success rate and p50/p90/p99 duration per time bucket"""
+    try:
+        bucket_hours = parse_bucket(bucket)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bucket, expected e.g. 1h, 6h or 1d")
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return await executor.run('list', _run_timeseries, request, bucket, bucket_hours, since)
+
+def _run_timeseries(request, bucket, bucket_hours, since):
+    def build():
+        buckets = storage.get_run_timeseries(bucket_hours, since)
+        return {"bucket": bucket, "since": since.isoformat() if since else None, "buckets": buckets, "count": len(buckets)}
+    
+    version, last_modified = storage.data_version()
+    return conditional_json(request, make_etag(version, request.url.query), last_modified, build)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return metrics_response()
 
 @app.get("/debug/csv")
 async def debug_csv_data(conversation_id: int = Query(...)):
     """Debug CSV data reading"""
+    return await executor.run('bulk', _debug_csv_data, conversation_id)
+
+def _debug_csv_data(conversation_id):
     debug_info = {}
     
-    # 检查reasoning.csv
-    reasoning_file = Path("/app/data/reasoning.csv")
-    if reasoning_file.exists():
-        with open(reasoning_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            reasoning_rows = []
-            for row in reader:
-                if int(row.get('conversation_id', 0)) == conversation_id:
-                    reasoning_rows.append(row)
-            debug_info['reasoning_rows'] = reasoning_rows
-    
-    # 检查search_queries.csv
-    search_file = Path("/app/data/search_queries.csv")
-    if search_file.exists():
-        with open(search_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            search_rows = []
-            for row in reader:
-                if int(row.get('conversation_id', 0)) == conversation_id:
-                    search_rows.append(row)
-            debug_info['search_rows'] = search_rows
+    data_dir = Path("/app/data")
+    for partition in list_partitions(data_dir):
+        # 检查reasoning.csv
+        reasoning_file = data_dir / partition / "reasoning.csv"
+        if resolve_data_file(reasoning_file):
+            with open_data_text(reasoning_file) as f:
+                reader = csv.DictReader(f)
+                reasoning_rows = debug_info.setdefault('reasoning_rows', [])
+                for row in reader:
+                    if int(row.get('conversation_id', 0)) == conversation_id:
+                        reasoning_rows.append(row)
+        
+        # 检查search_queries.csv
+        search_file = data_dir / partition / "search_queries.csv"
+        if resolve_data_file(search_file):
+            with open_data_text(search_file) as f:
+                reader = csv.DictReader(f)
+                search_rows = debug_info.setdefault('search_rows', [])
+                for row in reader:
+                    if int(row.get('conversation_id', 0)) == conversation_id:
+                        search_rows.append(row)
     
     return debug_info
 
@@ -327,19 +968,10 @@ async def trigger_scrape(
         question_text = request.custom_question
         question_id = 999  # 自定义问题使用特殊ID
     else:
-        # 从YAML文件获取问题
-        questions_file = Path("/app/data/geo_questions.yaml")
-        question_text = "Test question"
+        # 从问题池获取问题
         question_id = request.question_id
-        
-        if questions_file.exists():
-            with open(questions_file, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-                if data:
-                    for q in data:
-                        if q.get('id') == request.question_id:
-                            question_text = q.get('text', 'Unknown question')
-                            break
+        question = question_registry.get(request.question_id)
+        question_text = question.get('text', 'Unknown question') if question else "Test question"
     
     # 创建运行UUID
     run_uuid = str(uuid.uuid4())
@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .csv_files import parse_record
+
+
+class _CachedFile:
+    def __init__(self, identity):
+        self.identity = identity
+        self.size = -1
+        self.mtime_ns = -1
+        self.offset = 0
+        self.tail = b''
+        self.header: Optional[List[str]] = None
+        self.rows: List[Dict[str, str]] = []
+        self.by_offset: Dict[int, Dict[str, str]] = {}
+
+
+class CSVFileCache:
+    """按文件缓存解析后的行, 每次只解析新追加的字节
+
+    以(设备, inode)识别文件, 以大小和修改时间判断是否有变化。文件被替换(os.replace)、
+    截短, 或已解析部分的末尾字节与缓存不一致(原地重写)时, 整个文件重新解析。
+    只用于未压缩的数据文件; 返回的行字典是共享的, 调用方不能修改。
+
+    缓存的总量按已解析的文件字节数计, 超过max_bytes时淘汰最久未使用的文件; 单个文件超过上限时
+    本次解析的行照常返回, 但不保留在缓存中。
+    """
+
+    # 校验已解析部分末尾的字节数
+    TAIL_CHECK_BYTES = 64
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # 按最近使用的顺序排列, 最久未使用的在前
+        self._files: "OrderedDict[Path, _CachedFile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rows(self, csv_file: Path) -> List[Dict[str, str]]:
+        """文件中的全部行, 文件不存在时返回空列表"""
+        cached = self._refresh(csv_file)
+        return cached.rows if cached else []
+
+    def rows_at(self, csv_file: Path, offsets) -> Optional[List[Dict[str, str]]]:
+        """按行起始偏移取行, 有偏移不在缓存中时返回None(由调用方直接读文件)"""
+        cached = self._refresh(csv_file)
+        if cached is None:
+            return None
+        rows = []
+        for offset in sorted(offsets):
+            row = cached.by_offset.get(offset)
+            if row is None:
+                return None
+            rows.append(row)
+        return rows
+
+    def _refresh(self, csv_file: Path) -> Optional[_CachedFile]:
+        with self._lock:
+            try:
+                st = os.stat(csv_file)
+            except FileNotFoundError:
+                self._files.pop(csv_file, None)
+                return None
+
+            identity = (st.st_dev, st.st_ino)
+            cached = self._files.get(csv_file)
+            if cached and cached.identity == identity and cached.size == st.st_size and cached.mtime_ns == st.st_mtime_ns:
+                self._files.move_to_end(csv_file)
+                return cached
+
+            with open(csv_file, 'rb') as f:
+                if cached is None or cached.identity != identity or st.st_size < cached.offset \
+                        or not self._tail_matches(f, cached):
+                    cached = _CachedFile(identity)
+                    self._files[csv_file] = cached
+                f.seek(cached.offset)
+                data = f.read()
+
+            self._parse(cached, data)
+            cached.size = st.st_size
+            cached.mtime_ns = st.st_mtime_ns
+            self._evict(csv_file)
+            return cached
+
+    def _evict(self, csv_file: Path):
+        """把csv_file标为最近使用, 淘汰最久未使用的文件直到总量不超过上限"""
+        self._files.move_to_end(csv_file)
+        total = sum(cached.offset for cached in self._files.values())
+        while total > self.max_bytes and self._files:
+            _, evicted = self._files.popitem(last=False)
+            total -= evicted.offset
+
+    def _tail_matches(self, f, cached: _CachedFile) -> bool:
+        """已解析部分的末尾字节没有变化, 说明文件只是被追加"""
+        if not cached.tail:
+            return True
+        f.seek(cached.offset - len(cached.tail))
+        return f.read(len(cached.tail)) == cached.tail
+
+    def _parse(self, cached: _CachedFile, data: bytes):
+        """解析新追加的完整记录; 末尾没有换行的半条记录留到下次"""
+        pos = 0
+        record_start = 0
+        quotes = 0
+        while True:
+            newline = data.find(b'\n', pos)
+            if newline == -1:
+                break
+            quotes += data.count(b'"', pos, newline + 1)
+            pos = newline + 1
+            if quotes % 2:
+                continue
+            raw = data[record_start:pos]
+            if cached.header is None:
+                cached.header = parse_record(raw)
+            elif raw.strip():
+                row = dict(zip(cached.header, parse_record(raw)))
+                cached.rows.append(row)
+                cached.by_offset[cached.offset + record_start] = row
+            record_start = pos
+            quotes = 0
+
+        cached.tail = (cached.tail + data[:record_start])[-self.TAIL_CHECK_BYTES:]
+        cached.offset += record_start
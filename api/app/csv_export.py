@@ -0,0 +1,50 @@
+import csv
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .csv_files import open_data_text, resolve_data_file
+
+
+def iter_table_rows(csv_file: Path) -> Iterator[Dict[str, str]]:
+    """顺序流式读取一个表文件(含归档的压缩文件), 不经过缓存, 内存占用与文件大小无关"""
+    if resolve_data_file(csv_file) is None:
+        return
+    with open_data_text(csv_file) as f:
+        yield from csv.DictReader(f)
+
+
+class ConversationRowStream:
+    """按conversation_id顺序消费子表(消息、搜索等)的行, 用于与对话表做归并连接
+
+    一次运行的子表行在运行结束时一批写入, 并发的运行会让不同对话的行任意交错。take(cid, expected)
+    向前读到该对话的行数达到行偏移索引中的行数为止, 途中读到的其他对话的行暂存起来留给后续的
+    对话; 不按行数猜测是否读完, 因此不会漏掉写得晚的行。内存只与交错的行数有关。
+    """
+
+    def __init__(self, rows: Iterator[Dict[str, str]]):
+        self._rows = rows
+        self._pending: Dict[int, List[Dict[str, str]]] = {}
+        self._exhausted = False
+
+    def take(self, conversation_id: int, expected: Optional[int]) -> List[Dict[str, str]]:
+        """返回某个对话的行; 调用时conversation_id必须递增
+
+        expected为索引中该对话在此文件中的行数, 为None(索引不可用)时读完整个文件。
+        """
+        rows = self._pending.setdefault(conversation_id, [])
+        while not self._exhausted and (expected is None or len(rows) < expected):
+            row = next(self._rows, None)
+            if row is None:
+                self._exhausted = True
+                break
+            try:
+                row_conversation_id = int(row.get('conversation_id', ''))
+            except ValueError:
+                continue
+            self._pending.setdefault(row_conversation_id, []).append(row)
+
+        rows = self._pending.pop(conversation_id)
+        # 更早的对话已经取走, 这些行是索引追加之前写入的(运行仍在写入), 不会再被取走
+        for stale in [cid for cid in self._pending if cid < conversation_id]:
+            del self._pending[stale]
+        return rows
@@ -0,0 +1,247 @@
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖, 只有zstd归档需要
+    zstandard = None
+
+
+# 与scraper/app/csv_files.py中的读取函数保持一致, 两个服务各自打包, 无法共享模块
+
+
+def parse_record(raw: bytes) -> List[str]:
+    """把一条完整的CSV记录(字节)解析为字段列表"""
+    reader = csv.reader(io.StringIO(raw.decode('utf-8'), newline=''))
+    return next(reader, [])
+
+
+def iter_rows_reverse(csv_file: Path, block_size: int = 64 * 1024) -> Iterator[Tuple[int, List[str]]]:
+    """从文件末尾按块向前读取CSV记录, 依次返回(记录起始偏移, 字段列表), 跳过表头
+
+    带引号的字段里可能包含换行, 因此只有当换行之后到记录末尾的引号数为偶数时,
+    该换行才是记录边界。引号字节(0x22)不会出现在UTF-8多字节序列中, 可以直接按字节统计。
+    """
+    with open(csv_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        carry = b''
+        parity = 0
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            block = f.read(pos - start)
+            data = block + carry
+            record_end = len(data)
+            scan = len(block)
+            while True:
+                newline = data.rfind(b'\n', 0, scan)
+                if newline == -1:
+                    parity ^= data.count(b'"', 0, scan) & 1
+                    break
+                parity ^= data.count(b'"', newline + 1, scan) & 1
+                scan = newline
+                if parity == 0:
+                    if data[newline + 1:record_end].strip():
+                        yield start + newline + 1, parse_record(data[newline + 1:record_end])
+                    record_end = newline + 1
+            carry = data[:record_end]
+            pos = start
+        # 剩下的carry是表头
+
+
+def _read_record(f) -> bytes:
+    """从当前位置读取一条完整记录(引号成对出现时记录结束)"""
+    buffer = b''
+    quotes = 0
+    for line in iter(f.readline, b''):
+        buffer += line
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            break
+    return buffer
+
+
+# 归档后的数据文件后缀, 读取时按此顺序查找
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+
+
+def resolve_data_file(csv_file: Path) -> Optional[Path]:
+    """数据文件的实际路径: 未压缩的.csv, 或归档后的.csv.zst / .csv.gz, 都不存在时返回None"""
+    if csv_file.exists():
+        return csv_file
+    for suffix in COMPRESSED_SUFFIXES:
+        candidate = csv_file.with_name(csv_file.name + suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def open_data_file(csv_file: Path):
+    """以二进制流打开数据文件, 归档的压缩文件边读边解压"""
+    path = resolve_data_file(csv_file)
+    if path is None:
+        raise FileNotFoundError(csv_file)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def open_data_text(csv_file: Path):
+    """以文本方式打开数据文件, 用于csv.DictReader"""
+    return io.TextIOWrapper(open_data_file(csv_file), encoding='utf-8')
+
+
+def iter_dicts_newest_first(csv_file: Path) -> Iterator[Dict[str, str]]:
+    """从最后一行开始向前返回记录字典; 归档的压缩文件不能反向读取, 整个读入后倒序返回"""
+    path = resolve_data_file(csv_file)
+    if path is None:
+        return
+    with open_data_file(csv_file) as f:
+        header = parse_record(_read_record(f))
+        if path != csv_file:
+            rows = []
+            while True:
+                raw = _read_record(f)
+                if not raw:
+                    break
+                if raw.strip():
+                    rows.append(parse_record(raw))
+            for row in reversed(rows):
+                yield dict(zip(header, row))
+            return
+    for _, row in iter_rows_reverse(csv_file):
+        yield dict(zip(header, row))
+
+
+def read_rows_at(csv_file: Path, offsets: Iterable[int]) -> List[Dict[str, str]]:
+    """按字节偏移直接读取若干条记录, 以表头为键返回字典列表
+
+    偏移是未压缩数据中的位置; 压缩文件不能随机访问, 按偏移顺序向前流式跳过。
+    """
+    rows = []
+    path = resolve_data_file(csv_file)
+    if path is None:
+        return rows
+    seekable = path == csv_file
+    with open_data_file(csv_file) as f:
+        header_raw = _read_record(f)
+        header = parse_record(header_raw)
+        position = len(header_raw)
+        for offset in sorted(offsets):
+            if seekable:
+                f.seek(offset)
+            else:
+                if offset < position:
+                    continue
+                while position < offset:
+                    skipped = len(f.read(min(offset - position, 1024 * 1024)))
+                    if not skipped:
+                        break
+                    position += skipped
+            raw = _read_record(f)
+            position = offset + len(raw)
+            if raw.strip():
+                try:
+                    rows.append(dict(zip(header, parse_record(raw))))
+                except UnicodeDecodeError:
+                    # 文件被重写后过时的偏移可能落在多字节字符中间, 由调用方核对行并退回扫描
+                    continue
+    return rows
+
+
+def read_json(path: Path, default=None):
+    """读取JSON边车文件, 不存在或损坏时返回默认值"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def list_partitions(data_dir: Path) -> List[str]:
+    """数据分区目录名(相对数据目录), 从旧到新排列; ''表示分区之前写在数据目录根下的文件"""
+    partitions = []
+    if resolve_data_file(data_dir / 'conversations.csv'):
+        partitions.append('')
+    if data_dir.exists():
+        for entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+            if entry.is_dir() and not entry.name.startswith(('_', '.')) \
+                    and resolve_data_file(Path(entry.path) / 'conversations.csv'):
+                partitions.append(entry.name)
+    return partitions
+
+
+def partition_start(partition: str, partition_format: str) -> Optional[datetime]:
+    """分区覆盖时间段的起点(UTC), 根目录或名称与格式不符时返回None"""
+    if not partition or not partition_format:
+        return None
+    try:
+        return datetime.strptime(partition, partition_format).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+class AppendOnlyCSVReader:
+    """增量读取scraper维护的只追加CSV(data/_meta下的索引和汇总)
+
+    只解析上次读取之后追加的完整行; 文件被整体重写(inode变化或变短)时调用reset()清空状态并从头
+    重新加载。子类在reset()中初始化内存中的状态, 在apply()中累加一行, 读取状态时持有self._lock。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._identity = None
+        self._position = 0
+        self.reset()
+
+    def reset(self):
+        """清空由已读取的行得到的状态"""
+        raise NotImplementedError
+
+    def apply(self, row: List[str]):
+        """累加一行; 字段缺失或格式不对时抛出IndexError或ValueError, 该行被跳过"""
+        raise NotImplementedError
+
+    def refresh(self) -> bool:
+        """读取新追加的行, 文件不存在时返回False"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+
+        with self._lock, f:
+            stat = os.fstat(f.fileno())
+            identity = (stat.st_dev, stat.st_ino)
+            if identity != self._identity or stat.st_size < self._position:
+                self._identity = identity
+                self._position = 0
+                self.reset()
+
+            if stat.st_size > self._position:
+                f.seek(self._position)
+                data = f.read(stat.st_size - self._position)
+                # 只消费完整的行, 写了一半的行留到下次
+                end = data.rfind(b'\n') + 1
+                lines = data[:end].splitlines()
+                if self._position == 0 and lines:
+                    lines = lines[1:]
+                for line in lines:
+                    try:
+                        self.apply(parse_record(line))
+                    except (IndexError, ValueError):
+                        continue
+                self._position += end
+        return True
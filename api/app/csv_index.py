@@ -0,0 +1,55 @@
+from typing import Dict, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVReader
+
+
+class RowIndexReader(AppendOnlyCSVReader):
+    """增量读取scraper维护的行偏移索引(data/_meta/row_index.csv)
+
+    conversations.csv中每个对话只有一行, 同一对话后出现的索引项取代之前的。
+    """
+
+    CONVERSATIONS = 'conversations.csv'
+
+    def reset(self):
+        self.runs: Dict[str, int] = {}
+        self.offsets: Dict[int, Dict[str, List[int]]] = {}
+
+    def apply(self, row: List[str]):
+        file, conversation_id, offset, run_uuid = row[0], int(row[1]), int(row[2]), row[3]
+        files = self.offsets.setdefault(conversation_id, {})
+        if file.endswith(self.CONVERSATIONS):
+            files[file] = [offset]
+        else:
+            files.setdefault(file, []).append(offset)
+        if run_uuid:
+            self.runs[run_uuid] = conversation_id
+
+    def row_counts(self, file: str) -> Dict[int, int]:
+        """某个数据文件(相对数据目录)中各对话已索引的行数, 不刷新; 调用前先refresh()"""
+        with self._lock:
+            return {
+                conversation_id: len(files[file])
+                for conversation_id, files in self.offsets.items() if file in files
+            }
+
+    def lookup(self, run_uuid: str) -> Optional[Tuple[int, Dict[str, List[int]]]]:
+        """返回(conversation_id, {文件: [偏移]}), 索引不可用或没有该运行时返回None"""
+        if not self.refresh():
+            return None
+        with self._lock:
+            conversation_id = self.runs.get(run_uuid)
+            if conversation_id is None:
+                return None
+            files = self.offsets.get(conversation_id, {})
+            return conversation_id, {file: list(offsets) for file, offsets in files.items()}
+
+    def lookup_id(self, conversation_id: int) -> Optional[Dict[str, List[int]]]:
+        """返回某个对话在各文件中的行偏移{文件: [偏移]}, 索引不可用或没有该对话时返回None"""
+        if not self.refresh():
+            return None
+        with self._lock:
+            files = self.offsets.get(conversation_id)
+            if files is None:
+                return None
+            return {file: list(offsets) for file, offsets in files.items()}
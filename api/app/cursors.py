@@ -0,0 +1,46 @@
+import base64
+import json
+from typing import Optional
+
+
+class RunCursor:
+    """/runs分页游标, 指向上一页最后一行, 下一页从(started_at, id)严格更小的行开始
+
+    partition与position只是CSV存储的定位提示(该行所在分区及在文件中的行序号),
+    提示失效时CSV存储退回从分区末尾扫描; SQL存储忽略它们。
+    """
+
+    def __init__(self, started_at: str, id: int, partition: Optional[str] = None, position: Optional[int] = None):
+        self.started_at = started_at
+        self.id = id
+        self.partition = partition
+        self.position = position
+
+    @property
+    def key(self):
+        return self.started_at, self.id
+
+    def encode(self) -> str:
+        data = {'s': self.started_at, 'i': self.id}
+        if self.partition is not None:
+            data['p'] = self.partition
+            data['n'] = self.position
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'RunCursor':
+        """解析客户端传回的游标, 格式不对时抛出ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw)
+            started_at = data['s']
+            run_id = data['i']
+            partition = data.get('p')
+            position = data.get('n')
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        if not isinstance(started_at, str) or not isinstance(run_id, int) \
+                or (partition is not None and not (isinstance(partition, str) and isinstance(position, int))):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return cls(started_at, run_id, partition, position)
@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVReader
+
+
+def domain_rankings(totals: Dict[str, Tuple[int, int]], limit: int) -> Dict:
+    """由 域名 -> (运行数, 引用数) 的合计生成排名, domain为空的一项是全部运行的合计
+
+    share_of_voice为该域名的引用数占全部引用的比例, run_rate为引用过该域名的运行所占的比例。
+    """
+    totals = dict(totals)
+    total_runs, total_citations = totals.pop('', (0, 0))
+    ranked = sorted(totals.items(), key=lambda item: (-item[1][1], -item[1][0], item[0]))[:limit]
+    domains = [
+        {
+            'domain': domain,
+            'citations': citations,
+            'runs': runs,
+            'share_of_voice': round(citations / total_citations, 4) if total_citations else 0.0,
+            'run_rate': round(runs / total_runs, 4) if total_runs else 0.0,
+        }
+        for domain, (runs, citations) in ranked
+    ]
+    return {'total_runs': total_runs, 'total_citations': total_citations, 'domains': domains}
+
+
+class DomainRollupReader(AppendOnlyCSVReader):
+    """增量读取scraper维护的域名引用汇总(data/_meta/domain_rollup.csv), 按(问题, 日期, 域名)累加
+
+    内存中的条目数与问题数×天数×域名数有关, 与运行数无关。
+    """
+
+    def reset(self):
+        # question_id -> {(日期, 域名): [运行数, 引用数]}
+        self.totals: Dict[str, Dict[Tuple[str, str], List[int]]] = {}
+
+    def apply(self, row: List[str]):
+        day, question_id, domain, runs, citations = row[0], row[1], row[2], int(row[3]), int(row[4])
+        total = self.totals.setdefault(question_id, {}).setdefault((day, domain), [0, 0])
+        total[0] += runs
+        total[1] += citations
+
+    def domain_totals(self, question_id: Optional[int] = None, since_day: str = '') -> Optional[Dict[str, Tuple[int, int]]]:
+        """某个问题(为None时全部问题)从since_day起各域名的(运行数, 引用数), 汇总不可用时返回None"""
+        if not self.refresh():
+            return None
+        totals: Dict[str, List[int]] = {}
+        with self._lock:
+            if question_id is None:
+                questions = list(self.totals.values())
+            else:
+                questions = [self.totals.get(str(question_id), {})]
+            for by_day in questions:
+                for (day, domain), (runs, citations) in by_day.items():
+                    if day < since_day:
+                        continue
+                    total = totals.setdefault(domain, [0, 0])
+                    total[0] += runs
+                    total[1] += citations
+        return {domain: (runs, citations) for domain, (runs, citations) in totals.items()}
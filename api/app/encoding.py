@@ -0,0 +1,142 @@
+import json
+import zlib
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 可选依赖, 没有时退回标准库json
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖, 没有时只协商gzip
+    zstandard = None
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为UTF-8的JSON字节, 有orjson时使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """用dumps序列化的JSONResponse, 作为两个API应用的默认响应类"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def choose_encoding(accept_encoding: str):
+    """按Accept-Encoding选择压缩格式, 优先zstd, 其次gzip; 都不接受时返回None"""
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    if zstandard is not None and 'zstd' in accepted:
+        return 'zstd'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class CompressionMiddleware:
+    """按Accept-Encoding用zstd或gzip压缩响应
+
+    有Content-Length的响应不小于minimum_size时整体压缩; 没有Content-Length的流式响应
+    (如导出)边发送边压缩, 内存只与单个数据块有关。SSE、已经编码过的响应以及304不压缩。
+    """
+
+    SKIP_CONTENT_TYPES = ('text/event-stream',)
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        request_headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+        encoding = choose_encoding(request_headers.get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {'start': None, 'compressor': None, 'buffered': False}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in message.get('headers', [])}
+                content_type = headers.get('content-type', '')
+                length = headers.get('content-length')
+                if message['status'] < 200 or message['status'] in (204, 304) or 'content-encoding' in headers \
+                        or content_type.startswith(self.SKIP_CONTENT_TYPES) \
+                        or (length is not None and int(length) < self.minimum_size):
+                    await send(message)
+                    return
+                state['start'] = message
+                state['compressor'] = _Compressor(encoding)
+                # 有长度的响应等正文到齐后重新计算长度, 流式响应去掉长度直接开始发送
+                state['buffered'] = length is not None
+                if not state['buffered']:
+                    await send(self._start_message(message, encoding, None))
+                return
+
+            if message['type'] != 'http.response.body' or state['compressor'] is None:
+                await send(message)
+                return
+
+            compressor = state['compressor']
+            more_body = message.get('more_body', False)
+            data = compressor.compress(message.get('body', b''))
+            if not more_body:
+                data += compressor.flush()
+            if state['buffered']:
+                if more_body:
+                    state.setdefault('chunks', []).append(data)
+                    return
+                data = b''.join(state.pop('chunks', [])) + data
+                await send(self._start_message(state['start'], encoding, len(data)))
+                await send({'type': 'http.response.body', 'body': data, 'more_body': False})
+                return
+            if data or not more_body:
+                await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _start_message(message, encoding, length):
+        headers = [(key, value) for key, value in message.get('headers', [])
+                   if key.lower() not in (b'content-length', b'vary')]
+        vary = [value for key, value in message.get('headers', []) if key.lower() == b'vary']
+        headers.append((b'content-encoding', encoding.encode('latin-1')))
+        headers.append((b'vary', b', '.join(vary + [b'Accept-Encoding'])))
+        if length is not None:
+            headers.append((b'content-length', str(length).encode('latin-1')))
+        return {**message, 'headers': headers}
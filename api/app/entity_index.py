@@ -0,0 +1,96 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVReader
+
+
+def entity_rankings(
+    runs_by_day: Dict[str, int],
+    days_by_entity: Dict[str, Dict[str, Tuple[int, int, int]]],
+    describe: Callable[[List[str]], Dict[str, Tuple[str, str]]],
+    limit: int
+) -> Dict:
+    """按出现次数, 再按平均名次排列实体, 附带按天的出现率和平均名次
+
+    runs_by_day为 日期 -> 完成的运行数; days_by_entity为 实体键 -> {日期: (出现次数, 名次之和, 最好名次)};
+    describe为排名靠前的实体返回 实体键 -> (名称, 属性JSON), 只对返回的实体调用。
+    """
+    total_runs = sum(runs_by_day.values())
+    summaries = []
+    for key, by_day in days_by_entity.items():
+        appearances = sum(count for count, _, _ in by_day.values())
+        if not appearances:
+            continue
+        position_sum = sum(total for _, total, _ in by_day.values())
+        best = min(best for _, _, best in by_day.values())
+        summaries.append((key, appearances, position_sum / appearances, best))
+    ranked = sorted(summaries, key=lambda summary: (-summary[1], summary[2], summary[0]))[:limit]
+
+    descriptions = describe([key for key, _, _, _ in ranked]) if ranked else {}
+    entities = []
+    for key, appearances, average_position, best in ranked:
+        name, attributes = descriptions.get(key, (key, ''))
+        timeline = []
+        for day, (count, position_sum, _) in sorted(days_by_entity[key].items()):
+            runs = runs_by_day.get(day, 0)
+            timeline.append({
+                'day': day,
+                'appearances': count,
+                'appearance_rate': round(count / runs, 4) if runs else None,
+                'average_position': round(position_sum / count, 2),
+            })
+        entities.append({
+            'entity': name,
+            'appearances': appearances,
+            'appearance_rate': round(appearances / total_runs, 4) if total_runs else None,
+            'average_position': round(average_position, 2),
+            'best_position': best,
+            'attributes': json.loads(attributes) if attributes else {},
+            'timeline': timeline,
+        })
+    return {'total_runs': total_runs, 'entities': entities}
+
+
+class EntityIndexReader(AppendOnlyCSVReader):
+    """增量读取scraper提取的排名实体(data/_meta/ranked_entities.csv), 按问题建立索引
+
+    每个问题保存按天的运行数和各实体按天的出现次数、名次之和, 以及实体最近一次出现时的名称和
+    最近一次提取到的属性。
+    """
+
+    def reset(self):
+        # question_id -> {日期: 运行数}
+        self.runs: Dict[str, Dict[str, int]] = {}
+        # question_id -> {实体键: {日期: [出现次数, 名次之和, 最好名次]}}
+        self.days: Dict[str, Dict[str, Dict[str, List[int]]]] = {}
+        # question_id -> {实体键: (名称, 属性JSON)}
+        self.names: Dict[str, Dict[str, Tuple[str, str]]] = {}
+
+    def apply(self, row: List[str]):
+        question_id, day, position, key = row[1], row[2], int(row[3]), row[4]
+        name, attributes = row[5], row[6]
+        if position == 0:
+            runs = self.runs.setdefault(question_id, {})
+            runs[day] = runs.get(day, 0) + 1
+            return
+        total = self.days.setdefault(question_id, {}).setdefault(key, {}).setdefault(day, [0, 0, position])
+        total[0] += 1
+        total[1] += position
+        total[2] = min(total[2], position)
+        names = self.names.setdefault(question_id, {})
+        names[key] = (name, attributes or names.get(key, ('', ''))[1])
+
+    def rankings(self, question_id: int, since_day: str = '', limit: int = 20) -> Optional[Dict]:
+        """某个问题从since_day起的实体排名, 实体表不可用时返回None"""
+        if not self.refresh():
+            return None
+        question_id = str(question_id)
+        with self._lock:
+            runs_by_day = {day: runs for day, runs in self.runs.get(question_id, {}).items() if day >= since_day}
+            days_by_entity = {}
+            for key, by_day in self.days.get(question_id, {}).items():
+                selected = {day: tuple(total) for day, total in by_day.items() if day >= since_day}
+                if selected:
+                    days_by_entity[key] = selected
+            names = dict(self.names.get(question_id, {}))
+        return entity_rankings(runs_by_day, days_by_entity, lambda keys: names, limit)
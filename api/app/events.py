@@ -0,0 +1,82 @@
+import asyncio
+from typing import Callable, Dict, List, Set, Tuple
+
+from loguru import logger
+
+from .encoding import dumps
+
+
+def format_event(event: str, data) -> str:
+    """一条SSE消息, 数据与其他响应一样用encoding.dumps序列化(单行JSON)"""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+def stats_delta(old: Dict, new: Dict) -> Dict:
+    """统计数字中变化了的字段及其新值; 只发送新值, 客户端漏掉一条事件也不会累积误差"""
+    return {key: value for key, value in new.items() if old.get(key) != value}
+
+
+class EventBroadcaster:
+    """把存储中的变化推送给所有/events订阅者
+
+    source_factory()返回的事件源提供poll() -> [(事件名, 数据)], 每次只报告上次poll之后的
+    变化。一个进程只有一个轮询任务, 有订阅者时才运行, 在线程池中调用poll(); 存储的读取量与
+    打开的看板数量无关。pool为执行poll()的线程池, 默认使用事件循环的线程池。
+    """
+
+    # 没有事件时发送注释行, 防止代理断开空闲连接
+    HEARTBEAT_SEC = 15.0
+    # 浏览器断线后重连的等待时间(毫秒)
+    RETRY_MS = 3000
+
+    def __init__(self, source_factory: Callable[[], object], interval: float = 1.0, queue_size: int = 100,
+                 pool=None):
+        self._source_factory = source_factory
+        self._pool = pool
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task = None
+
+    def _publish(self, events: List[Tuple[str, object]]):
+        for queue in list(self._subscribers):
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # 客户端读得太慢, 丢弃积压的事件, 让它重新加载全部数据
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(('resync', {}))
+                    break
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        source = await loop.run_in_executor(self._pool, self._source_factory)
+        while self._subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                events = await loop.run_in_executor(self._pool, source.poll)
+            except Exception as e:
+                logger.error(f"Failed to poll storage for events: {e}")
+                continue
+            if events:
+                self._publish(events)
+
+    async def stream(self):
+        """一个订阅者的SSE消息流, 客户端断开时由StreamingResponse取消"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            yield f"retry: {self.RETRY_MS}\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=self.HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event, data)
+        finally:
+            self._subscribers.discard(queue)
@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+
+from fastapi import HTTPException
+
+from .metrics import STORAGE_IN_FLIGHT, STORAGE_QUEUE_WAIT, STORAGE_REJECTED
+
+
+class StorageExecutor:
+    """在固定大小的线程池中执行同步的存储调用(文件读取、SQL查询), 不阻塞事件循环
+
+    接口按类别(列表、详情、批量)分别限制并发; 排队超过queue_timeout仍拿不到名额的请求
+    立即返回503, 而不是无限排队。
+    """
+
+    def __init__(self, max_workers: int, limits: Dict[str, int], queue_timeout: float):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self.queue_timeout = queue_timeout
+        self._limits = limits
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, endpoint_class: str) -> asyncio.Semaphore:
+        # 在事件循环中首次使用时创建
+        semaphore = self._semaphores.get(endpoint_class)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint_class] = asyncio.Semaphore(self._limits[endpoint_class])
+        return semaphore
+
+    async def acquire(self, endpoint_class: str):
+        """取得一个并发名额, 超时抛出503; 必须与release()成对使用"""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore(endpoint_class).acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(endpoint_class)
+        STORAGE_QUEUE_WAIT.labels(endpoint_class).observe(time.perf_counter() - start)
+        STORAGE_IN_FLIGHT.labels(endpoint_class).inc()
+
+    def check_available(self, endpoint_class: str):
+        """名额已满时立即抛出503, 不占用名额; 流式响应用它在开始发送前拒绝请求"""
+        if self._semaphore(endpoint_class).locked():
+            self._reject(endpoint_class)
+
+    def _reject(self, endpoint_class: str):
+        STORAGE_REJECTED.labels(endpoint_class).inc()
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+
+    def release(self, endpoint_class: str):
+        STORAGE_IN_FLIGHT.labels(endpoint_class).dec()
+        self._semaphore(endpoint_class).release()
+
+    async def run(self, endpoint_class: str, fn, *args, **kwargs):
+        """占用一个名额, 在线程池中执行fn(*args, **kwargs)"""
+        await self.acquire(endpoint_class)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.release(endpoint_class)
+
+    async def iterate(self, endpoint_class: str, iterable: Iterable):
+        """在线程池中逐项推进同步迭代器, 用于流式响应
+
+        名额在开始迭代时才取得、结束时释放, 响应体从未被发送(如客户端提前断开)时不会占用名额。
+        """
+        await self.acquire(endpoint_class)
+        loop = asyncio.get_running_loop()
+        iterator = iter(iterable)
+        sentinel = object()
+        try:
+            while True:
+                item = await loop.run_in_executor(self.pool, next, iterator, sentinel)
+                if item is sentinel:
+                    break
+                yield item
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.pool, close)
+            self.release(endpoint_class)
@@ -0,0 +1,85 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .encoding import FastJSONResponse
+
+
+# 已完成的运行不会再变化, 客户端可以长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 其余响应可以缓存, 但每次使用前都要带校验值向服务器确认
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts) -> str:
+    """由存储状态(以及查询参数)计算弱ETag"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """客户端缓存的版本仍然有效
+
+    有If-None-Match时只比较ETag(弱比较), 否则用If-Modified-Since与最后修改时间比较。
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        target = _strip_weak(etag)
+        return any(_strip_weak(tag.strip()) == target for tag in if_none_match.split(','))
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP日期只精确到秒
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None,
+                      cache_control: str = REVALIDATE_CACHE_CONTROL) -> dict:
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def conditional_json(request: Request, etag: str, last_modified: Optional[datetime], build: Callable[[], object],
+                     cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    """校验值匹配时直接返回304, 否则才调用build()读取数据并序列化"""
+    headers = validator_headers(etag, last_modified, cache_control)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    return FastJSONResponse(build(), headers=headers)
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """把存储中的ISO时间转换为带时区的datetime, 用作Last-Modified"""
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
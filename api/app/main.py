@@ -1,12 +1,11 @@
-from fastapi import FastAPI, Depends, Query, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, Query, HTTPException, BackgroundTasks, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import create_engine, func, text, tuple_
+from sqlalchemy.orm import Session, selectinload, sessionmaker
 from typing import List, Optional
 from datetime import datetime, timezone
 from pydantic import BaseModel
-import json
 import io
 import uuid
 import asyncio
@@ -14,14 +13,38 @@ import httpx
 from loguru import logger
 
 from .config import settings
+from .encoding import CompressionMiddleware, FastJSONResponse, dumps
+from .metrics import LatencyMiddleware, metrics_response
+from .projection import parse_fields
 from .models import Base, Conversation, Message, WebSearch, Artifact, Question
+from .cursors import RunCursor
+from .events import EventBroadcaster, stats_delta
+from .executor import StorageExecutor
+from .http_cache import (
+    IMMUTABLE_CACHE_CONTROL, conditional_json, is_not_modified, make_etag, not_modified, parse_timestamp,
+    validator_headers
+)
 
 
 # Database setup
 engine = create_engine(settings.db_dsn)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-app = FastAPI(title="PandaRank API", version="1.0.0")
+# Indexes added after the first release; db/init.sql only runs on a fresh volume,
+# so existing databases get them at startup
+INDEX_MIGRATIONS = (
+    "CREATE INDEX IF NOT EXISTS idx_conversations_finished_at ON conversations(finished_at)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_started_at_id ON conversations(started_at, id)",
+)
+
+# Conversations fetched per round trip by the streaming export
+EXPORT_BATCH_SIZE = 200
+
+# Related tables a caller can select with fields= / include=, in response order
+DETAIL_RELATIONS = ("messages", "web_searches", "artifacts")
+EXPORT_RELATIONS = ("messages", "web_searches")
+
+app = FastAPI(title="PandaRank API", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -31,6 +54,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-endpoint latency histograms, exported on /metrics
+app.add_middleware(LatencyMiddleware)
+# Compress large responses and the streaming export according to Accept-Encoding
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compress_min_bytes)
+
+# Storage calls run on a sized thread pool, with separate concurrency limits for
+# list, detail and bulk endpoints; requests that wait longer than the queue timeout get 503
+executor = StorageExecutor(
+    settings.storage_threads,
+    {"list": settings.concurrency_list, "detail": settings.concurrency_detail, "bulk": settings.concurrency_bulk},
+    settings.queue_timeout_sec
+)
+
+
+@app.on_event("startup")
+def create_missing_indexes():
+    """Create indexes that existing databases predate; the API still starts if this fails"""
+    try:
+        with engine.begin() as conn:
+            for statement in INDEX_MIGRATIONS:
+                conn.execute(text(statement))
+    except Exception as e:
+        logger.warning(f"Could not create missing indexes: {e}")
 
 
 class TriggerRequest(BaseModel):
@@ -38,6 +84,12 @@ class TriggerRequest(BaseModel):
     custom_question: Optional[str] = None
 
 
+class BatchRunsRequest(BaseModel):
+    run_uuids: List[str]
+    # Only these related tables are returned; all of them by default
+    fields: Optional[List[str]] = None
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -47,6 +99,83 @@ def get_db():
         db.close()
 
 
+def data_version(db: Session):
+    """Cheap fingerprint of the database state, returns (version, last_modified)
+
+    Every value comes from a primary key or an indexed column, so this is a single
+    index-only round trip instead of running the real queries.
+    """
+    version = db.query(
+        db.query(func.max(Conversation.id)).scalar_subquery(),
+        db.query(func.max(Conversation.started_at)).scalar_subquery(),
+        db.query(func.max(Conversation.finished_at)).scalar_subquery(),
+        db.query(func.max(Message.id)).scalar_subquery(),
+        db.query(func.max(WebSearch.id)).scalar_subquery(),
+        db.query(func.max(Artifact.id)).scalar_subquery(),
+        db.query(func.max(Question.id)).scalar_subquery(),
+        db.query(func.max(Question.last_asked_at)).scalar_subquery(),
+    ).one()
+    timestamps = [value for value in (version[1], version[2], version[7]) if value is not None]
+    last_modified = parse_timestamp(max(timestamps)) if timestamps else None
+    return tuple(str(value) for value in version), last_modified
+
+
+class PostgresEventSource:
+    """Produces /events by watching for new rows
+    
+    Conversations with an id above the last seen maximum are run_started, those with
+    finished_at after the last seen maximum are run_finished. Both lookups use indexes,
+    and nothing is queried unless data_version() changed.
+    """
+    
+    def __init__(self):
+        db = SessionLocal()
+        try:
+            self._version = data_version(db)[0]
+            self._last_id, self._last_finished = db.query(
+                func.max(Conversation.id), func.max(Conversation.finished_at)
+            ).one()
+            self._stats = _stats(db)
+        finally:
+            db.close()
+    
+    def poll(self):
+        db = SessionLocal()
+        try:
+            version = data_version(db)[0]
+            if version == self._version:
+                return []
+            self._version = version
+            
+            events = []
+            started = db.query(Conversation).order_by(Conversation.id.asc())
+            if self._last_id is not None:
+                started = started.filter(Conversation.id > self._last_id)
+            for conv in started:
+                events.append(("run_started", _run_summary(conv)))
+                self._last_id = conv.id
+            
+            finished = db.query(Conversation).filter(Conversation.finished_at.isnot(None))
+            if self._last_finished is not None:
+                finished = finished.filter(Conversation.finished_at > self._last_finished)
+            for conv in finished.order_by(Conversation.finished_at.asc()):
+                events.append(("run_finished", _run_summary(conv)))
+                self._last_finished = conv.finished_at
+            
+            stats = _stats(db)
+            delta = stats_delta(self._stats, stats)
+            if delta:
+                events.append(("stats_delta", delta))
+                self._stats = stats
+            return events
+        finally:
+            db.close()
+
+
+# One polling task shared by every /events connection
+broadcaster = EventBroadcaster(PostgresEventSource, pool=executor.pool)
+
+
 @app.get("/")
 async def root():
     return {"message": "PandaRank ChatGPT Scraper API", "version": "1.0.0"}
@@ -54,39 +183,90 @@ async def root():
 
 @app.get("/runs")
 async def list_runs(
+    request: Request,
     since: Optional[datetime] = Query(None, description="Filter runs started after this timestamp"),
     limit: int = Query(100, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     db: Session = Depends(get_db)
 ):
     """List all scraping runs"""
+    try:
+        run_cursor = RunCursor.decode(cursor) if cursor else None
+        before = (datetime.fromisoformat(run_cursor.started_at), run_cursor.id) if run_cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return await executor.run("list", _list_runs_response, request, db, since, limit, before)
+
+
+def _list_runs_response(request: Request, db: Session, since: Optional[datetime], limit: int, before: Optional[tuple]):
+    # Answer 304 before running the list query when nothing has changed
+    version, last_modified = data_version(db)
+    etag = make_etag(version, request.url.query)
+    return conditional_json(request, etag, last_modified, lambda: _list_runs(db, since, limit, before))
+
+
+def _run_summary(conv: Conversation):
+    return {
+        "id": conv.id,
+        "run_uuid": str(conv.run_uuid),
+        "question_id": conv.question_id,
+        "question_text": conv.question.text if conv.question else None,
+        "started_at": conv.started_at.isoformat() if conv.started_at else None,
+        "finished_at": conv.finished_at.isoformat() if conv.finished_at else None,
+        "duration_seconds": (
+            (conv.finished_at - conv.started_at).total_seconds() 
+            if conv.finished_at and conv.started_at else None
+        )
+    }
+
+
+def _list_runs(db: Session, since: Optional[datetime], limit: int, before: Optional[tuple]):
     query = db.query(Conversation)
     
     if since:
         query = query.filter(Conversation.started_at >= since)
     
-    conversations = query.order_by(Conversation.started_at.desc()).limit(limit).all()
+    # Keyset pagination on (started_at, id), served by idx_conversations_started_at_id
+    if before:
+        query = query.filter(tuple_(Conversation.started_at, Conversation.id) < before)
     
-    results = []
-    for conv in conversations:
-        results.append({
-            "id": conv.id,
-            "run_uuid": str(conv.run_uuid),
-            "question_id": conv.question_id,
-            "question_text": conv.question.text if conv.question else None,
-            "started_at": conv.started_at.isoformat() if conv.started_at else None,
-            "finished_at": conv.finished_at.isoformat() if conv.finished_at else None,
-            "duration_seconds": (
-                (conv.finished_at - conv.started_at).total_seconds() 
-                if conv.finished_at and conv.started_at else None
-            )
-        })
+    conversations = query.order_by(Conversation.started_at.desc(), Conversation.id.desc()).limit(limit).all()
+    
+    results = [_run_summary(conv) for conv in conversations]
     
-    return {"runs": results, "count": len(results)}
+    next_cursor = None
+    if conversations and len(conversations) == limit and conversations[-1].started_at:
+        last = conversations[-1]
+        next_cursor = RunCursor(last.started_at.isoformat(), last.id).encode()
+    
+    return {"runs": results, "count": len(results), "next_cursor": next_cursor}
 
 
 @app.get("/runs/{run_uuid}")
-async def get_run_details(run_uuid: str, db: Session = Depends(get_db)):
+async def get_run_details(
+    run_uuid: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated related tables to include, e.g. messages,web_searches"),
+    include: Optional[str] = Query(None, description="Alias of fields"),
+    db: Session = Depends(get_db)
+):
     """Get detailed information about a specific run"""
+    tables = parse_fields(fields, include, DETAIL_RELATIONS)
+    return await executor.run("detail", _run_details, request, db, run_uuid, tables)
+
+
+def _run_details(request: Request, db: Session, run_uuid: str, tables):
+    # A finished run never changes, so a client holding its ETag gets 304 without any query
+    final_etag = make_etag('finished', run_uuid, request.url.query)
+    if is_not_modified(request, final_etag):
+        return not_modified(validator_headers(final_etag, cache_control=IMMUTABLE_CACHE_CONTROL))
+    
+    version, last_modified = data_version(db)
+    etag = make_etag(version, run_uuid, request.url.query)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(validator_headers(etag, last_modified))
+    
     conversation = db.query(Conversation).filter(
         Conversation.run_uuid == run_uuid
     ).first()
@@ -94,35 +274,17 @@ async def get_run_details(run_uuid: str, db: Session = Depends(get_db)):
     if not conversation:
         raise HTTPException(status_code=404, detail="Run not found")
     
-    # Build response with all related data
-    messages = []
-    for msg in conversation.messages:
-        messages.append({
-            "id": msg.id,
-            "role": msg.role,
-            "content": msg.content_md,
-            "scraped_at": msg.scraped_at.isoformat() if msg.scraped_at else None
-        })
-    
-    web_searches = []
-    for search in conversation.web_searches:
-        web_searches.append({
-            "id": search.id,
-            "url": search.url,
-            "title": search.title,
-            "fetched_at": search.fetched_at.isoformat() if search.fetched_at else None
-        })
-    
-    artifacts = []
-    for artifact in conversation.artifacts:
-        artifacts.append({
-            "id": artifact.id,
-            "type": artifact.type,
-            "path": artifact.path,
-            "created_at": artifact.created_at.isoformat() if artifact.created_at else None
-        })
+    if conversation.finished_at:
+        headers = validator_headers(final_etag, parse_timestamp(conversation.finished_at), IMMUTABLE_CACHE_CONTROL)
+    else:
+        headers = validator_headers(etag, last_modified)
     
-    return {
+    return FastJSONResponse(_run_detail(conversation, tables), headers=headers)
+
+
+def _run_detail(conversation: Conversation, tables=DETAIL_RELATIONS):
+    # Relations are lazy, so tables that were not requested are never queried
+    detail = {
         "id": conversation.id,
         "run_uuid": str(conversation.run_uuid),
         "question": {
@@ -132,59 +294,104 @@ async def get_run_details(run_uuid: str, db: Session = Depends(get_db)):
         } if conversation.question else None,
         "started_at": conversation.started_at.isoformat() if conversation.started_at else None,
         "finished_at": conversation.finished_at.isoformat() if conversation.finished_at else None,
-        "messages": messages,
-        "web_searches": web_searches,
-        "artifacts": artifacts
     }
+    
+    if "messages" in tables:
+        detail["messages"] = [
+            {
+                "id": msg.id,
+                "role": msg.role,
+                "content": msg.content_md,
+                "scraped_at": msg.scraped_at.isoformat() if msg.scraped_at else None
+            }
+            for msg in conversation.messages
+        ]
+    
+    if "web_searches" in tables:
+        detail["web_searches"] = [
+            {
+                "id": search.id,
+                "url": search.url,
+                "title": search.title,
+                "fetched_at": search.fetched_at.isoformat() if search.fetched_at else None
+            }
+            for search in conversation.web_searches
+        ]
+    
+    if "artifacts" in tables:
+        detail["artifacts"] = [
+            {
+                "id": artifact.id,
+                "type": artifact.type,
+                "path": artifact.path,
+                "created_at": artifact.created_at.isoformat() if artifact.created_at else None
+            }
+            for artifact in conversation.artifacts
+        ]
+    
+    return detail
+
+
+@app.post("/runs/batch")
+async def get_runs_batch(request: BatchRunsRequest, db: Session = Depends(get_db)):
+    """Get detailed information about many runs in one call"""
+    if len(request.run_uuids) > settings.batch_max_runs:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_runs} run_uuids per batch")
+    tables = parse_fields(None if request.fields is None else ",".join(request.fields), None, DETAIL_RELATIONS)
+    details = await executor.run("bulk", _run_details_batch, db, request.run_uuids, tables)
+    
+    # Keep the requested order and report the runs that were not found
+    requested = list(dict.fromkeys(request.run_uuids))
+    runs = [details[run_uuid] for run_uuid in requested if run_uuid in details]
+    missing = [run_uuid for run_uuid in requested if run_uuid not in details]
+    return {"runs": runs, "count": len(runs), "missing": missing}
+
+
+def _run_details_batch(db: Session, run_uuids: List[str], tables=DETAIL_RELATIONS):
+    # Malformed ids would fail the UUID cast, so they are simply reported as missing
+    normalized = {}
+    for run_uuid in run_uuids:
+        try:
+            normalized[run_uuid] = str(uuid.UUID(run_uuid))
+        except ValueError:
+            continue
+    if not normalized:
+        return {}
+    
+    # One IN query for the conversations, then one per requested relation
+    conversations = db.query(Conversation).options(
+        selectinload(Conversation.question),
+        *(selectinload(getattr(Conversation, table)) for table in tables)
+    ).filter(Conversation.run_uuid.in_(set(normalized.values()))).all()
+    
+    details = {str(conversation.run_uuid): _run_detail(conversation, tables) for conversation in conversations}
+    # Answer under the spelling the caller used
+    return {run_uuid: details[key] for run_uuid, key in normalized.items() if key in details}
 
 
 @app.get("/export/ndjson")
 async def export_ndjson(
     since: Optional[datetime] = Query(None, description="Export runs started after this timestamp"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated related tables to include, e.g. messages"),
+    include: Optional[str] = Query(None, description="Alias of fields")
 ):
     """Export all data as newline-delimited JSON"""
-    query = db.query(Conversation)
-    
-    if since:
-        query = query.filter(Conversation.started_at >= since)
-    
-    conversations = query.order_by(Conversation.started_at.asc()).all()
+    tables = parse_fields(fields, include, EXPORT_RELATIONS)
     
     def generate():
-        for conv in conversations:
-            # Build conversation data
-            data = {
-                "conversation_id": conv.id,
-                "run_uuid": str(conv.run_uuid),
-                "question": {
-                    "id": conv.question.id,
-                    "text": conv.question.text
-                } if conv.question else None,
-                "started_at": conv.started_at.isoformat() if conv.started_at else None,
-                "finished_at": conv.finished_at.isoformat() if conv.finished_at else None,
-                "messages": [
-                    {
-                        "role": msg.role,
-                        "content": msg.content_md,
-                        "scraped_at": msg.scraped_at.isoformat() if msg.scraped_at else None
-                    }
-                    for msg in conv.messages
-                ],
-                "web_searches": [
-                    {
-                        "url": search.url,
-                        "title": search.title,
-                        "fetched_at": search.fetched_at.isoformat() if search.fetched_at else None
-                    }
-                    for search in conv.web_searches
-                ]
-            }
-            
-            yield json.dumps(data) + "\n"
+        # The request-scoped session is closed before the body is streamed, so the
+        # generator owns its session and pulls conversations in batches instead of .all()
+        export_db = SessionLocal()
+        try:
+            yield from _export_rows(export_db, since, tables)
+        finally:
+            export_db.close()
     
+    # The export takes a bulk slot when streaming starts and holds it until it finishes;
+    # when all bulk slots are busy it gets 503 before streaming starts
+    executor.check_available("bulk")
     return StreamingResponse(
-        generate(),
+        executor.iterate("bulk", generate()),
         media_type="application/x-ndjson",
         headers={
             "Content-Disposition": f"attachment; filename=chatgpt_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
@@ -192,9 +399,77 @@ async def export_ndjson(
     )
 
 
+def _export_rows(db: Session, since: Optional[datetime], tables=EXPORT_RELATIONS):
+    query = db.query(Conversation).options(
+        selectinload(Conversation.question),
+        *(selectinload(getattr(Conversation, table)) for table in tables)
+    )
+    
+    if since:
+        query = query.filter(Conversation.started_at >= since)
+    
+    # Related rows are loaded per batch with one IN query each
+    conversations = query.order_by(Conversation.started_at.asc(), Conversation.id.asc()).yield_per(EXPORT_BATCH_SIZE)
+    
+    for conv in conversations:
+        # Build conversation data
+        data = {
+            "conversation_id": conv.id,
+            "run_uuid": str(conv.run_uuid),
+            "question": {
+                "id": conv.question.id,
+                "text": conv.question.text
+            } if conv.question else None,
+            "started_at": conv.started_at.isoformat() if conv.started_at else None,
+            "finished_at": conv.finished_at.isoformat() if conv.finished_at else None,
+        }
+        
+        if "messages" in tables:
+            data["messages"] = [
+                {
+                    "role": msg.role,
+                    "content": msg.content_md,
+                    "scraped_at": msg.scraped_at.isoformat() if msg.scraped_at else None
+                }
+                for msg in conv.messages
+            ]
+        
+        if "web_searches" in tables:
+            data["web_searches"] = [
+                {
+                    "url": search.url,
+                    "title": search.title,
+                    "fetched_at": search.fetched_at.isoformat() if search.fetched_at else None
+                }
+                for search in conv.web_searches
+            ]
+        
+        yield dumps(data) + b"\n"
+
+
+@app.get("/events")
+async def events():
+    """Server-sent events: run_started, run_finished and stats_delta"""
+    return StreamingResponse(
+        broadcaster.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return metrics_response()
+
+
 @app.get("/questions")
 async def list_questions(db: Session = Depends(get_db)):
     """List all questions in the pool"""
+    return await executor.run("list", _list_questions, db)
+
+
+def _list_questions(db: Session):
     questions = db.query(Question).all()
     
     results = []
@@ -211,8 +486,17 @@ async def list_questions(db: Session = Depends(get_db)):
 
 
 @app.get("/stats")
-async def get_stats(db: Session = Depends(get_db)):
+async def get_stats(request: Request, db: Session = Depends(get_db)):
     """Get overall statistics"""
+    return await executor.run("list", _stats_response, request, db)
+
+
+def _stats_response(request: Request, db: Session):
+    version, last_modified = data_version(db)
+    return conditional_json(request, make_etag(version), last_modified, lambda: _stats(db))
+
+
+def _stats(db: Session):
     total_conversations = db.query(Conversation).count()
     successful_conversations = db.query(Conversation).filter(
         Conversation.finished_at.isnot(None)
@@ -246,6 +530,20 @@ async def trigger_scrape(
     if not request.question_id and not request.custom_question:
         raise HTTPException(status_code=400, detail="Either question_id or custom_question must be provided")
     
+    question_id, question_text, run_uuid = await executor.run("list", _create_run, db, request)
+    
+    # Call the scraper service asynchronously
+    background_tasks.add_task(call_scraper_service, question_id)
+    
+    return {
+        "message": "Scraping job triggered successfully",
+        "run_uuid": str(run_uuid),
+        "question_id": question_id,
+        "question_text": question_text
+    }
+
+
+def _create_run(db: Session, request: TriggerRequest):
     # If custom question, create it in the database
     if request.custom_question:
         # Create a temporary question
@@ -276,15 +574,7 @@ async def trigger_scrape(
     db.add(conversation)
     db.commit()
     
-    # Call the scraper service asynchronously
-    background_tasks.add_task(call_scraper_service, question_id)
-    
-    return {
-        "message": "Scraping job triggered successfully",
-        "run_uuid": str(run_uuid),
-        "question_id": question_id,
-        "question_text": question_text
-    }
+    return question_id, question_text, run_uuid
 
 
 async def call_scraper_service(question_id: int):
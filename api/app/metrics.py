@@ -0,0 +1,46 @@
+import time
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds', 'Time until the response starts, by endpoint',
+    ['method', 'endpoint', 'status']
+)
+STORAGE_QUEUE_WAIT = Histogram(
+    'api_storage_queue_wait_seconds', 'Time spent waiting for a storage slot', ['endpoint_class']
+)
+STORAGE_REJECTED = Counter(
+    'api_storage_rejected_total', 'Requests rejected with 503 after the queue timeout', ['endpoint_class']
+)
+STORAGE_IN_FLIGHT = Gauge(
+    'api_storage_in_flight', 'Storage calls currently holding a slot', ['endpoint_class']
+)
+
+
+class LatencyMiddleware:
+    """按路由模板记录每个请求到响应开始的耗时; 流式响应(导出、SSE)只计到开始发送"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                route = scope.get('route')
+                endpoint = route.path if route is not None else 'unmatched'
+                REQUEST_LATENCY.labels(scope['method'], endpoint, message['status']).observe(time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,21 @@
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+
+def parse_fields(fields: Optional[str], include: Optional[str], available: Sequence[str]) -> Tuple[str, ...]:
+    """解析fields=/include=参数(逗号分隔的子表名, 两者等价), 返回要读取的子表, 按available的顺序
+
+    两个参数都没有时返回全部子表; 参数为空(fields=)时不读任何子表, 只返回对话本身;
+    含有不认识的名字时返回400。
+    """
+    if fields is None and include is None:
+        return tuple(available)
+    requested = {name.strip() for value in (fields, include) if value for name in value.split(',') if name.strip()}
+    unknown = requested - set(available)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}; available: {', '.join(available)}"
+        )
+    return tuple(table for table in available if table in requested)
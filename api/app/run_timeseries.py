@@ -0,0 +1,117 @@
+import math
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from .csv_files import AppendOnlyCSVReader
+
+# 与scraper/app/run_timeseries.py中耗时直方图的比例一致
+GAMMA = 1.02
+
+# 桶宽: 整数个小时或天, 如 1h, 6h, 1d
+BUCKET_PATTERN = re.compile(r'^(\d+)([hd])$')
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+def parse_bucket(bucket: str) -> int:
+    """桶宽换算成小时数, 格式不对时抛出ValueError"""
+    match = BUCKET_PATTERN.match(bucket.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(bucket)
+    return int(match.group(1)) * (24 if match.group(2) == 'd' else 1)
+
+
+def bucket_start_hour(since: Optional[datetime], bucket_hours: int) -> str:
+    """since所在的桶的起始小时(如 2025-07-08T06), 用于筛选按小时的汇总; since为None时返回空串"""
+    if since is None:
+        return ''
+    epoch_hour = int(since.timestamp()) // 3600
+    start = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(hours=epoch_hour - epoch_hour % bucket_hours)
+    return start.strftime('%Y-%m-%dT%H')
+
+
+def add_entry(hours: Dict[str, list], hour: str, started: int, finished: int, duration_bin: str):
+    """把汇总中的一行累加到 小时 -> [运行数, 完成数, {耗时格号: 完成数}]"""
+    total = hours.setdefault(hour, [0, 0, {}])
+    total[0] += started
+    total[1] += finished
+    if duration_bin:
+        histogram = total[2]
+        histogram[int(duration_bin)] = histogram.get(int(duration_bin), 0) + finished
+
+
+def quantile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """直方图的分位数(秒), 取所在格的中点, 相对误差约1%"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(q * total))
+    seen = 0
+    for duration_bin in sorted(histogram):
+        seen += histogram[duration_bin]
+        if seen >= rank:
+            return round(2 * GAMMA ** duration_bin / (GAMMA + 1), 2)
+    return None
+
+
+def run_timeseries(hours: Dict[str, list], bucket_hours: int, since: Optional[datetime] = None) -> List[Dict]:
+    """把按小时的汇总合并成宽度为bucket_hours的桶, 按时间顺序返回有运行的桶
+
+    桶按UTC对齐: 1d的桶从零点开始, 6h的桶从0、6、12、18点开始; 没有运行的桶不返回,
+    长时间范围的响应大小只与有数据的桶数有关。
+    """
+    buckets: Dict[int, list] = {}
+    for hour, (started, finished, histogram) in hours.items():
+        try:
+            start = datetime.strptime(hour, '%Y-%m-%dT%H').replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        epoch_hour = int(start.timestamp()) // 3600
+        bucket = buckets.setdefault(epoch_hour - epoch_hour % bucket_hours, [0, 0, {}])
+        bucket[0] += started
+        bucket[1] += finished
+        for duration_bin, count in histogram.items():
+            bucket[2][duration_bin] = bucket[2].get(duration_bin, 0) + count
+    first = 0
+    if since is not None:
+        since_hour = int(since.timestamp()) // 3600
+        first = since_hour - since_hour % bucket_hours
+    series = []
+    for epoch_hour in sorted(buckets):
+        if epoch_hour < first:
+            continue
+        started, finished, histogram = buckets[epoch_hour]
+        point = {
+            'start': (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(hours=epoch_hour)).isoformat(),
+            'count': started,
+            'finished': finished,
+            'success_rate': round(finished / started, 4) if started else None,
+        }
+        point.update({name: quantile(histogram, q) for name, q in QUANTILES.items()})
+        series.append(point)
+    return series
+
+
+class RunTimeseriesReader(AppendOnlyCSVReader):
+    """增量读取scraper维护的按小时运行汇总(data/_meta/run_timeseries.csv)
+
+    内存中每小时一项, 与运行数无关。
+    """
+
+    def reset(self):
+        # 小时 -> [运行数, 完成数, {耗时格号: 完成数}]
+        self.hours: Dict[str, list] = {}
+
+    def apply(self, row: List[str]):
+        add_entry(self.hours, row[0], int(row[1]), int(row[2]), row[3])
+
+    def hours_since(self, since_hour: str = '') -> Optional[Dict[str, list]]:
+        """从since_hour(如 2025-07-08T09)起的按小时汇总的副本, 汇总不可用时返回None"""
+        if not self.refresh():
+            return None
+        with self._lock:
+            return {
+                hour: [started, finished, dict(histogram)]
+                for hour, (started, finished, histogram) in self.hours.items() if hour >= since_hour
+            }
@@ -0,0 +1,110 @@
+import heapq
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVReader
+
+# 与scraper/app/search_index.py中的切分规则保持一致
+TOKEN_PATTERN = re.compile(r'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]+)|([0-9a-z]+)')
+
+# 各子表中命中的权重, 回答正文最重要
+SOURCE_WEIGHTS = {'messages': 1.0, 'search_queries': 0.8, 'reasoning': 0.6}
+
+# 摘要中命中位置前后保留的字数
+SNIPPET_CONTEXT = 40
+
+
+def tokenize(text: str) -> List[str]:
+    """切分检索词: 中日韩文字取相邻两字(只有一个字时取单字), 拉丁字母和数字按单词, 统一为半角小写"""
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(unicodedata.normalize('NFKC', text or '').lower()):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def rank(postings: Dict[str, List[Tuple[int, str, int]]], total_documents: int, limit: int):
+    """按命中的查询词数, 再按tf-idf得分排序, 返回[(conversation_id, 得分, 命中的子表)]
+
+    postings为 查询词 -> [(conversation_id, 子表, 词频)]; 中文查询切成相邻两字后, 命中全部
+    查询词的对话近似于包含整个短语, 因此排在只命中部分查询词的对话之前。
+    """
+    scores: Dict[int, float] = {}
+    matched: Dict[int, int] = {}
+    sources: Dict[int, set] = {}
+    for entries in postings.values():
+        frequencies: Dict[int, Dict[str, int]] = {}
+        for conversation_id, source, tf in entries:
+            by_source = frequencies.setdefault(conversation_id, {})
+            by_source[source] = by_source.get(source, 0) + tf
+        if not frequencies:
+            continue
+        idf = math.log(1 + max(total_documents, len(frequencies)) / len(frequencies))
+        for conversation_id, by_source in frequencies.items():
+            weight = sum(SOURCE_WEIGHTS.get(source, 1.0) * (1 + math.log(tf)) for source, tf in by_source.items() if tf > 0)
+            scores[conversation_id] = scores.get(conversation_id, 0.0) + idf * weight
+            matched[conversation_id] = matched.get(conversation_id, 0) + 1
+            sources.setdefault(conversation_id, set()).update(by_source)
+    best = heapq.nlargest(limit, scores, key=lambda cid: (matched[cid], scores[cid], cid))
+    return [(cid, round(scores[cid], 4), [source for source in SOURCE_WEIGHTS if source in sources[cid]]) for cid in best]
+
+
+def snippet(text: str, query: str, tokens: List[str]) -> Optional[str]:
+    """正文中命中位置附近的一段, 优先匹配整个查询, 其次最早出现的查询词; 没有命中时返回None"""
+    text = text or ''
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # 个别字符小写后长度改变, 位置无法对应回原文, 退回区分大小写的匹配
+        lowered = text
+    needle = query.lower().strip()
+    position = lowered.find(needle) if needle else -1
+    length = len(needle)
+    if position < 0:
+        hits = [(lowered.find(token), len(token)) for token in tokens]
+        hits = [hit for hit in hits if hit[0] >= 0]
+        if not hits:
+            return None
+        position, length = min(hits)
+    start = max(0, position - SNIPPET_CONTEXT)
+    end = min(len(text), position + length + SNIPPET_CONTEXT)
+    fragment = ' '.join(text[start:end].split())
+    return ('…' if start > 0 else '') + fragment + ('…' if end < len(text) else '')
+
+
+def best_snippet(texts: Iterable[str], query: str, tokens: List[str]) -> Optional[str]:
+    """一个对话多段正文中最好的摘要: 优先取包含整个查询的一段, 否则取第一段命中查询词的"""
+    needle = query.lower().strip()
+    fallback = None
+    for text in texts:
+        if needle and needle in (text or '').lower():
+            return snippet(text, query, tokens)
+        if fallback is None:
+            fallback = snippet(text, query, tokens)
+    return fallback
+
+
+class SearchIndexReader(AppendOnlyCSVReader):
+    """增量读取scraper维护的倒排索引(data/_meta/search_postings.csv)"""
+
+    def reset(self):
+        self.postings: Dict[str, List[Tuple[int, str, int]]] = {}
+        self.documents = set()
+
+    def apply(self, row: List[str]):
+        token, conversation_id, source, tf = row[0], int(row[1]), row[2], int(row[3])
+        self.postings.setdefault(token, []).append((conversation_id, source, tf))
+        self.documents.add(conversation_id)
+
+    def lookup(self, tokens: List[str]):
+        """返回({查询词: [(conversation_id, 子表, 词频)]}, 文档总数), 索引不可用时返回None"""
+        if not self.refresh():
+            return None
+        with self._lock:
+            return {token: list(self.postings.get(token, [])) for token in tokens}, len(self.documents)
@@ -0,0 +1,410 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from .cursors import RunCursor
+from .domain_rollup import domain_rankings
+from .entity_index import entity_rankings
+from .run_timeseries import add_entry, bucket_start_hour, run_timeseries
+from .events import stats_delta
+from .question_registry import get_registry
+from .search_index import best_snippet, rank, tokenize
+
+
+# 与scraper/app/sqlite_storage.py中的表结构保持一致
+SELECT_CONVERSATIONS = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations"
+# 分页条件, started_at上的索引隐含按rowid(即id)排序, (started_at, id)的键集分页可以直接走索引
+CONVERSATIONS_SINCE = "started_at >= ?"
+CONVERSATIONS_BEFORE = "(started_at, id) < (?, ?)"
+CONVERSATIONS_ORDER = " ORDER BY started_at DESC, id DESC LIMIT ?"
+SELECT_EXPORT_CONVERSATIONS = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations ORDER BY started_at, id"
+SELECT_EXPORT_CONVERSATIONS_SINCE = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations WHERE started_at >= ? ORDER BY started_at, id"
+SELECT_STARTED_AFTER = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations WHERE id > ? ORDER BY id"
+SELECT_FINISHED_AFTER = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations WHERE finished_at > ? ORDER BY finished_at"
+SELECT_EVENT_WATERMARKS = "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(finished_at), '') FROM conversations"
+# 批量读取详情, {placeholders}替换为与参数个数相同的 ?, ?, ...
+SELECT_CONVERSATIONS_BY_UUIDS = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations WHERE run_uuid IN ({placeholders})"
+SELECT_DETAIL_ROWS = {
+    'messages': "SELECT conversation_id, id, role, content_md, scraped_at FROM messages WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'web_searches': "SELECT conversation_id, id, url, title, fetched_at FROM web_searches WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'artifacts': "SELECT conversation_id, id, type, path, created_at FROM artifacts WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'reasoning': "SELECT conversation_id, id, reasoning_content, created_at FROM reasoning WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'search_queries': "SELECT conversation_id, id, query_text, created_at FROM search_queries WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'visited_sites': "SELECT conversation_id, id, site_url, site_title, site_description, created_at FROM visited_sites WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+}
+# 全文检索: 查询词的倒排项(表由scraper维护), 文档数取最大id(走主键, 不扫描), 排名靠前的对话的正文
+SELECT_POSTINGS = "SELECT token, conversation_id, source, tf FROM search_postings WHERE token IN ({placeholders})"
+SELECT_DOCUMENT_COUNT = "SELECT COALESCE(MAX(id), 0) FROM conversations"
+SELECT_CONVERSATIONS_BY_IDS = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations WHERE id IN ({placeholders})"
+SELECT_SEARCH_TEXT = {
+    'messages': "SELECT conversation_id, content_md FROM messages WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'reasoning': "SELECT conversation_id, reasoning_content FROM reasoning WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+    'search_queries': "SELECT conversation_id, query_text FROM search_queries WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id, id",
+}
+# 域名引用排名: 按域名合计汇总表(由scraper维护)中从某天起的运行数和引用数, domain为空的一行是全部运行的合计
+SELECT_DOMAIN_TOTALS = "SELECT domain, SUM(runs), SUM(citations) FROM domain_rollup WHERE day >= ? GROUP BY domain"
+SELECT_QUESTION_DOMAIN_TOTALS = "SELECT domain, SUM(runs), SUM(citations) FROM domain_rollup WHERE question_id = ? AND day >= ? GROUP BY domain"
+# 实体排名: 按天的运行数(名次为0的运行标记)、各实体按天的出现次数和名次, 以及排名靠前的实体的名称和属性
+SELECT_ENTITY_RUNS = "SELECT day, COUNT(*) FROM ranked_entities WHERE question_id = ? AND position = 0 AND day >= ? GROUP BY day"
+SELECT_ENTITY_DAYS = (
+    "SELECT entity, day, COUNT(*), SUM(position), MIN(position) FROM ranked_entities "
+    "WHERE question_id = ? AND position > 0 AND day >= ? GROUP BY entity, day"
+)
+SELECT_ENTITY_NAMES = (
+    "SELECT entity, name, attributes FROM ranked_entities "
+    "WHERE question_id = ? AND entity IN ({placeholders}) ORDER BY conversation_id"
+)
+# 运行时间序列: 按小时汇总的运行数、完成数和耗时直方图格号
+SELECT_RUN_TIMESERIES = "SELECT hour, started, finished, duration_bin FROM run_timeseries WHERE hour >= ?"
+# 导出时每个对话的子表记录
+SELECT_EXPORT_ROWS = {
+    'messages': "SELECT role, content_md, scraped_at FROM messages WHERE conversation_id = ? ORDER BY id",
+    'web_searches': "SELECT url, title, fetched_at FROM web_searches WHERE conversation_id = ? ORDER BY id",
+    'reasoning': "SELECT reasoning_content, created_at FROM reasoning WHERE conversation_id = ? ORDER BY id",
+    'search_queries': "SELECT query_text, created_at FROM search_queries WHERE conversation_id = ? ORDER BY id",
+    'visited_sites': "SELECT site_url, site_title, site_description, created_at FROM visited_sites WHERE conversation_id = ? ORDER BY id",
+}
+
+
+class SimpleSQLiteStorage:
+    """只读访问scraper写入的SQLite数据库, 方法与SimpleCSVStorage一致"""
+
+    # 详情和导出中可以选择的子表
+    DETAIL_TABLES = tuple(SELECT_DETAIL_ROWS)
+    EXPORT_TABLES = tuple(SELECT_EXPORT_ROWS)
+
+    def __init__(self, db_path: str = "/app/data/pandarank.db"):
+        self.db_path = Path(db_path)
+
+        # 问题池, 用于统计问题数量
+        self.questions_file = self.db_path.parent / "geo_questions.yaml"
+
+        # 每个线程一个只读连接, WAL模式下读不阻塞scraper写入
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql, params=()):
+        if not self.db_path.exists():
+            return []
+        return self._connection().execute(sql, params).fetchall()
+
+    def data_version(self):
+        """数据状态的廉价指纹, 返回(指纹, 最后修改时间)
+
+        scraper的写入先进入WAL文件, 检查点时再写回主库, 两个文件的大小与修改时间
+        任一变化即表示数据可能变化; 只stat文件, 不执行查询。
+        """
+        version = []
+        latest = 0
+        for path in (self.db_path, self.db_path.with_name(self.db_path.name + '-wal'), self.questions_file):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                version.append((str(path), None))
+                continue
+            version.append((str(path), st.st_ino, st.st_size, st.st_mtime_ns))
+            latest = max(latest, st.st_mtime_ns)
+        last_modified = datetime.fromtimestamp(latest / 1e9, timezone.utc) if latest else None
+        return tuple(version), last_modified
+
+    @staticmethod
+    def _conversation_summary(row):
+        """列表中一条对话的字段"""
+        duration_seconds = None
+        if row['finished_at'] and row['started_at']:
+            try:
+                start = datetime.fromisoformat(row['started_at'])
+                finish = datetime.fromisoformat(row['finished_at'])
+                duration_seconds = (finish - start).total_seconds()
+            except ValueError:
+                pass
+
+        return {
+            'id': row['id'],
+            'run_uuid': row['run_uuid'],
+            'question_id': row['question_id'],
+            'question_text': row['question_text'] or '',
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'duration_seconds': duration_seconds
+        }
+
+    def get_conversations_page(self, limit: int = 100, since: Optional[datetime] = None,
+                               cursor: Optional[RunCursor] = None):
+        """按(started_at, id)倒序返回一页对话和下一页的游标(没有更多数据时为None)"""
+        conditions = []
+        params = []
+        if since is not None:
+            # started_at统一以UTC的ISO格式保存, 可以直接按字符串比较
+            conditions.append(CONVERSATIONS_SINCE)
+            params.append(since.astimezone(timezone.utc).isoformat())
+        if cursor is not None:
+            conditions.append(CONVERSATIONS_BEFORE)
+            params.extend([cursor.started_at, cursor.id])
+        sql = SELECT_CONVERSATIONS
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        rows = self._query(sql + CONVERSATIONS_ORDER, (*params, limit))
+
+        conversations = [self._conversation_summary(row) for row in rows]
+
+        next_cursor = None
+        if rows and len(rows) == limit:
+            next_cursor = RunCursor(rows[-1]['started_at'] or '', rows[-1]['id']).encode()
+        return conversations, next_cursor
+
+    def get_conversations(self, limit: int = 100, since: Optional[datetime] = None):
+        """获取对话列表, since为带时区的时间, 只返回此后开始的对话"""
+        return self.get_conversations_page(limit, since)[0]
+
+    def get_conversation_details(self, run_uuid: str, tables=None):
+        """获取对话详情, tables为要包含的子表, 默认全部"""
+        return self.get_conversation_details_batch([run_uuid], tables).get(run_uuid)
+
+    def get_conversation_details_batch(self, run_uuids, tables=None):
+        """一次读取多个运行的详情, 返回 run_uuid -> 详情, 找不到的运行不包含在内
+
+        对话表和每张要读取的子表各执行一次IN查询, 与运行数量无关; tables默认全部子表。
+        """
+        tables = tuple(self.DETAIL_TABLES if tables is None else tables)
+        wanted = list(dict.fromkeys(run_uuids))
+        if not wanted:
+            return {}
+        conversations = self._query(
+            SELECT_CONVERSATIONS_BY_UUIDS.format(placeholders=', '.join('?' * len(wanted))), wanted
+        )
+        if not conversations:
+            return {}
+
+        conversation_ids = [row['id'] for row in conversations]
+        placeholders = ', '.join('?' * len(conversation_ids))
+        rows_by_conversation = {}
+        for table in tables:
+            for row in self._query(SELECT_DETAIL_ROWS[table].format(placeholders=placeholders), conversation_ids):
+                item = dict(row)
+                conversation_id = item.pop('conversation_id')
+                rows_by_conversation.setdefault(conversation_id, {}).setdefault(table, []).append(item)
+
+        return {
+            conversation['run_uuid']: self._details(conversation, rows_by_conversation.get(conversation['id'], {}), tables)
+            for conversation in conversations
+        }
+
+    @staticmethod
+    def _details(conversation, rows, tables):
+        """由对话行和它的子表行({表: [行]})组装详情, 只包含tables中的子表"""
+        details = {
+            'id': conversation['id'],
+            'run_uuid': conversation['run_uuid'],
+            'question': {
+                'id': conversation['question_id'],
+                'text': conversation['question_text'] or '',
+                'cooldown_min': 1440
+            },
+            'started_at': conversation['started_at'],
+            'finished_at': conversation['finished_at'],
+        }
+        for table in tables:
+            if table == 'messages':
+                details[table] = [
+                    {'id': row['id'], 'role': row['role'], 'content': row['content_md'], 'scraped_at': row['scraped_at']}
+                    for row in rows.get(table, [])
+                ]
+            else:
+                details[table] = rows.get(table, [])
+        return details
+
+    def export_conversations(self, since: Optional[datetime] = None, tables=None):
+        """按开始时间顺序逐个导出对话及其子表记录, 字段与SimpleCSVStorage.export_conversations一致
+
+        StreamingResponse在线程池中分多次推进生成器, 可能跨线程, 因此使用单独的连接。
+        tables为要导出的子表, 默认全部, 其余子表不查询。
+        """
+        if not self.db_path.exists():
+            return
+        tables = tuple(self.EXPORT_TABLES if tables is None else tables)
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            if since is None:
+                conversations = conn.execute(SELECT_EXPORT_CONVERSATIONS)
+            else:
+                conversations = conn.execute(SELECT_EXPORT_CONVERSATIONS_SINCE, (since.astimezone(timezone.utc).isoformat(),))
+            for conversation in conversations:
+                conversation_id = conversation['id']
+                data = {
+                    'conversation_id': conversation_id,
+                    'run_uuid': conversation['run_uuid'],
+                    'question': {'id': conversation['question_id'], 'text': conversation['question_text'] or ''},
+                    'started_at': conversation['started_at'],
+                    'finished_at': conversation['finished_at'],
+                }
+                for table in tables:
+                    rows = [dict(row) for row in conn.execute(SELECT_EXPORT_ROWS[table], (conversation_id,))]
+                    if table == 'messages':
+                        rows = [{'role': row['role'], 'content': row['content_md'], 'scraped_at': row['scraped_at']} for row in rows]
+                    data[table] = rows
+                yield data
+        finally:
+            conn.close()
+
+    def event_source(self):
+        """/events的事件源"""
+        return SQLiteEventSource(self)
+
+    def search(self, query: str, limit: int = 20):
+        """全文检索回答、思考过程和搜索查询, 返回按相关度排序的对话摘要及命中的片段
+
+        字段与SimpleCSVStorage.search一致; 数据库由旧版scraper创建、还没有倒排表时返回空列表。
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        postings = {token: [] for token in tokens}
+        try:
+            rows = self._query(SELECT_POSTINGS.format(placeholders=', '.join('?' * len(tokens))), tokens)
+        except sqlite3.OperationalError:
+            return []
+        for row in rows:
+            postings[row['token']].append((row['conversation_id'], row['source'], row['tf']))
+        total_documents = self._query(SELECT_DOCUMENT_COUNT)[0][0] if rows else 0
+        ranked = rank(postings, total_documents, limit)
+        if not ranked:
+            return []
+
+        conversation_ids = [conversation_id for conversation_id, _, _ in ranked]
+        placeholders = ', '.join('?' * len(conversation_ids))
+        conversations = {
+            row['id']: self._conversation_summary(row)
+            for row in self._query(SELECT_CONVERSATIONS_BY_IDS.format(placeholders=placeholders), conversation_ids)
+        }
+        texts = {}
+        for source, sql in SELECT_SEARCH_TEXT.items():
+            for conversation_id, text in self._query(sql.format(placeholders=placeholders), conversation_ids):
+                texts.setdefault(conversation_id, {}).setdefault(source, []).append(text)
+
+        results = []
+        for conversation_id, score, sources in ranked:
+            if conversation_id not in conversations:
+                continue
+            snippets = []
+            for source in sources:
+                fragment = best_snippet(texts.get(conversation_id, {}).get(source, []), query, tokens)
+                if fragment:
+                    snippets.append({'source': source, 'text': fragment})
+            results.append({**conversations[conversation_id], 'score': score, 'snippets': snippets})
+        return results
+
+    def get_domain_rankings(self, question_id: Optional[int] = None, since: Optional[datetime] = None, limit: int = 20):
+        """被引用最多的域名及其声量占比, 字段与SimpleCSVStorage.get_domain_rankings一致"""
+        since_day = since.astimezone(timezone.utc).date().isoformat() if since else ''
+        try:
+            if question_id is None:
+                rows = self._query(SELECT_DOMAIN_TOTALS, (since_day,))
+            else:
+                rows = self._query(SELECT_QUESTION_DOMAIN_TOTALS, (question_id, since_day))
+        except sqlite3.OperationalError:
+            # 数据库由旧版scraper创建, 还没有汇总表
+            rows = []
+        return domain_rankings({domain: (runs, citations) for domain, runs, citations in rows}, limit)
+
+    def get_entity_rankings(self, question_id: int, since: Optional[datetime] = None, limit: int = 20):
+        """回答中排名实体的出现率和平均名次, 字段与SimpleCSVStorage.get_entity_rankings一致"""
+        since_day = since.astimezone(timezone.utc).date().isoformat() if since else ''
+        try:
+            runs = self._query(SELECT_ENTITY_RUNS, (question_id, since_day))
+            days = self._query(SELECT_ENTITY_DAYS, (question_id, since_day))
+        except sqlite3.OperationalError:
+            # 数据库由旧版scraper创建, 还没有实体表
+            runs, days = [], []
+        days_by_entity = {}
+        for entity, day, appearances, position_sum, best in days:
+            days_by_entity.setdefault(entity, {})[day] = (appearances, position_sum, best)
+
+        def describe(keys):
+            # 同一实体取最近一次出现时的名称和最近一次提取到的属性
+            names = {}
+            for entity, name, attributes in self._query(
+                SELECT_ENTITY_NAMES.format(placeholders=', '.join('?' * len(keys))), [question_id, *keys]
+            ):
+                names[entity] = (name, attributes or names.get(entity, ('', ''))[1])
+            return names
+
+        return entity_rankings({day: count for day, count in runs}, days_by_entity, describe, limit)
+
+    def get_run_timeseries(self, bucket_hours: int = 1, since: Optional[datetime] = None):
+        """按桶的运行数、成功率和耗时分位数, 字段与SimpleCSVStorage.get_run_timeseries一致"""
+        try:
+            rows = self._query(SELECT_RUN_TIMESERIES, (bucket_start_hour(since, bucket_hours),))
+        except sqlite3.OperationalError:
+            # 数据库由旧版scraper创建, 还没有汇总表
+            rows = []
+        hours = {}
+        for hour, started, finished, duration_bin in rows:
+            add_entry(hours, hour, started, finished, duration_bin)
+        return run_timeseries(hours, bucket_hours, since)
+
+    def _count_questions(self):
+        """问题池中的问题数量"""
+        return len(get_registry(self.questions_file))
+
+    def get_stats(self):
+        """获取统计信息"""
+        total_conversations = successful_conversations = total_messages = total_web_searches = 0
+        rows = self._query("SELECT COUNT(*), COUNT(finished_at) FROM conversations")
+        if rows:
+            total_conversations, successful_conversations = rows[0]
+            total_messages = self._query("SELECT COUNT(*) FROM messages")[0][0]
+            total_web_searches = self._query("SELECT COUNT(*) FROM web_searches")[0][0]
+
+        return {
+            'total_conversations': total_conversations,
+            'successful_conversations': successful_conversations,
+            'success_rate': successful_conversations / total_conversations if total_conversations > 0 else 0,
+            'total_messages': total_messages,
+            'total_web_searches': total_web_searches,
+            'total_questions': self._count_questions()
+        }
+
+
+class SQLiteEventSource:
+    """通过新行产生/events事件: id超过上次最大值的对话是run_started, finished_at晚于上次
+    最大值的对话是run_finished; 数据库文件没有变化时不执行查询"""
+
+    def __init__(self, storage: SimpleSQLiteStorage):
+        self.storage = storage
+        self._version = storage.data_version()[0]
+        rows = storage._query(SELECT_EVENT_WATERMARKS)
+        self._last_id, self._last_finished = tuple(rows[0]) if rows else (0, '')
+        self._stats = storage.get_stats()
+
+    def poll(self):
+        version = self.storage.data_version()[0]
+        if version == self._version:
+            return []
+        self._version = version
+
+        events = []
+        for row in self.storage._query(SELECT_STARTED_AFTER, (self._last_id,)):
+            events.append(('run_started', self.storage._conversation_summary(row)))
+            self._last_id = row['id']
+        for row in self.storage._query(SELECT_FINISHED_AFTER, (self._last_finished,)):
+            events.append(('run_finished', self.storage._conversation_summary(row)))
+            self._last_finished = row['finished_at']
+
+        stats = self.storage.get_stats()
+        delta = stats_delta(self._stats, stats)
+        if delta:
+            events.append(('stats_delta', delta))
+            self._stats = stats
+        return events
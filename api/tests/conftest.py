@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import io
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app import csv_api
+from app.csv_api import SimpleCSVStorage
+
+# 与scraper/app/csv_storage.py中各表的列一致
+TABLE_HEADERS = {
+    'conversations': ['id', 'run_uuid', 'question_id', 'question_text', 'started_at', 'finished_at'],
+    'messages': ['id', 'conversation_id', 'role', 'content_md', 'scraped_at'],
+    'web_searches': ['id', 'conversation_id', 'url', 'title', 'fetched_at'],
+    'artifacts': ['id', 'conversation_id', 'type', 'path', 'created_at'],
+    'reasoning': ['id', 'conversation_id', 'reasoning_content', 'created_at'],
+    'search_queries': ['id', 'conversation_id', 'query_text', 'created_at'],
+    'visited_sites': ['id', 'conversation_id', 'site_url', 'site_title', 'site_description', 'created_at'],
+}
+
+
+def format_row(row) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+class CSVData:
+    """按scraper的格式写入数据目录: 分区中的表文件和行偏移索引, 行按调用顺序追加"""
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.index = []
+        self._ids = {}
+
+    def _append(self, table: str, partition: str, row: list, conversation_id: int, run_uuid: str = ''):
+        table_file = self.data_dir / partition / f'{table}.csv'
+        table_file.parent.mkdir(parents=True, exist_ok=True)
+        if not table_file.exists():
+            table_file.write_bytes(format_row(TABLE_HEADERS[table]))
+        offset = table_file.stat().st_size
+        with open(table_file, 'ab') as f:
+            f.write(format_row(row))
+        self.index.append([f'{partition}/{table}.csv', conversation_id, offset, run_uuid])
+        self._write_index()
+
+    def _write_index(self):
+        index_file = self.data_dir / '_meta' / 'row_index.csv'
+        index_file.parent.mkdir(exist_ok=True)
+        index_file.write_bytes(b''.join(format_row(row) for row in [['file', 'conversation_id', 'offset', 'run_uuid']] + self.index))
+
+    def conversation(self, conversation_id: int, started_at: str, finished_at: str = '', question_id: int = 1,
+                     question_text: str = ''):
+        run_uuid = f'00000000-0000-0000-0000-{conversation_id:012d}'
+        row = [conversation_id, run_uuid, question_id, question_text or f'question {question_id}', started_at, finished_at]
+        self._append('conversations', started_at[:7], row, conversation_id, run_uuid)
+        return run_uuid
+
+    def child(self, table: str, conversation_id: int, partition: str, *values):
+        row_id = self._ids[table] = self._ids.get(table, 0) + 1
+        self._append(table, partition, [row_id, conversation_id, *values], conversation_id)
+
+
+class Client:
+    """同步调用ASGI应用的测试客户端, 响应体(包括流式响应)全部读完后返回"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        async def send():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return await client.request(method, path, **kwargs)
+        return asyncio.run(send())
+
+    def get(self, path: str, **kwargs) -> httpx.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> httpx.Response:
+        return self.request('POST', path, **kwargs)
+
+
+@pytest.fixture
+def csv_data(tmp_path):
+    return CSVData(tmp_path)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_api, 'storage', SimpleCSVStorage(str(tmp_path)))
+    return Client(csv_api.app)
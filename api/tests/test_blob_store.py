@@ -0,0 +1,34 @@
+import hashlib
+import json
+
+from app.blob_store import BlobReader
+
+
+def write_blob(data_dir, text):
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    blob_file = data_dir / '_blobs' / digest[:2] / f'{digest}.txt'
+    blob_file.parent.mkdir(parents=True, exist_ok=True)
+    blob_file.write_text(text, encoding='utf-8')
+    return BlobReader.PREFIX + digest
+
+
+def test_resolve_returns_plain_values_unchanged(tmp_path):
+    reader = BlobReader(tmp_path / '_blobs')
+
+    assert reader.resolve('东京拉面') == '东京拉面'
+    assert reader.resolve('') == ''
+    assert reader.resolve(write_blob(tmp_path, '一兰')) == '一兰'
+
+
+def test_question_and_prompt_references_are_resolved(client, csv_data):
+    prompt = write_blob(csv_data.data_dir, '东京拉面')
+    run_uuid = csv_data.conversation(1, '2025-07-08T09:00:00+00:00', '2025-07-08T09:05:00+00:00', question_text=prompt)
+    csv_data.child('messages', 1, '2025-07', 'user', prompt, '2025-07-08T09:05:00+00:00')
+
+    assert client.get('/runs').json()['runs'][0]['question_text'] == '东京拉面'
+    details = client.get(f'/runs/{run_uuid}').json()
+    assert details['question']['text'] == '东京拉面'
+    assert details['messages'][0]['content'] == '东京拉面'
+    exported = json.loads(client.get('/export/ndjson').text.splitlines()[0])
+    assert exported['question']['text'] == '东京拉面'
+    assert exported['messages'][0]['content'] == '东京拉面'
@@ -0,0 +1,46 @@
+from app.csv_cache import CSVFileCache
+
+
+def write_table(path, rows):
+    path.write_text('id,content\n' + ''.join(f'{n},{content}\n' for n, content in enumerate(rows, 1)), encoding='utf-8')
+
+
+def test_cache_parses_only_appended_rows(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    write_table(csv_file, ['a'])
+    cache = CSVFileCache()
+    first = cache.rows(csv_file)
+
+    with open(csv_file, 'a', encoding='utf-8') as f:
+        f.write('2,"multi\nline"\n3,c')
+
+    rows = cache.rows(csv_file)
+    assert rows[0] is first[0]
+    assert [row['content'] for row in rows] == ['a', 'multi\nline']
+
+
+def test_cache_evicts_least_recently_used_files(tmp_path):
+    files = [tmp_path / f'{name}.csv' for name in ('a', 'b', 'c')]
+    for csv_file in files:
+        write_table(csv_file, ['x' * 100])
+    size = files[0].stat().st_size
+    cache = CSVFileCache(max_bytes=2 * size)
+
+    a_rows = cache.rows(files[0])
+    cache.rows(files[1])
+    cache.rows(files[0])
+    cache.rows(files[2])
+
+    assert list(cache._files) == [files[0], files[2]]
+    assert cache.rows(files[0])[0] is a_rows[0]
+    assert cache.rows(files[1])[0]['content'] == 'x' * 100
+
+
+def test_file_larger_than_cache_is_read_but_not_kept(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    write_table(csv_file, ['x' * 100])
+    cache = CSVFileCache(max_bytes=10)
+
+    assert [row['id'] for row in cache.rows(csv_file)] == ['1']
+    assert cache.rows_at(csv_file, [len('id,content\n')])[0]['id'] == '1'
+    assert not cache._files
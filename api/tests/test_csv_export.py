@@ -0,0 +1,52 @@
+import json
+
+from app.csv_export import ConversationRowStream
+
+
+def rows_of(conversation_ids):
+    return iter([{'conversation_id': str(cid), 'n': str(n)} for n, cid in enumerate(conversation_ids)])
+
+
+def test_take_waits_for_rows_written_after_a_later_conversation():
+    # 对话2的40行先写入, 之后才写入对话1的行(两次运行并发, 各自在结束时批量写入)
+    stream = ConversationRowStream(rows_of([2] * 40 + [1, 1, 3]))
+
+    assert len(stream.take(1, 2)) == 2
+    assert len(stream.take(2, 40)) == 40
+    assert len(stream.take(3, 1)) == 1
+
+
+def test_take_without_index_reads_the_whole_file():
+    stream = ConversationRowStream(rows_of([2] * 40 + [1, 3]))
+
+    assert [row['n'] for row in stream.take(1, None)] == ['40']
+    assert len(stream.take(2, None)) == 40
+    assert len(stream.take(3, None)) == 1
+
+
+def test_take_conversation_without_rows():
+    stream = ConversationRowStream(rows_of([2]))
+
+    assert stream.take(1, 0) == []
+    assert len(stream.take(2, 1)) == 1
+
+
+def test_export_joins_child_rows_interleaved_beyond_slack(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00', '2025-07-08T09:05:00+00:00')
+    csv_data.conversation(2, '2025-07-08T09:01:00+00:00', '2025-07-08T09:02:00+00:00')
+    for n in range(40):
+        csv_data.child('visited_sites', 2, '2025-07', f'https://example.com/{n}', f'site {n}', '', '2025-07-08T09:02:00+00:00')
+    csv_data.child('messages', 2, '2025-07', 'user', 'question 1', '2025-07-08T09:02:00+00:00')
+    for n in range(3):
+        csv_data.child('visited_sites', 1, '2025-07', f'https://tabelog.com/{n}', f'tabelog {n}', '', '2025-07-08T09:05:00+00:00')
+    csv_data.child('messages', 1, '2025-07', 'user', 'question 1', '2025-07-08T09:05:00+00:00')
+    csv_data.child('messages', 1, '2025-07', 'assistant', 'answer', '2025-07-08T09:05:00+00:00')
+
+    response = client.get('/export/ndjson')
+
+    assert response.status_code == 200
+    runs = {run['conversation_id']: run for run in map(json.loads, response.text.splitlines())}
+    assert [site['site_url'] for site in runs[1]['visited_sites']] == [f'https://tabelog.com/{n}' for n in range(3)]
+    assert [message['content'] for message in runs[1]['messages']] == ['question 1', 'answer']
+    assert len(runs[2]['visited_sites']) == 40
+    assert len(runs[2]['messages']) == 1
@@ -0,0 +1,66 @@
+from app.csv_index import RowIndexReader
+
+HEADER = b'file,conversation_id,offset,run_uuid\r\n'
+
+
+def test_reader_only_consumes_complete_lines(tmp_path):
+    index_file = tmp_path / 'row_index.csv'
+    index_file.write_bytes(HEADER + b'2025-07/messages.csv,1,40,\r\n2025-07/messages.csv,1,9')
+    reader = RowIndexReader(index_file)
+
+    assert reader.lookup_id(1) == {'2025-07/messages.csv': [40]}
+
+    with open(index_file, 'ab') as f:
+        f.write(b'0,\r\n')
+    assert reader.lookup_id(1) == {'2025-07/messages.csv': [40, 90]}
+
+
+def test_later_conversations_entry_supersedes_earlier_one(tmp_path):
+    index_file = tmp_path / 'row_index.csv'
+    index_file.write_bytes(HEADER + b'2025-07/conversations.csv,1,60,run-1\r\n2025-07/messages.csv,1,40,\r\n')
+    reader = RowIndexReader(index_file)
+    assert reader.lookup('run-1') == (1, {'2025-07/conversations.csv': [60], '2025-07/messages.csv': [40]})
+
+    with open(index_file, 'ab') as f:
+        f.write(b'2025-07/conversations.csv,1,75,run-1\r\n')
+
+    assert reader.lookup('run-1') == (1, {'2025-07/conversations.csv': [75], '2025-07/messages.csv': [40]})
+
+
+def test_reader_reloads_rewritten_index(tmp_path):
+    index_file = tmp_path / 'row_index.csv'
+    index_file.write_bytes(HEADER + b'2025-07/conversations.csv,1,60,run-1\r\n')
+    reader = RowIndexReader(index_file)
+    assert reader.lookup('run-1') is not None
+
+    tmp_file = tmp_path / 'row_index.csv.tmp'
+    tmp_file.write_bytes(HEADER + b'2025-07/conversations.csv,2,60,run-2\r\n')
+    tmp_file.replace(index_file)
+
+    assert reader.lookup('run-1') is None
+    assert reader.lookup('run-2') == (2, {'2025-07/conversations.csv': [60]})
+
+
+def test_missing_index(tmp_path):
+    assert RowIndexReader(tmp_path / 'row_index.csv').lookup('run-1') is None
+
+
+def test_stale_conversation_offsets_fall_back_to_a_scan(client, csv_data):
+    from app import csv_api
+
+    run_uuids = [csv_data.conversation(cid, f'2025-07-08T0{cid}:00:00+00:00') for cid in (1, 2, 3)]
+    conversations_file = csv_data.data_dir / '2025-07' / 'conversations.csv'
+    # 像scraper合并状态日志那样重写对话表, 取代旧偏移的索引项还没有追加
+    data = conversations_file.read_bytes().replace(b'question 1,2025-07-08T01:00:00+00:00,',
+                                                   '东京最好吃的拉面店,2025-07-08T01:00:00+00:00,2025-07-08T01:05:00+00:00'.encode())
+    tmp_file = conversations_file.with_name('conversations.csv.tmp')
+    tmp_file.write_bytes(data)
+    tmp_file.replace(conversations_file)
+
+    for conversation_id, run_uuid in zip((1, 2, 3), run_uuids):
+        summary = csv_api.storage.get_conversation_summary(conversation_id)
+        assert (summary['id'], summary['run_uuid']) == (conversation_id, run_uuid)
+        response = client.get(f'/runs/{run_uuid}')
+        assert response.status_code == 200
+        assert response.json()['run_uuid'] == run_uuid
+    assert csv_api.storage.get_conversation_summary(1)['finished_at'] == '2025-07-08T01:05:00+00:00'
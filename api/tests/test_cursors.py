@@ -0,0 +1,71 @@
+import pytest
+
+from app.cursors import RunCursor
+
+
+def test_cursor_round_trip():
+    cursor = RunCursor('2025-07-08T09:00:00+00:00', 42)
+
+    decoded = RunCursor.decode(cursor.encode())
+
+    assert decoded.key == ('2025-07-08T09:00:00+00:00', 42)
+    assert decoded.partition is None and decoded.position is None
+
+
+def test_cursor_round_trip_with_partition_hint():
+    decoded = RunCursor.decode(RunCursor('2025-07-08T09:00:00+00:00', 42, '2025-07', 17).encode())
+
+    assert (decoded.partition, decoded.position) == ('2025-07', 17)
+
+
+def test_cursor_is_url_safe_without_padding():
+    encoded = RunCursor('2025-07-08T09:00:00+00:00', 1, '', 0).encode()
+
+    assert '=' not in encoded and '+' not in encoded and '/' not in encoded
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', 'eyJzIjoxfQ', 'eyJzIjoiYSIsImkiOiIxIn0'])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        RunCursor.decode(cursor)
+
+
+def page_through(client, path):
+    ids, cursor = [], None
+    while True:
+        response = client.get(path, params={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        ids.extend(run['id'] for run in page['runs'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_runs_pages_through_all_partitions_with_cursor(client, csv_data):
+    csv_data.conversation(1, '2025-06-30T23:00:00+00:00')
+    csv_data.conversation(2, '2025-07-01T08:00:00+00:00')
+    # 开始时间相同的运行按id排序, 不会跨页重复或遗漏
+    csv_data.conversation(3, '2025-07-01T09:00:00+00:00')
+    csv_data.conversation(4, '2025-07-01T09:00:00+00:00')
+    csv_data.conversation(5, '2025-07-02T09:00:00+00:00')
+
+    assert page_through(client, '/runs') == [5, 4, 3, 2, 1]
+
+
+def test_runs_cursor_is_stable_while_new_runs_arrive(client, csv_data):
+    for cid in range(1, 5):
+        csv_data.conversation(cid, f'2025-07-0{cid}T09:00:00+00:00')
+
+    first = client.get('/runs', params={'limit': 2}).json()
+    csv_data.conversation(5, '2025-07-05T09:00:00+00:00')
+    second = client.get('/runs', params={'limit': 2, 'cursor': first['next_cursor']}).json()
+
+    assert [run['id'] for run in first['runs']] == [4, 3]
+    assert [run['id'] for run in second['runs']] == [2, 1]
+
+
+def test_runs_rejects_invalid_cursor(client, csv_data):
+    csv_data.conversation(1, '2025-07-01T09:00:00+00:00')
+
+    assert client.get('/runs', params={'cursor': 'not-a-cursor'}).status_code == 400
@@ -0,0 +1,35 @@
+from app.domain_rollup import domain_rankings
+from conftest import format_row
+
+
+def test_domain_rankings_share_of_voice():
+    totals = {'': (4, 10), 'tabelog.com': (3, 6), 'retty.me': (2, 4)}
+
+    rankings = domain_rankings(totals, limit=1)
+
+    assert rankings['total_runs'] == 4 and rankings['total_citations'] == 10
+    assert rankings['domains'] == [{'domain': 'tabelog.com', 'citations': 6, 'runs': 3, 'share_of_voice': 0.6, 'run_rate': 0.75}]
+
+
+def test_rankings_endpoint_filters_by_question_and_day(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+    rollup_file = csv_data.data_dir / '_meta' / 'domain_rollup.csv'
+    rows = [['day', 'question_id', 'domain', 'runs', 'citations'],
+            ['2025-07-07', 1, 'retty.me', 1, 5], ['2025-07-07', 1, '', 1, 5],
+            ['2025-07-08', 1, 'tabelog.com', 1, 2], ['2025-07-08', 1, '', 1, 2],
+            ['2025-07-08', 2, 'retty.me', 1, 1], ['2025-07-08', 2, '', 1, 1],
+            ['2025-07-09', 1, 'tabelog.com', 1, 1], ['2025-07-09', 1, 'retty.me', 1, 1], ['2025-07-09', 1, '', 1, 2]]
+    rollup_file.write_bytes(b''.join(format_row(row) for row in rows))
+
+    body = client.get('/rankings/domains', params={'question_id': 1, 'since': '2025-07-08T12:00:00'}).json()
+
+    assert body['since'] == '2025-07-08'
+    assert (body['total_runs'], body['total_citations']) == (2, 4)
+    assert [(domain['domain'], domain['citations']) for domain in body['domains']] == [('tabelog.com', 3), ('retty.me', 1)]
+    assert client.get('/rankings/domains').json()['total_runs'] == 4
+
+
+def test_rankings_endpoint_without_rollup(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+
+    assert client.get('/rankings/domains').json()['domains'] == []
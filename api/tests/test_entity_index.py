@@ -0,0 +1,36 @@
+from conftest import format_row
+
+
+def write_entities(csv_data, rows):
+    """按scraper的格式写入排名实体表, position为0的行表示一次完成的运行"""
+    entity_file = csv_data.data_dir / '_meta' / 'ranked_entities.csv'
+    entity_file.parent.mkdir(exist_ok=True)
+    header = ['conversation_id', 'question_id', 'day', 'position', 'entity', 'name', 'attributes']
+    entity_file.write_bytes(b''.join(format_row(row) for row in [header] + rows))
+
+
+def test_entity_rankings_endpoint(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+    write_entities(csv_data, [
+        [1, 3, '2025-07-08', 0, '', '', ''],
+        [1, 3, '2025-07-08', 1, 'nakiryu', 'Nakiryu', '{"price": "1200日元"}'],
+        [1, 3, '2025-07-08', 2, 'tsuta', 'Tsuta', ''],
+        [2, 3, '2025-07-09', 0, '', '', ''],
+        [2, 3, '2025-07-09', 1, 'tsuta', 'Tsuta', ''],
+        [2, 3, '2025-07-09', 3, 'nakiryu', 'NAKIRYU', ''],
+        [3, 4, '2025-07-09', 0, '', '', ''],
+        [3, 4, '2025-07-09', 1, 'ichiran', 'Ichiran', ''],
+    ])
+
+    body = client.get('/rankings/entities', params={'question_id': 3}).json()
+
+    assert body['total_runs'] == 2 and body['count'] == 2
+    tsuta, nakiryu = body['entities']
+    assert (tsuta['entity'], tsuta['average_position'], tsuta['best_position']) == ('Tsuta', 1.5, 1)
+    # 名称取最近一次出现的写法, 属性保留最近一次提取到的
+    assert (nakiryu['entity'], nakiryu['average_position'], nakiryu['attributes']) == ('NAKIRYU', 2.0, {'price': '1200日元'})
+    assert [point['appearance_rate'] for point in tsuta['timeline']] == [1.0, 1.0]
+
+    since = client.get('/rankings/entities', params={'question_id': 3, 'since': '2025-07-09T00:00:00'}).json()
+    assert since['total_runs'] == 1
+    assert [entity['entity'] for entity in since['entities']] == ['Tsuta', 'NAKIRYU']
@@ -0,0 +1,60 @@
+from app.http_cache import IMMUTABLE_CACHE_CONTROL
+
+
+def test_runs_revalidates_with_etag_until_data_changes(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+
+    first = client.get('/runs')
+    etag = first.headers['etag']
+    assert first.status_code == 200
+    assert first.headers['cache-control'] == 'no-cache'
+
+    cached = client.get('/runs', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.content == b''
+    assert cached.headers['etag'] == etag
+
+    # 查询参数不同的响应是不同的缓存条目
+    assert client.get('/runs?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+    csv_data.conversation(2, '2025-07-08T10:00:00+00:00')
+    changed = client.get('/runs', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['etag'] != etag
+    assert changed.json()['count'] == 2
+
+
+def test_stats_honours_if_modified_since(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+
+    first = client.get('/stats')
+    assert first.status_code == 200
+
+    cached = client.get('/stats', headers={'If-Modified-Since': first.headers['last-modified']})
+    assert cached.status_code == 304
+
+
+def test_finished_run_is_immutable(client, csv_data):
+    run_uuid = csv_data.conversation(1, '2025-07-08T09:00:00+00:00', '2025-07-08T09:05:00+00:00')
+
+    first = client.get(f'/runs/{run_uuid}')
+    assert first.status_code == 200
+    assert first.headers['cache-control'] == IMMUTABLE_CACHE_CONTROL
+
+    # 之后写入其他数据, 已完成运行的ETag仍然有效
+    csv_data.conversation(2, '2025-07-08T10:00:00+00:00')
+    cached = client.get(f'/runs/{run_uuid}', headers={'If-None-Match': first.headers['etag']})
+    assert cached.status_code == 304
+
+
+def test_running_run_revalidates(client, csv_data):
+    run_uuid = csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+
+    first = client.get(f'/runs/{run_uuid}')
+    assert first.headers['cache-control'] == 'no-cache'
+    assert client.get(f'/runs/{run_uuid}', headers={'If-None-Match': first.headers['etag']}).status_code == 304
+
+    csv_data.child('messages', 1, '2025-07', 'user', 'question 1', '2025-07-08T09:01:00+00:00')
+    changed = client.get(f'/runs/{run_uuid}', headers={'If-None-Match': first.headers['etag']})
+    assert changed.status_code == 200
+    assert len(changed.json()['messages']) == 1
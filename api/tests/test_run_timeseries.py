@@ -0,0 +1,87 @@
+import math
+from datetime import datetime, timezone
+
+import pytest
+
+from app.run_timeseries import GAMMA, add_entry, bucket_start_hour, parse_bucket, quantile, run_timeseries
+from conftest import format_row
+
+
+def test_parse_bucket():
+    assert parse_bucket('1h') == 1
+    assert parse_bucket('6H') == 6
+    assert parse_bucket('1d') == 24
+
+
+@pytest.mark.parametrize('bucket', ['0h', '15m', 'h', '1w', ''])
+def test_parse_bucket_rejects_invalid_width(bucket):
+    with pytest.raises(ValueError):
+        parse_bucket(bucket)
+
+
+def test_quantile_returns_bin_midpoint():
+    # 第i格覆盖(GAMMA^(i-1), GAMMA^i]秒
+    histogram = {100: 50, 200: 49, 300: 1}
+
+    assert quantile(histogram, 0.5) == round(2 * GAMMA ** 100 / (GAMMA + 1), 2)
+    assert quantile(histogram, 0.9) == round(2 * GAMMA ** 200 / (GAMMA + 1), 2)
+    assert quantile(histogram, 0.99) == round(2 * GAMMA ** 200 / (GAMMA + 1), 2)
+    assert quantile(histogram, 1.0) == round(2 * GAMMA ** 300 / (GAMMA + 1), 2)
+
+
+def test_quantile_of_empty_histogram():
+    assert quantile({}, 0.5) is None
+
+
+def test_run_timeseries_merges_hours_into_aligned_buckets():
+    hours = {}
+    add_entry(hours, '2025-07-08T05', 2, 0, '')
+    add_entry(hours, '2025-07-08T05', 0, 1, '150')
+    add_entry(hours, '2025-07-08T07', 1, 0, '')
+    add_entry(hours, '2025-07-08T07', 0, 1, '160')
+    add_entry(hours, '2025-07-09T01', 1, 0, '')
+
+    series = run_timeseries(hours, 6)
+
+    assert [(point['start'], point['count'], point['finished'], point['success_rate']) for point in series] == [
+        ('2025-07-08T00:00:00+00:00', 2, 1, 0.5),
+        ('2025-07-08T06:00:00+00:00', 1, 1, 1.0),
+        ('2025-07-09T00:00:00+00:00', 1, 0, 0.0),
+    ]
+    assert series[2]['p50'] is None
+
+
+def test_run_timeseries_since_keeps_the_bucket_containing_it():
+    hours = {}
+    for hour in ('2025-07-07T23', '2025-07-08T01', '2025-07-08T23'):
+        add_entry(hours, hour, 1, 0, '')
+    since = datetime(2025, 7, 8, 12, 30, tzinfo=timezone.utc)
+
+    series = run_timeseries(hours, 24, since)
+
+    assert [(point['start'], point['count']) for point in series] == [('2025-07-08T00:00:00+00:00', 2)]
+    assert bucket_start_hour(since, 24) == '2025-07-08T00'
+    assert bucket_start_hour(since, 6) == '2025-07-08T12'
+
+
+def test_timeseries_endpoint_merges_hours_into_buckets(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+    five_minutes = math.ceil(math.log(300) / math.log(GAMMA))
+    rows = [['hour', 'started', 'finished', 'duration_bin'],
+            ['2025-07-08T01', 1, 0, ''], ['2025-07-08T01', 0, 1, five_minutes],
+            ['2025-07-08T09', 1, 0, ''], ['2025-07-08T09', 1, 0, ''], ['2025-07-08T09', 0, 1, five_minutes],
+            ['2025-07-09T02', 1, 0, '']]
+    (csv_data.data_dir / '_meta' / 'run_timeseries.csv').write_bytes(b''.join(format_row(row) for row in rows))
+
+    body = client.get('/metrics/runs/timeseries', params={'bucket': '1d'}).json()
+
+    assert [(point['start'], point['count'], point['finished'], point['success_rate']) for point in body['buckets']] == [
+        ('2025-07-08T00:00:00+00:00', 3, 2, 0.6667),
+        ('2025-07-09T00:00:00+00:00', 1, 0, 0.0),
+    ]
+    assert abs(body['buckets'][0]['p50'] - 300) < 3
+    assert body['buckets'][1]['p50'] is None
+
+    since = client.get('/metrics/runs/timeseries', params={'bucket': '6h', 'since': '2025-07-08T07:00:00'}).json()
+    assert [point['start'] for point in since['buckets']] == ['2025-07-08T06:00:00+00:00', '2025-07-09T00:00:00+00:00']
+    assert client.get('/metrics/runs/timeseries', params={'bucket': '15m'}).status_code == 400
@@ -0,0 +1,59 @@
+from app.config import settings
+
+
+def write_runs(csv_data):
+    run_uuids = []
+    for cid in range(1, 4):
+        run_uuids.append(csv_data.conversation(cid, f'2025-07-0{cid}T09:00:00+00:00', f'2025-07-0{cid}T09:05:00+00:00'))
+        csv_data.child('messages', cid, '2025-07', 'user', f'question {cid}', f'2025-07-0{cid}T09:05:00+00:00')
+        csv_data.child('web_searches', cid, '2025-07', f'https://example.com/{cid}', 'example', f'2025-07-0{cid}T09:05:00+00:00')
+    return run_uuids
+
+
+def test_batch_returns_runs_in_request_order_and_lists_missing(client, csv_data):
+    run_uuids = write_runs(csv_data)
+    unknown = '00000000-0000-0000-0000-999999999999'
+
+    response = client.post('/runs/batch', json={'run_uuids': [run_uuids[2], unknown, run_uuids[0], run_uuids[2]]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [run['run_uuid'] for run in body['runs']] == [run_uuids[2], run_uuids[0]]
+    assert body['count'] == 2
+    assert body['missing'] == [unknown]
+
+
+def test_batch_matches_single_run_details(client, csv_data):
+    run_uuids = write_runs(csv_data)
+
+    batch = client.post('/runs/batch', json={'run_uuids': run_uuids}).json()['runs']
+
+    assert batch == [client.get(f'/runs/{run_uuid}').json() for run_uuid in run_uuids]
+
+
+def test_batch_reads_runs_missing_from_the_index(client, csv_data):
+    run_uuids = write_runs(csv_data)
+    # 第3个运行不在行偏移索引中, 需要在对话表中定位
+    csv_data.index = [entry for entry in csv_data.index if entry[1] != 3]
+    csv_data._write_index()
+
+    runs = client.post('/runs/batch', json={'run_uuids': run_uuids}).json()['runs']
+
+    assert [run['messages'][0]['content'] for run in runs] == ['question 1', 'question 2', 'question 3']
+    assert [len(run['web_searches']) for run in runs] == [1, 1, 1]
+
+
+def test_batch_fields_limit_child_tables(client, csv_data):
+    run_uuids = write_runs(csv_data)
+
+    run = client.post('/runs/batch', json={'run_uuids': run_uuids[:1], 'fields': ['messages']}).json()['runs'][0]
+
+    assert len(run['messages']) == 1
+    assert 'web_searches' not in run
+
+
+def test_batch_rejects_too_many_runs(client, csv_data, monkeypatch):
+    run_uuids = write_runs(csv_data)
+    monkeypatch.setattr(settings, 'batch_max_runs', 2)
+
+    assert client.post('/runs/batch', json={'run_uuids': run_uuids}).status_code == 400
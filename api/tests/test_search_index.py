@@ -0,0 +1,78 @@
+from app.search_index import rank, snippet, tokenize
+from conftest import format_row
+
+
+def test_tokenize_matches_scraper_rules():
+    assert tokenize('东京拉面 Best') == ['东京', '京拉', '拉面', 'best']
+
+
+def test_rank_prefers_documents_matching_all_tokens():
+    postings = {
+        '拉面': [(1, 'messages', 5), (2, 'messages', 1)],
+        '东京': [(2, 'messages', 1)],
+    }
+
+    results = rank(postings, total_documents=10, limit=10)
+
+    assert [conversation_id for conversation_id, _, _ in results] == [2, 1]
+
+
+def test_rank_weights_answers_above_reasoning():
+    postings = {'ramen': [(1, 'reasoning', 1), (2, 'messages', 1)]}
+
+    results = rank(postings, total_documents=10, limit=10)
+
+    assert [conversation_id for conversation_id, _, _ in results] == [2, 1]
+    assert results[0][2] == ['messages']
+
+
+def test_rank_sums_sources_and_applies_limit():
+    postings = {'ramen': [(1, 'messages', 1), (1, 'search_queries', 2), (2, 'messages', 1), (3, 'messages', 1)]}
+
+    results = rank(postings, total_documents=3, limit=2)
+
+    assert len(results) == 2
+    assert results[0][0] == 1
+    assert results[0][2] == ['messages', 'search_queries']
+
+
+def test_rank_without_postings():
+    assert rank({'ramen': []}, total_documents=5, limit=10) == []
+
+
+def test_snippet_centers_on_query():
+    text = 'a' * 100 + ' Tokyo Ramen ' + 'b' * 100
+
+    fragment = snippet(text, 'tokyo ramen', tokenize('tokyo ramen'))
+
+    assert 'Tokyo Ramen' in fragment
+    assert fragment.startswith('…') and fragment.endswith('…')
+
+
+def write_postings(csv_data, rows):
+    """按scraper的格式写入倒排索引"""
+    index_file = csv_data.data_dir / '_meta' / 'search_postings.csv'
+    index_file.parent.mkdir(exist_ok=True)
+    index_file.write_bytes(b''.join(format_row(row) for row in [['token', 'conversation_id', 'source', 'tf']] + rows))
+
+
+def test_search_endpoint_returns_ranked_runs_with_snippets(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00', '2025-07-08T09:05:00+00:00')
+    csv_data.child('messages', 1, '2025-07', 'assistant', '渋谷のうどん', '2025-07-08T09:05:00+00:00')
+    csv_data.conversation(2, '2025-07-08T10:00:00+00:00', '2025-07-08T10:05:00+00:00')
+    csv_data.child('messages', 2, '2025-07', 'assistant', '东京拉面推荐: 一兰', '2025-07-08T10:05:00+00:00')
+    write_postings(csv_data, [['东京', 2, 'messages', 1], ['京拉', 2, 'messages', 1], ['拉面', 2, 'messages', 1],
+                              ['うど', 1, 'messages', 1]])
+
+    body = client.get('/search', params={'q': '东京拉面'}).json()
+
+    assert body['count'] == 1
+    assert body['results'][0]['id'] == 2
+    assert body['results'][0]['snippets'][0]['source'] == 'messages'
+    assert '东京拉面' in body['results'][0]['snippets'][0]['text']
+
+
+def test_search_without_index_returns_no_results(client, csv_data):
+    csv_data.conversation(1, '2025-07-08T09:00:00+00:00')
+
+    assert client.get('/search', params={'q': 'ramen'}).json()['results'] == []
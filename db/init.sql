@@ -46,6 +46,8 @@ CREATE TABLE artifacts (
 -- Create indexes
 CREATE INDEX idx_conversations_run_uuid ON conversations(run_uuid);
 CREATE INDEX idx_conversations_started_at ON conversations(started_at);
+CREATE INDEX idx_conversations_started_at_id ON conversations(started_at, id);
+CREATE INDEX idx_conversations_finished_at ON conversations(finished_at);
 CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
 CREATE INDEX idx_web_searches_conversation_id ON web_searches(conversation_id);
 CREATE INDEX idx_artifacts_conversation_id ON artifacts(conversation_id);
@@ -9,24 +9,77 @@ document.addEventListener('DOMContentLoaded', () => {
     loadQuestions();
     loadRecentRuns();
     initResponseTimeChart();
+    loadRunTimeseries();
     
-    // 每30秒刷新数据
-    setInterval(() => {
+    // 服务端推送运行和统计的变化, 不支持SSE的浏览器退回每30秒刷新
+    if (window.EventSource) {
+        subscribeEvents();
+    } else {
+        setInterval(() => {
+            loadStats();
+            loadRecentRuns();
+            loadRunTimeseries();
+        }, 30000);
+    }
+});
+
+// 订阅/events推送
+function subscribeEvents() {
+    const source = new EventSource(`${API_URL}/events`);
+    let connected = false;
+    
+    source.onopen = () => {
+        // 断线重连期间可能漏掉事件, 重新加载一次
+        if (connected) {
+            loadStats();
+            loadRecentRuns();
+            loadRunTimeseries();
+        }
+        connected = true;
+    };
+    
+    source.addEventListener('run_started', scheduleRunsReload);
+    source.addEventListener('run_finished', scheduleRunsReload);
+    source.addEventListener('stats_delta', event => applyStats(JSON.parse(event.data)));
+    source.addEventListener('resync', () => {
         loadStats();
         loadRecentRuns();
-    }, 30000);
-});
+        loadRunTimeseries();
+    });
+}
 
-// 加载统计数据
-async function loadStats() {
-    try {
-        const response = await axios.get(`${API_URL}/stats`);
-        const stats = response.data;
-        
+// 同一批事件只重新加载一次运行列表
+let runsReloadTimer = null;
+function scheduleRunsReload() {
+    if (runsReloadTimer) return;
+    runsReloadTimer = setTimeout(() => {
+        runsReloadTimer = null;
+        loadRecentRuns();
+        loadRunTimeseries();
+    }, 200);
+}
+
+// 更新统计卡片, 只包含变化了的字段
+function applyStats(stats) {
+    if (stats.total_conversations !== undefined) {
         document.getElementById('totalConversations').textContent = stats.total_conversations;
+    }
+    if (stats.success_rate !== undefined) {
         document.getElementById('successRate').textContent = (stats.success_rate * 100).toFixed(1) + '%';
+    }
+    if (stats.total_messages !== undefined) {
         document.getElementById('totalMessages').textContent = stats.total_messages;
+    }
+    if (stats.total_web_searches !== undefined) {
         document.getElementById('totalSearches').textContent = stats.total_web_searches;
+    }
+}
+
+// 加载统计数据
+async function loadStats() {
+    try {
+        const response = await axios.get(`${API_URL}/stats`);
+        applyStats(response.data);
     } catch (error) {
         console.error('Failed to load stats:', error);
     }
@@ -89,9 +142,6 @@ async function loadRecentRuns() {
             `;
             tbody.appendChild(row);
         });
-        
-        // 更新响应时间图表
-        updateResponseTimeChart(runs);
     } catch (error) {
         console.error('Failed to load runs:', error);
     }
@@ -141,7 +191,7 @@ async function triggerCustomScrape() {
 // 查看详情
 async function viewDetails(runUuid) {
     try {
-        const response = await axios.get(`${API_URL}/runs/${runUuid}`);
+        const response = await axios.get(`${API_URL}/runs/${runUuid}`, { params: { fields: 'messages,web_searches' } });
         const data = response.data;
         
         let content = `
@@ -207,11 +257,23 @@ function initResponseTimeChart() {
         data: {
             labels: [],
             datasets: [{
-                label: '响应时间 (秒)',
+                label: 'p50 响应时间 (秒)',
                 data: [],
                 borderColor: 'rgb(59, 130, 246)',
                 backgroundColor: 'rgba(59, 130, 246, 0.1)',
                 tension: 0.1
+            }, {
+                label: 'p90 响应时间 (秒)',
+                data: [],
+                borderColor: 'rgb(245, 158, 11)',
+                backgroundColor: 'rgba(245, 158, 11, 0.1)',
+                tension: 0.1
+            }, {
+                label: 'p99 响应时间 (秒)',
+                data: [],
+                borderColor: 'rgb(239, 68, 68)',
+                backgroundColor: 'rgba(239, 68, 68, 0.1)',
+                tension: 0.1
             }]
         },
         options: {
@@ -226,15 +288,28 @@ function initResponseTimeChart() {
     });
 }
 
+// 加载最近24小时按小时汇总的响应时间, 分位数由服务端计算
+async function loadRunTimeseries() {
+    try {
+        const since = new Date(Date.now() - 24 * 3600 * 1000).toISOString();
+        const response = await axios.get(`${API_URL}/metrics/runs/timeseries`, { params: { bucket: '1h', since } });
+        updateResponseTimeChart(response.data.buckets);
+    } catch (error) {
+        console.error('Failed to load run timeseries:', error);
+    }
+}
+
 // 更新响应时间图表
-function updateResponseTimeChart(runs) {
+function updateResponseTimeChart(buckets) {
     if (!responseTimeChart) return;
     
-    const validRuns = runs.filter(r => r.duration_seconds).slice(0, 20).reverse();
+    const validBuckets = buckets.filter(b => b.p50 !== null);
     
-    responseTimeChart.data.labels = validRuns.map(r => 
-        new Date(r.started_at).toLocaleTimeString('zh-CN', { hour: '2-digit', minute: '2-digit' })
+    responseTimeChart.data.labels = validBuckets.map(b => 
+        new Date(b.start).toLocaleTimeString('zh-CN', { hour: '2-digit', minute: '2-digit' })
     );
-    responseTimeChart.data.datasets[0].data = validRuns.map(r => r.duration_seconds);
+    responseTimeChart.data.datasets[0].data = validBuckets.map(b => b.p50);
+    responseTimeChart.data.datasets[1].data = validBuckets.map(b => b.p90);
+    responseTimeChart.data.datasets[2].data = validBuckets.map(b => b.p99);
     responseTimeChart.update();
 }
\ No newline at end of file
@@ -0,0 +1,53 @@
+import hashlib
+import os
+from pathlib import Path
+
+from loguru import logger
+
+
+class BlobStore:
+    """按内容寻址的正文存储
+
+    较长的消息和思考过程正文按sha256保存为 _blobs/<前两位>/<哈希>.txt, CSV字段中只写
+    固定长度的引用 blob:sha256:<哈希>。相同正文只保存一份; 文件一旦写入就不再改变。
+    提问(对话的问题文本和user消息)每次运行都重复, 不论长短都保存为blob。
+    """
+
+    PREFIX = 'blob:sha256:'
+
+    # 短于此字节数的正文直接写在CSV里
+    MIN_BYTES = 256
+
+    def __init__(self, blob_dir: Path):
+        self.blob_dir = blob_dir
+        self.blob_dir.mkdir(exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}.txt"
+
+    def put(self, text: str, always: bool = False) -> str:
+        """保存正文并返回CSV中写入的值: 长正文(always为True时任意正文)返回引用, 短正文原样返回"""
+        data = text.encode('utf-8')
+        # 恰好以引用前缀开头的正文也存为blob, 读取时不会被误认为引用
+        if not always and len(data) < self.MIN_BYTES and not text.startswith(self.PREFIX):
+            return text
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(path.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return self.PREFIX + digest
+
+    def resolve(self, value: str) -> str:
+        """把CSV中的值还原为正文, 不是引用时原样返回"""
+        if not value or not value.startswith(self.PREFIX):
+            return value
+        try:
+            with open(self._path(value[len(self.PREFIX):]), 'r', encoding='utf-8', newline='') as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"Missing blob for {value}")
+            return value
@@ -37,6 +37,22 @@ class Settings(BaseSettings):
     # Demo mode - simulate responses without real ChatGPT
     demo_mode: bool = False
     
+    # CSV存储刷盘策略: none / run (每次运行结果写入后fsync) / always (每次追加都fsync)
+    csv_fsync_policy: str = "none"
+    
+    # 后台写线程队列长度, 队列满时写入方等待
+    csv_write_queue_size: int = 1000
+    
+    # CSV分区目录名格式(strftime), 默认按月; 为空时不分区
+    csv_partition_format: str = "%Y-%m"
+    
+    # 已关闭分区的归档压缩格式: gzip / zstd (需要zstandard)
+    csv_archive_codec: str = "gzip"
+    
+    # 存储后端: csv / sqlite (API读取同一设置)
+    storage_backend: str = "csv"
+    sqlite_path: str = "/app/data/pandarank.db"
+    
     # Additional settings from .env
     tz: Optional[str] = None
     scraper_port: Optional[int] = None
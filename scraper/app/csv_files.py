@@ -0,0 +1,289 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖, 只有zstd归档需要
+    zstandard = None
+
+
+def format_record(row: List) -> bytes:
+    """把一行字段格式化为CSV记录字节, 与csv.writer追加写入的格式一致"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+def parse_record(raw: bytes) -> List[str]:
+    """把一条完整的CSV记录(字节)解析为字段列表"""
+    reader = csv.reader(io.StringIO(raw.decode('utf-8'), newline=''))
+    return next(reader, [])
+
+
+def iter_rows_reverse(csv_file: Path, block_size: int = 64 * 1024) -> Iterator[Tuple[int, List[str]]]:
+    """从文件末尾按块向前读取CSV记录, 依次返回(记录起始偏移, 字段列表), 跳过表头
+
+    带引号的字段里可能包含换行, 因此只有当换行之后到记录末尾的引号数为偶数时,
+    该换行才是记录边界。引号字节(0x22)不会出现在UTF-8多字节序列中, 可以直接按字节统计。
+    """
+    with open(csv_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        carry = b''
+        parity = 0
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            block = f.read(pos - start)
+            data = block + carry
+            record_end = len(data)
+            scan = len(block)
+            while True:
+                newline = data.rfind(b'\n', 0, scan)
+                if newline == -1:
+                    parity ^= data.count(b'"', 0, scan) & 1
+                    break
+                parity ^= data.count(b'"', newline + 1, scan) & 1
+                scan = newline
+                if parity == 0:
+                    if data[newline + 1:record_end].strip():
+                        yield start + newline + 1, parse_record(data[newline + 1:record_end])
+                    record_end = newline + 1
+            carry = data[:record_end]
+            pos = start
+        # 剩下的carry是表头
+
+
+def iter_rows_forward(csv_file: Path, start: int = 0) -> Iterator[Tuple[int, List[str]]]:
+    """从start偏移(必须是记录起点)开始顺序读取CSV记录, 返回(记录起始偏移, 字段列表)
+
+    start为0时跳过表头。末尾没有换行的半条记录(写入中)不会返回。归档的压缩文件同样可以读取。
+    """
+    with open_data_file(csv_file) as f:
+        if start:
+            f.seek(start)
+        offset = start
+        record_start = start
+        buffer = b''
+        quotes = 0
+        skip = start == 0
+        for line in f:
+            if not buffer:
+                record_start = offset
+            buffer += line
+            quotes += line.count(b'"')
+            offset += len(line)
+            if quotes % 2 == 0 and buffer.endswith(b'\n'):
+                if skip:
+                    skip = False
+                elif buffer.strip():
+                    yield record_start, parse_record(buffer)
+                buffer = b''
+                quotes = 0
+
+
+def _read_record(f) -> bytes:
+    """从当前位置读取一条完整记录"""
+    buffer = b''
+    quotes = 0
+    for line in iter(f.readline, b''):
+        buffer += line
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            break
+    return buffer
+
+
+# 归档后的数据文件后缀, 读取时按此顺序查找
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+
+
+def resolve_data_file(csv_file: Path) -> Optional[Path]:
+    """数据文件的实际路径: 未压缩的.csv, 或归档后的.csv.zst / .csv.gz, 都不存在时返回None"""
+    if csv_file.exists():
+        return csv_file
+    for suffix in COMPRESSED_SUFFIXES:
+        candidate = csv_file.with_name(csv_file.name + suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def open_data_file(csv_file: Path):
+    """以二进制流打开数据文件, 归档的压缩文件边读边解压"""
+    path = resolve_data_file(csv_file)
+    if path is None:
+        raise FileNotFoundError(csv_file)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def open_data_text(csv_file: Path):
+    """以文本方式打开数据文件, 用于csv.DictReader"""
+    return io.TextIOWrapper(open_data_file(csv_file), encoding='utf-8')
+
+
+def iter_dicts_newest_first(csv_file: Path) -> Iterator[Dict[str, str]]:
+    """从最后一行开始向前返回记录字典; 归档的压缩文件不能反向读取, 整个读入后倒序返回"""
+    path = resolve_data_file(csv_file)
+    if path is None:
+        return
+    with open_data_file(csv_file) as f:
+        header = parse_record(_read_record(f))
+        if path != csv_file:
+            rows = []
+            while True:
+                raw = _read_record(f)
+                if not raw:
+                    break
+                if raw.strip():
+                    rows.append(parse_record(raw))
+            for row in reversed(rows):
+                yield dict(zip(header, row))
+            return
+    for _, row in iter_rows_reverse(csv_file):
+        yield dict(zip(header, row))
+
+
+def read_rows_at(csv_file: Path, offsets: Iterable[int]) -> List[Dict[str, str]]:
+    """按字节偏移直接读取若干条记录, 以表头为键返回字典列表
+
+    偏移是未压缩数据中的位置; 压缩文件不能随机访问, 按偏移顺序向前流式跳过。
+    """
+    rows = []
+    path = resolve_data_file(csv_file)
+    if path is None:
+        return rows
+    seekable = path == csv_file
+    with open_data_file(csv_file) as f:
+        header_raw = _read_record(f)
+        header = parse_record(header_raw)
+        position = len(header_raw)
+        for offset in sorted(offsets):
+            if seekable:
+                f.seek(offset)
+            else:
+                if offset < position:
+                    continue
+                while position < offset:
+                    skipped = len(f.read(min(offset - position, 1024 * 1024)))
+                    if not skipped:
+                        break
+                    position += skipped
+            raw = _read_record(f)
+            position = offset + len(raw)
+            if raw.strip():
+                try:
+                    rows.append(dict(zip(header, parse_record(raw))))
+                except UnicodeDecodeError:
+                    # 文件被重写后过时的偏移可能落在多字节字符中间, 由调用方核对行并退回扫描
+                    continue
+    return rows
+
+
+def read_json(path: Path, default=None):
+    """读取JSON边车文件, 不存在或损坏时返回默认值"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json_atomic(path: Path, data) -> None:
+    """先写临时文件再原子替换, 读者永远不会看到写了一半的文件"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def list_partitions(data_dir: Path) -> List[str]:
+    """数据分区目录名(相对数据目录), 从旧到新排列; ''表示分区之前写在数据目录根下的文件"""
+    partitions = []
+    if resolve_data_file(data_dir / 'conversations.csv'):
+        partitions.append('')
+    if data_dir.exists():
+        for entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+            if entry.is_dir() and not entry.name.startswith(('_', '.')) \
+                    and resolve_data_file(Path(entry.path) / 'conversations.csv'):
+                partitions.append(entry.name)
+    return partitions
+
+
+def partition_start(partition: str, partition_format: str) -> Optional[datetime]:
+    """分区覆盖时间段的起点(UTC), 根目录或名称与格式不符时返回None"""
+    if not partition or not partition_format:
+        return None
+    try:
+        return datetime.strptime(partition, partition_format).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def compress_file(csv_file: Path, codec: str = 'gzip') -> Path:
+    """把数据文件压缩为.csv.zst或.csv.gz并删除原文件, 返回压缩文件路径
+
+    先写临时文件并fsync, 再原子改名, 最后才删除原文件; 两者同时存在时读者优先读未压缩的文件。
+    """
+    suffix = '.zst' if codec == 'zstd' else '.gz'
+    target = csv_file.with_name(csv_file.name + suffix)
+    tmp_file = target.with_name(target.name + '.tmp')
+    with open(csv_file, 'rb') as src, open(tmp_file, 'wb') as raw:
+        if codec == 'zstd':
+            writer = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+        else:
+            writer = gzip.GzipFile(filename=csv_file.name, mode='wb', fileobj=raw, compresslevel=6)
+        with writer:
+            shutil.copyfileobj(src, writer, 1024 * 1024)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_file, target)
+    csv_file.unlink()
+    return target
+
+
+class AppendOnlyCSVWriter:
+    """scraper维护的只追加CSV(data/_meta下的索引和汇总), API增量读取新追加的行
+
+    追加只在文件末尾写入完整的行; 整体重写时先写临时文件再原子替换, 读者发现inode变化后重新加载。
+    子类定义HEADER, 调用_append()和_write_all()时持有self._lock。
+    """
+
+    HEADER: List[str] = []
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _append(self, rows: Iterable[Iterable]):
+        """在文件末尾追加行, 文件不存在时先写入表头"""
+        if not self.path.exists():
+            self._write_all([])
+        with open(self.path, 'ab') as f:
+            f.write(b''.join(format_record(list(row)) for row in rows))
+
+    def _write_all(self, rows: Iterable[Iterable]):
+        """用表头和rows重写整个文件"""
+        tmp_file = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_file, 'wb') as f:
+            f.write(format_record(self.HEADER))
+            for row in rows:
+                f.write(format_record(list(row)))
+        os.replace(tmp_file, self.path)
@@ -0,0 +1,136 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVWriter, iter_rows_forward, iter_rows_reverse, parse_record, resolve_data_file
+
+
+class RowIndex(AppendOnlyCSVWriter):
+    """run_uuid -> conversation_id, conversation_id -> 各数据文件中行的字节偏移
+
+    索引文件是只追加的CSV(file, conversation_id, offset, run_uuid), 数据行写入后再追加索引,
+    读者据此直接seek到对应行。conversations.csv中每个对话只有一行, 同一对话后追加的索引项
+    取代之前的(合并状态日志重写该文件后只追加偏移变化了的行)。整份索引同时保存在内存中,
+    供scraper自己查询。
+    """
+
+    HEADER = ['file', 'conversation_id', 'offset', 'run_uuid']
+    CONVERSATIONS = 'conversations.csv'
+
+    def __init__(self, index_file: Path, data_dir: Path):
+        super().__init__(index_file)
+        self.data_dir = data_dir
+        self.runs: Dict[str, int] = {}
+        self.offsets: Dict[int, Dict[str, List[int]]] = {}
+        self._max_offset: Dict[str, int] = {}
+
+        if self.path.exists():
+            self._load()
+        else:
+            self._write_all([])
+
+    def key(self, csv_file: Path) -> str:
+        """索引中使用的文件名(相对数据目录)"""
+        return csv_file.relative_to(self.data_dir).as_posix()
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            f.readline()
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                row = parse_record(line)
+                try:
+                    self._remember(row[0], int(row[1]), int(row[2]), row[3])
+                except (IndexError, ValueError):
+                    continue
+
+    def _remember(self, file: str, conversation_id: int, offset: int, run_uuid: str):
+        files = self.offsets.setdefault(conversation_id, {})
+        if file.endswith(self.CONVERSATIONS):
+            files[file] = [offset]
+        else:
+            files.setdefault(file, []).append(offset)
+        if run_uuid:
+            self.runs[run_uuid] = conversation_id
+        if offset > self._max_offset.get(file, -1):
+            self._max_offset[file] = offset
+
+    def append(self, csv_file: Path, entries: List[Tuple[int, int, str]]):
+        """记录已写入数据文件的行: [(conversation_id, offset, run_uuid)]"""
+        file = self.key(csv_file)
+        with self._lock:
+            self._append((file, conversation_id, offset, run_uuid) for conversation_id, offset, run_uuid in entries)
+            for conversation_id, offset, run_uuid in entries:
+                self._remember(file, conversation_id, offset, run_uuid)
+
+    def catch_up(self, csv_file: Path):
+        """补齐索引中缺失的尾部行(崩溃或索引丢失后), 索引已是最新时只读文件末尾一行"""
+        path = resolve_data_file(csv_file)
+        if path is None:
+            return
+        file = self.key(csv_file)
+        known = self._max_offset.get(file)
+        if path != csv_file:
+            # 归档的压缩文件不再变化, 只在索引里完全没有它时(索引丢失后)从头重建
+            if known is not None:
+                return
+        else:
+            last = next(iter_rows_reverse(csv_file), None)
+            if last is None or (known is not None and last[0] <= known):
+                return
+
+        is_conversations = file.endswith(self.CONVERSATIONS)
+        entries = []
+        for offset, row in iter_rows_forward(csv_file, known or 0):
+            if known is not None and offset <= known:
+                continue
+            try:
+                if is_conversations:
+                    entries.append((int(row[0]), offset, row[1]))
+                else:
+                    entries.append((int(row[1]), offset, ''))
+            except (IndexError, ValueError):
+                continue
+        self.append(csv_file, entries)
+
+    def replace_file(self, csv_file: Path, entries: List[Tuple[int, int, str]]):
+        """conversations.csv被整体重写后, 为偏移变化了的行追加取代旧项的索引项
+
+        entries为重写后文件中的全部行[(conversation_id, offset, run_uuid)]; 索引文件只追加,
+        读者不必重新加载整份索引。
+        """
+        file = self.key(csv_file)
+        with self._lock:
+            changed = [
+                (conversation_id, offset, run_uuid) for conversation_id, offset, run_uuid in entries
+                if self.offsets.get(conversation_id, {}).get(file) != [offset]
+            ]
+        self.append(csv_file, changed)
+        with self._lock:
+            # 行变短时旧的最大偏移可能超出文件中的最后一行
+            if entries:
+                self._max_offset[file] = max(offset for _, offset, _ in entries)
+            else:
+                self._max_offset.pop(file, None)
+
+    def files(self, conversation_id: int) -> List[str]:
+        """某个对话的行所在的文件"""
+        with self._lock:
+            return list(self.offsets.get(conversation_id, {}))
+
+    def lookup(self, run_uuid: str) -> Optional[Tuple[int, Dict[str, List[int]]]]:
+        """返回(conversation_id, {文件: [偏移]})"""
+        with self._lock:
+            conversation_id = self.runs.get(run_uuid)
+            if conversation_id is None:
+                return None
+            files = self.offsets.get(conversation_id, {})
+            return conversation_id, {file: list(offsets) for file, offsets in files.items()}
+
+    def lookup_id(self, conversation_id: int) -> Optional[Dict[str, List[int]]]:
+        """返回某个对话在各文件中的行偏移{文件: [偏移]}, 没有该对话时返回None"""
+        with self._lock:
+            files = self.offsets.get(conversation_id)
+            if files is None:
+                return None
+            return {file: list(offsets) for file, offsets in files.items()}
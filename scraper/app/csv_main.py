@@ -1,6 +1,5 @@
 import asyncio
 import uuid
-import yaml
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -17,6 +16,10 @@ import threading
 
 from .config import settings
 from .csv_storage import CSVStorage
+from .maintenance import COMMANDS as MAINTENANCE_COMMANDS
+from .question_registry import get_registry
+from .sqlite_storage import SQLiteStorage
+from .write_behind import WriteBehindStorage
 from .scraper import ChatGPTScraper
 
 
@@ -27,8 +30,15 @@ scrape_failure_counter = Counter('chatgpt_scrapes_failed', 'Total number of fail
 scrape_duration = Histogram('chatgpt_scrape_duration_seconds', 'Time spent scraping')
 active_scrapes = Gauge('chatgpt_active_scrapes', 'Number of active scrape jobs')
 
-# CSV存储实例
-storage = CSVStorage()
+def create_storage():
+    """按STORAGE_BACKEND创建存储后端"""
+    if settings.storage_backend == "sqlite":
+        return SQLiteStorage(settings.sqlite_path)
+    return CSVStorage(fsync_policy=settings.csv_fsync_policy, partition_format=settings.csv_partition_format)
+
+
+# 存储实例, 写操作由后台写线程执行
+storage = WriteBehindStorage(create_storage(), max_pending=settings.csv_write_queue_size)
 
 # FastAPI app for HTTP endpoints
 app = FastAPI(title="PandaRank Scraper", version="1.0.0")
@@ -153,26 +163,17 @@ def generate_demo_response(question_text: str) -> str:
     
     return demo_responses["默认"]
 
+# 问题池, 解析一次后按id索引, 文件修改后自动重新加载
+question_registry = get_registry(Path("/app/data/geo_questions.yaml"))
+
 def load_questions_from_yaml():
     """从YAML文件加载问题"""
-    questions_file = Path("/app/data/geo_questions.yaml")
-    questions = []
-    
-    if questions_file.exists():
-        with open(questions_file, 'r', encoding='utf-8') as f:
-            questions = yaml.safe_load(f)
-    
-    return questions or []
+    return question_registry.all()
 
 def get_question_by_id(question_id: int):
     """根据ID获取问题"""
-    questions = load_questions_from_yaml()
-    
-    for q in questions:
-        if q.get('id') == question_id:
-            return q.get('text', 'Unknown question')
-    
-    return None
+    question = question_registry.get(question_id)
+    return question.get('text', 'Unknown question') if question else None
 
 async def scrape_chatgpt_job(question_id: int = None):
     """Main job that runs on schedule or manually triggered"""
@@ -181,6 +182,7 @@ async def scrape_chatgpt_job(question_id: int = None):
     active_scrapes.inc()
     
     run_uuid = str(uuid.uuid4())
+    conversation_id = None
     
     try:
         logger.info(f"Starting scrape job with run_uuid: {run_uuid}")
@@ -193,18 +195,16 @@ async def scrape_chatgpt_job(question_id: int = None):
                 return
         else:
             # 默认使用第一个问题
-            questions = load_questions_from_yaml()
-            if not questions:
+            question = question_registry.first()
+            if not question:
                 logger.error("No questions available")
                 return
             
-            # 获取第一个问题
-            first_category = next(iter(questions.values()))
-            question_text = first_category[0] if first_category else "Test question"
-            question_id = 1
+            question_text = question.get('text', 'Unknown question')
+            question_id = question.get('id', 1)
         
         # 创建对话记录
-        conversation_id = storage.create_conversation(run_uuid, question_id, question_text)
+        conversation_id = await storage.create_conversation(run_uuid, question_id, question_text)
         logger.info(f"Created conversation {conversation_id} for question: {question_text}")
         
         # 检查是否是demo模式
@@ -212,12 +212,8 @@ async def scrape_chatgpt_job(question_id: int = None):
             # Demo模式 - 模拟响应
             logger.info("Running in DEMO mode - simulating ChatGPT response")
             
-            # 添加用户消息
-            storage.add_message(conversation_id, "user", question_text)
-            
             # 生成demo响应
             demo_response = generate_demo_response(question_text)
-            storage.add_message(conversation_id, "assistant", demo_response)
             
             # 添加demo网页搜索
             demo_searches = [
@@ -226,9 +222,6 @@ async def scrape_chatgpt_job(question_id: int = None):
                 ("https://www.tabelog.com", "Tabelog - 日本美食评价网站")
             ]
             
-            for url, title in demo_searches:
-                storage.add_web_search(conversation_id, url, title)
-            
             # 添加demo思考过程
             demo_reasoning = f"""用户想知道"{question_text}"，考虑到之前的类似查询（如"TOKYO经典豚骨"，以及"东京附近好吃的面馆"），可以推测用户确实在寻找东京的最好拉面建议。鉴于拉面店的不断变化，我会搜索最新的排名和评论。比如，可以关注米其林星级拉面店，如"那木流"、"筑地和牛"等，并提供多种风格的推荐。
 
@@ -238,8 +231,6 @@ async def scrape_chatgpt_job(question_id: int = None):
 
 我会根据用户的信息寻找东京的最佳拉面店。在这过程中，我打算先通过搜索获取2025年排名、米其林星级和一些新兴的拉面店。然后，再根据风味（如酱油、盐味、豚骨等）进行分类总结。我将提供详细的店名、地址、推荐理由以及一些小贴士（如排队的最佳时段等）。最后，我可能会展示几家店的图片，确保用户有一个全面的视觉体验。"""
             
-            storage.add_reasoning(conversation_id, demo_reasoning)
-            
             # 添加demo搜索查询
             demo_queries = [
                 "best ramen in Tokyo 2025 list",
@@ -247,9 +238,6 @@ async def scrape_chatgpt_job(question_id: int = None):
                 "new ramen shop Tokyo 2024 award winning"
             ]
             
-            for query in demo_queries:
-                storage.add_search_query(conversation_id, query)
-            
             # 添加demo访问网站
             demo_sites = [
                 {"url": "https://www.twowanderingsoles.com", "title": "Two Wandering Soles", "description": "Travel and food blog"},
@@ -260,11 +248,19 @@ async def scrape_chatgpt_job(question_id: int = None):
                 {"url": "https://gurunavi.com", "title": "Gurunavi", "description": "Restaurant booking platform"}
             ]
             
-            for site in demo_sites:
-                storage.add_visited_site(conversation_id, site["url"], site["title"], site["description"])
+            # 一次写入本次运行的全部结果
+            await storage.add_run_records(
+                conversation_id,
+                messages=[("user", question_text), ("assistant", demo_response)],
+                web_searches=demo_searches,
+                reasoning=[demo_reasoning],
+                search_queries=demo_queries,
+                visited_sites=[(site["url"], site["title"], site["description"]) for site in demo_sites]
+            )
             
-            # 标记对话完成
-            storage.finish_conversation(conversation_id)
+            # 标记对话完成, 等待本次运行的写入落盘
+            await storage.finish_conversation(conversation_id)
+            await storage.flush(conversation_id)
             
             logger.info(f"DEMO: Generated response for question {question_id}")
             scrape_success_counter.inc()
@@ -279,14 +275,12 @@ async def scrape_chatgpt_job(question_id: int = None):
                 await scraper.login()
                 logger.info("ChatGPT login successful")
                 
-                # 添加用户消息
-                storage.add_message(conversation_id, "user", question_text)
-                
-                # 提交问题并获取响应
+                # 提交问题并获取响应(用户消息与响应一起写入)
                 result = await scraper.submit_prompt_csv(conversation_id, question_text, storage)
                 
-                # 标记对话完成
-                storage.finish_conversation(conversation_id)
+                # 标记对话完成, 等待本次运行的写入落盘
+                await storage.finish_conversation(conversation_id)
+                await storage.flush(conversation_id)
                 
                 logger.info(f"Successfully scraped response for question {question_id}")
                 logger.info(f"Response preview: {result.get('response', '')[:100]}...")
@@ -297,7 +291,7 @@ async def scrape_chatgpt_job(question_id: int = None):
             except Exception as e:
                 logger.error(f"ChatGPT scraping failed: {e}")
                 # 即使失败也标记对话完成
-                storage.finish_conversation(conversation_id)
+                await storage.finish_conversation(conversation_id)
                 raise
                 
             finally:
@@ -308,6 +302,12 @@ async def scrape_chatgpt_job(question_id: int = None):
         scrape_failure_counter.inc()
         
     finally:
+        # 失败的运行也等待本次运行已入队的写入落盘, 此时的写入错误只记录日志
+        if conversation_id is not None:
+            try:
+                await storage.flush(conversation_id)
+            except Exception as e:
+                logger.error(f"Failed to write scrape results: {e}")
         active_scrapes.dec()
         duration = time.time() - job_start
         scrape_duration.observe(duration)
@@ -327,6 +327,25 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.post("/maintenance/{command}")
+async def maintenance_endpoint(command: str):
+    """在写线程中执行CSV维护命令(如 compact-journal、archive), 与抓取的写入串行执行"""
+    if command not in MAINTENANCE_COMMANDS:
+        raise HTTPException(status_code=404, detail=f"Unknown maintenance command: {command}")
+    if settings.storage_backend != "csv":
+        raise HTTPException(status_code=409, detail="Maintenance commands need the CSV storage backend")
+    await storage.run(MAINTENANCE_COMMANDS[command])
+    return {"status": "done", "command": command}
+
+async def archive_job():
+    """归档已关闭的CSV分区"""
+    try:
+        archived = await storage.archive_partitions(settings.csv_archive_codec)
+        if archived:
+            logger.info(f"Archived partitions: {archived}")
+    except Exception as e:
+        logger.error(f"Archive job failed: {e}")
+
 # 调度器
 scheduler = AsyncIOScheduler()
 
@@ -342,6 +361,16 @@ def start_scheduler():
             replace_existing=True
         )
         
+        # CSV后端每天归档一次已关闭的分区
+        if settings.storage_backend == "csv":
+            scheduler.add_job(
+                archive_job,
+                IntervalTrigger(hours=24),
+                id='archive_job',
+                max_instances=1,
+                replace_existing=True
+            )
+        
         if not scheduler.running:
             scheduler.start()
             logger.info(f"Scheduler started with interval: {settings.scrape_interval_sec} seconds")
@@ -361,8 +390,8 @@ async def startup():
     except Exception as e:
         logger.warning(f"Failed to start Prometheus server: {e}")
     
-    # 初始化CSV存储
-    logger.info("CSV storage initialized")
+    # 初始化存储
+    logger.info(f"{settings.storage_backend} storage initialized")
     
     # 启动调度器
     scheduler_thread = threading.Thread(target=start_scheduler)
@@ -370,5 +399,11 @@ async def startup():
     scheduler_thread.start()
     logger.info("Scheduler thread started")
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush pending CSV writes before exiting"""
+    await storage.close()
+    logger.info("CSV writer stopped")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
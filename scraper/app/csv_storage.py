@@ -1,160 +1,425 @@
 import csv
+import heapq
 import json
 import os
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import List, Dict, Optional
+from pathlib import Path, PurePosixPath
+from typing import List, Dict, Optional, Tuple
+
+from loguru import logger
+
+from .csv_files import (
+    compress_file, format_record, iter_dicts_newest_first, iter_rows_reverse, list_partitions, open_data_text,
+    read_json, read_rows_at, resolve_data_file, write_json_atomic, zstandard
+)
+from .blob_store import BlobStore
+from .csv_index import RowIndex
+from .domain_rollup import DomainRollup
+from .entity_index import EntityIndex, extract_entities
+from .question_registry import get_registry
+from .run_timeseries import RunTimeseries
+from .search_index import SEARCH_SOURCES, SearchIndex
+
+
+class IdAllocator:
+    """按表维护ID高水位的分配器
+
+    ID按块预留: 边车文件记录已预留到的ID, 内存中的高水位超过它时才再预留BLOCK_SIZE个并原子写入,
+    平时分配不写文件。预留时的高水位(预留值减BLOCK_SIZE)是已分配ID的下限, 此后分配的ID都写在
+    未归档的数据文件末尾; 启动时从这个下限与CSV文件末尾若干行中的最大ID继续分配, 收回上次未用完
+    的预留, 重启不会留下ID空洞。归档分区前调用checkpoint(), 使下限覆盖归档文件中的ID。
+    """
+
+    # 恢复时检查文件末尾的行数, 容忍少量乱序写入
+    TAIL_ROWS = 32
+    # 每次预留的ID数
+    BLOCK_SIZE = 1000
+
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._high_water: Dict[str, int] = {}
+        self._reserved: Dict[str, int] = {}
+        state = read_json(state_file, {})
+        if isinstance(state, dict):
+            for table, value in state.items():
+                if isinstance(value, int):
+                    self._high_water[table] = max(value - self.BLOCK_SIZE, 0)
+                    self._reserved[table] = value
+
+    def recover(self, table: str, csv_file: Path):
+        """用CSV文件末尾的ID校正高水位"""
+        tail_max = 0
+        if csv_file.exists():
+            for count, (_, row) in enumerate(iter_rows_reverse(csv_file)):
+                if count >= self.TAIL_ROWS:
+                    break
+                try:
+                    tail_max = max(tail_max, int(row[0]))
+                except (IndexError, ValueError):
+                    pass
+        with self._lock:
+            self._high_water[table] = max(self._high_water.get(table, 0), tail_max)
+
+    def allocate(self, table: str, count: int = 1) -> int:
+        """分配count个连续ID, 返回第一个"""
+        with self._lock:
+            first_id = self._high_water.get(table, 0) + 1
+            self._high_water[table] = first_id + count - 1
+            if self._high_water[table] > self._reserved.get(table, 0):
+                self._reserved[table] = self._high_water[table] + self.BLOCK_SIZE
+                write_json_atomic(self.state_file, self._reserved)
+        return first_id
+
+    def checkpoint(self):
+        """按当前高水位重新预留并写入边车文件, 重启后的下限覆盖此前分配的全部ID"""
+        with self._lock:
+            for table, high_water in self._high_water.items():
+                self._reserved[table] = high_water + self.BLOCK_SIZE
+            write_json_atomic(self.state_file, self._reserved)
 
 
 class CSVStorage:
-    def __init__(self, data_dir: str = "/app/data"):
+    """按时间分区的CSV存储
+
+    每个分区是数据目录下的一个子目录(默认按月, 如 2025-07/), 包含全部数据表文件;
+    对话及其消息等子记录写入对话开始时间所在的分区。分区之前写在数据目录根下的文件
+    视为最旧的分区。旧分区不再被追加, 可以安全地缓存和压缩。
+    """
+    
+    # 各数据表的列
+    TABLE_HEADERS = {
+        'conversations': ['id', 'run_uuid', 'question_id', 'question_text', 'started_at', 'finished_at'],
+        'messages': ['id', 'conversation_id', 'role', 'content_md', 'scraped_at'],
+        'web_searches': ['id', 'conversation_id', 'url', 'title', 'fetched_at'],
+        'artifacts': ['id', 'conversation_id', 'type', 'path', 'created_at'],
+        'reasoning': ['id', 'conversation_id', 'reasoning_content', 'created_at'],
+        'search_queries': ['id', 'conversation_id', 'query_text', 'created_at'],
+        'visited_sites': ['id', 'conversation_id', 'site_url', 'site_title', 'site_description', 'created_at'],
+    }
+    
+    # 状态日志累积到这么多条后合并回conversations.csv
+    JOURNAL_COMPACT_THRESHOLD = 200
+    
+    # none: 交给操作系统刷盘; run: 每次add_run_records后fsync; always: 每次追加都fsync
+    FSYNC_POLICIES = ('none', 'run', 'always')
+    
+    # 倒序读取对话时容忍的乱序行数
+    OUT_OF_ORDER_SLACK = 32
+    
+    # 归档压缩格式; 分区文件最后一次写入后至少经过这么久才归档, 避免跨分区边界的运行仍在写入
+    ARCHIVE_CODECS = ('gzip', 'zstd')
+    ARCHIVE_MIN_AGE_SEC = 24 * 3600
+    
+    def __init__(self, data_dir: str = "/app/data", fsync_policy: str = "none", partition_format: str = "%Y-%m"):
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.fsync_policy = fsync_policy
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
-        # CSV文件路径
-        self.conversations_file = self.data_dir / "conversations.csv"
-        self.messages_file = self.data_dir / "messages.csv"
-        self.web_searches_file = self.data_dir / "web_searches.csv"
-        self.artifacts_file = self.data_dir / "artifacts.csv"
-        self.reasoning_file = self.data_dir / "reasoning.csv"
-        self.search_queries_file = self.data_dir / "search_queries.csv"
-        self.visited_sites_file = self.data_dir / "visited_sites.csv"
-        
-        # 初始化CSV文件
-        self._init_csv_files()
-    
-    def _init_csv_files(self):
-        """初始化CSV文件头部"""
-        # 对话记录
-        if not self.conversations_file.exists():
-            with open(self.conversations_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'run_uuid', 'question_id', 'question_text', 'started_at', 'finished_at'])
-        
-        # 消息记录
-        if not self.messages_file.exists():
-            with open(self.messages_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'conversation_id', 'role', 'content_md', 'scraped_at'])
-        
-        # 网页搜索记录
-        if not self.web_searches_file.exists():
-            with open(self.web_searches_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'conversation_id', 'url', 'title', 'fetched_at'])
-        
-        # 文件记录
-        if not self.artifacts_file.exists():
-            with open(self.artifacts_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'conversation_id', 'type', 'path', 'created_at'])
-        
-        # 思考过程记录
-        if not self.reasoning_file.exists():
-            with open(self.reasoning_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'conversation_id', 'reasoning_content', 'created_at'])
-        
-        # 搜索查询记录
-        if not self.search_queries_file.exists():
-            with open(self.search_queries_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'conversation_id', 'query_text', 'created_at'])
-        
-        # 访问网站记录
-        if not self.visited_sites_file.exists():
-            with open(self.visited_sites_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'conversation_id', 'site_url', 'site_title', 'site_description', 'created_at'])
+        # 分区目录名格式(strftime), 为空时不分区, 所有数据写在数据目录根下
+        self.partition_format = partition_format
+        
+        # 对话状态日志: finished_at等字段的更新只追加到这里, 读取时合并
+        self.status_journal_file = self.data_dir / "conversation_status.csv"
+        
+        # 问题池, 用于统计问题数量
+        self.questions_file = self.data_dir / "geo_questions.yaml"
+        
+        # 写conversations.csv与状态日志时持有
+        self._write_lock = threading.RLock()
+        
+        # 边车元数据目录
+        self.meta_dir = self.data_dir / "_meta"
+        self.meta_dir.mkdir(exist_ok=True)
+        
+        # 消息和思考过程的长正文以及每次运行重复的提问按内容寻址保存, CSV中只写引用
+        self._blobs = BlobStore(self.data_dir / "_blobs")
+        
+        # 初始化当前分区的CSV文件
+        self._current_partition = self._partition_for(datetime.now(timezone.utc))
+        self._init_csv_files(self._current_partition)
+        if not self.status_journal_file.exists():
+            self._reset_status_journal()
+        
+        # ID分配器, 启动时从各表末尾恢复高水位
+        self._id_allocator = IdAllocator(self.meta_dir / "ids.json")
+        for csv_file in self._data_files():
+            self._id_allocator.recover(csv_file.stem, csv_file)
+        
+        # 行偏移索引, 缺失时从头重建, 落后时补齐尾部
+        self._row_index = RowIndex(self.meta_dir / "row_index.csv", self.data_dir)
+        for csv_file in self._data_files():
+            self._row_index.catch_up(csv_file)
+        
+        # 全文检索的倒排索引, 缺失时(首次升级或手工删除后)从全部正文重建
+        self._search_index = SearchIndex(self.meta_dir / "search_postings.csv")
+        if not self._search_index.exists():
+            self.rebuild_search_index()
+        
+        # 按(问题, 域名, 日期)汇总的引用数, 缺失时从全部已完成的运行重建
+        self._domain_rollup = DomainRollup(self.meta_dir / "domain_rollup.csv")
+        if not self._domain_rollup.exists():
+            self.rebuild_domain_rollup()
+        
+        # 从回答中提取的排名实体, 缺失时从全部已完成的运行重建
+        self._entity_index = EntityIndex(self.meta_dir / "ranked_entities.csv")
+        if not self._entity_index.exists():
+            self.rebuild_entity_index()
+        
+        # 按小时汇总的运行数、完成数和耗时直方图, 缺失时从全部运行重建
+        self._run_timeseries = RunTimeseries(self.meta_dir / "run_timeseries.csv")
+        if not self._run_timeseries.exists():
+            self.rebuild_run_timeseries()
+        
+        # 当前状态日志条数, 用于决定何时合并
+        self._journal_entries = sum(len(fields) for fields in self._read_status_journal().values())
+        
+        # 统计计数器, 每次追加时更新; 文件缺失时从原始数据重建
+        self.stats_file = self.meta_dir / "stats.json"
+        self._stats = {'rows': {}, 'finished_conversations': 0}
+        self._stats_mtime = None
+        self._reload_stats_if_changed()
+        if self._stats_mtime is None:
+            self.rebuild_stats()
+    
+    def _init_csv_files(self, partition: str):
+        """初始化分区目录及其中各CSV文件的表头"""
+        (self.data_dir / partition).mkdir(exist_ok=True)
+        for table, header in self.TABLE_HEADERS.items():
+            csv_file = self._table_file(table, partition)
+            if not csv_file.exists():
+                with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(header)
+    
+    def _table_file(self, table: str, partition: str = '') -> Path:
+        """某个分区中一张表的文件路径"""
+        return self.data_dir / partition / f"{table}.csv"
+    
+    def _partition_for(self, timestamp: datetime) -> str:
+        """时间点所属的分区名"""
+        return timestamp.strftime(self.partition_format) if self.partition_format else ''
+    
+    def _ensure_partition(self, timestamp: datetime) -> str:
+        """返回时间点所属的分区, 进入新分区时创建目录和文件"""
+        partition = self._partition_for(timestamp)
+        if partition != self._current_partition:
+            self._init_csv_files(partition)
+            self._current_partition = partition
+        return partition
+    
+    def _conversation_partition(self, conversation_id: int) -> str:
+        """对话所在的分区, 子记录写入同一分区"""
+        for file in self._row_index.files(conversation_id):
+            path = PurePosixPath(file)
+            if path.name == 'conversations.csv':
+                return '' if str(path.parent) == '.' else str(path.parent)
+        return self._current_partition
+    
+    def partitions(self) -> List[str]:
+        """所有分区, 从旧到新"""
+        return list_partitions(self.data_dir)
+    
+    def _reset_status_journal(self):
+        """清空状态日志, 只保留表头"""
+        with open(self.status_journal_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['conversation_id', 'field', 'value', 'recorded_at'])
     
     def create_conversation(self, run_uuid: str, question_id: int, question_text: str) -> int:
         """创建新对话记录"""
-        conversation_id = self._get_next_id(self.conversations_file)
-        started_at = datetime.now(timezone.utc).isoformat()
-        
-        with open(self.conversations_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([conversation_id, run_uuid, question_id, question_text, started_at, ''])
+        with self._write_lock:
+            now = datetime.now(timezone.utc)
+            conversations_file = self._table_file('conversations', self._ensure_partition(now))
+            conversation_id = self._get_next_id(conversations_file)
+            started_at = now.isoformat()
+            
+            self._append_row(
+                conversations_file,
+                [conversation_id, run_uuid, question_id, self._blobs.put(question_text, always=True), started_at, ''],
+                conversation_id,
+                run_uuid
+            )
+            self._run_timeseries.append_started(started_at)
         
         return conversation_id
     
     def finish_conversation(self, conversation_id: int):
         """标记对话完成"""
         finished_at = datetime.now(timezone.utc).isoformat()
-        self._update_conversation_field(conversation_id, 'finished_at', finished_at)
+        with self._write_lock:
+            # 是否已完成以落盘的状态为准, 重启后再次完成同一对话也不会重复计数
+            already_finished = self._is_finished(conversation_id)
+            self._append_status(conversation_id, 'finished_at', finished_at)
+            # 第一次完成时更新统计和派生索引
+            if not already_finished:
+                self._update_stats(finished=1)
+                self._index_finished_run(conversation_id, finished_at)
+    
+    def _is_finished(self, conversation_id: int) -> bool:
+        """状态日志或合并后的对话行中已有finished_at"""
+        if self._read_status_journal().get(conversation_id, {}).get('finished_at'):
+            return True
+        offsets = self._row_index.lookup_id(conversation_id) or {}
+        conversation = next(iter(self._rows_for_conversation('conversations', conversation_id, offsets)), None)
+        return bool(conversation and conversation.get('finished_at'))
     
     def add_message(self, conversation_id: int, role: str, content: str):
         """添加消息"""
-        message_id = self._get_next_id(self.messages_file)
+        csv_file = self._table_file('messages', self._conversation_partition(conversation_id))
+        message_id = self._get_next_id(csv_file)
         scraped_at = datetime.now(timezone.utc).isoformat()
         
-        with open(self.messages_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([message_id, conversation_id, role, content, scraped_at])
+        self._append_row(csv_file, [message_id, conversation_id, role, self._put_message(role, content), scraped_at], conversation_id)
+        self._search_index.append(conversation_id, 'messages', [content])
     
     def add_web_search(self, conversation_id: int, url: str, title: str):
         """添加网页搜索记录"""
-        search_id = self._get_next_id(self.web_searches_file)
+        csv_file = self._table_file('web_searches', self._conversation_partition(conversation_id))
+        search_id = self._get_next_id(csv_file)
         fetched_at = datetime.now(timezone.utc).isoformat()
         
-        with open(self.web_searches_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([search_id, conversation_id, url, title, fetched_at])
+        self._append_row(csv_file, [search_id, conversation_id, url, title, fetched_at], conversation_id)
     
     def add_artifact(self, conversation_id: int, artifact_type: str, path: str):
         """添加文件记录"""
-        artifact_id = self._get_next_id(self.artifacts_file)
+        csv_file = self._table_file('artifacts', self._conversation_partition(conversation_id))
+        artifact_id = self._get_next_id(csv_file)
         created_at = datetime.now(timezone.utc).isoformat()
         
-        with open(self.artifacts_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([artifact_id, conversation_id, artifact_type, path, created_at])
+        self._append_row(csv_file, [artifact_id, conversation_id, artifact_type, path, created_at], conversation_id)
     
     def add_reasoning(self, conversation_id: int, reasoning_content: str):
         """添加思考过程记录"""
-        reasoning_id = self._get_next_id(self.reasoning_file)
+        csv_file = self._table_file('reasoning', self._conversation_partition(conversation_id))
+        reasoning_id = self._get_next_id(csv_file)
         created_at = datetime.now(timezone.utc).isoformat()
         
-        # 将换行符编码为\\n以避免CSV解析问题
-        encoded_content = reasoning_content.replace('\n', '\\n').replace('\r', '\\r')
+        encoded_content = self._blobs.put(self._encode_reasoning(reasoning_content))
         
-        with open(self.reasoning_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([reasoning_id, conversation_id, encoded_content, created_at])
+        self._append_row(csv_file, [reasoning_id, conversation_id, encoded_content, created_at], conversation_id)
+        self._search_index.append(conversation_id, 'reasoning', [reasoning_content])
     
     def add_search_query(self, conversation_id: int, query_text: str):
         """添加搜索查询记录"""
-        query_id = self._get_next_id(self.search_queries_file)
+        csv_file = self._table_file('search_queries', self._conversation_partition(conversation_id))
+        query_id = self._get_next_id(csv_file)
         created_at = datetime.now(timezone.utc).isoformat()
         
-        with open(self.search_queries_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([query_id, conversation_id, query_text, created_at])
+        self._append_row(csv_file, [query_id, conversation_id, query_text, created_at], conversation_id)
+        self._search_index.append(conversation_id, 'search_queries', [query_text])
     
     def add_visited_site(self, conversation_id: int, site_url: str, site_title: str = "", site_description: str = ""):
         """添加访问网站记录"""
-        site_id = self._get_next_id(self.visited_sites_file)
+        csv_file = self._table_file('visited_sites', self._conversation_partition(conversation_id))
+        site_id = self._get_next_id(csv_file)
         created_at = datetime.now(timezone.utc).isoformat()
         
-        with open(self.visited_sites_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([site_id, conversation_id, site_url, site_title, site_description, created_at])
+        self._append_row(csv_file, [site_id, conversation_id, site_url, site_title, site_description, created_at], conversation_id)
+    
+    def add_run_records(
+        self,
+        conversation_id: int,
+        messages: Optional[List[Tuple[str, str]]] = None,
+        web_searches: Optional[List[Tuple[str, str]]] = None,
+        reasoning: Optional[List[str]] = None,
+        search_queries: Optional[List[str]] = None,
+        visited_sites: Optional[List[Tuple[str, str, str]]] = None,
+        artifacts: Optional[List[Tuple[str, str]]] = None
+    ):
+        """一次写入一次运行的全部结果: 每张表批量分配ID, 只打开追加一次
+        
+        messages: [(role, content)]
+        web_searches: [(url, title)]
+        reasoning: [reasoning_content]
+        search_queries: [query_text]
+        visited_sites: [(site_url, site_title, site_description)]
+        artifacts: [(artifact_type, path)]
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        partition = self._conversation_partition(conversation_id)
+        tables = [
+            ('messages', [[conversation_id, role, self._put_message(role, content), now] for role, content in messages or []]),
+            ('web_searches', [[conversation_id, url, title, now] for url, title in web_searches or []]),
+            ('reasoning', [[conversation_id, self._blobs.put(self._encode_reasoning(content)), now] for content in reasoning or []]),
+            ('search_queries', [[conversation_id, query_text, now] for query_text in search_queries or []]),
+            ('visited_sites', [[conversation_id, url, title, description, now] for url, title, description in visited_sites or []]),
+            ('artifacts', [[conversation_id, artifact_type, path, now] for artifact_type, path in artifacts or []]),
+        ]
+        fsync = self.fsync_policy in ('run', 'always')
+        
+        # 持锁写完所有表, 同一次运行的行在各文件中连续
+        with self._write_lock:
+            written = {}
+            for table, rows in tables:
+                if not rows:
+                    continue
+                first_id = self._id_allocator.allocate(table, len(rows))
+                rows = [[first_id + i] + row for i, row in enumerate(rows)]
+                self._append_rows(self._table_file(table, partition), rows, conversation_id, fsync=fsync)
+                written[table] = len(rows)
+            if written:
+                self._update_stats(written)
+            
+            # 数据行落盘后再追加倒排项
+            self._search_index.append(conversation_id, 'messages', [content for _, content in messages or []])
+            self._search_index.append(conversation_id, 'reasoning', reasoning or [])
+            self._search_index.append(conversation_id, 'search_queries', search_queries or [])
+    
+    @staticmethod
+    def _encode_reasoning(reasoning_content: str) -> str:
+        """将换行符编码为\\n以避免CSV解析问题"""
+        return reasoning_content.replace('\n', '\\n').replace('\r', '\\r')
+    
+    def _put_message(self, role: str, content: str) -> str:
+        """消息正文写入CSV的值; 每次运行重复的提问不论长短都保存为blob"""
+        return self._blobs.put(content, always=role == 'user')
+    
+    def _recent_conversation_rows(self, limit: int) -> List[Dict]:
+        """按started_at倒序返回最多limit条对话行
+        
+        对话按开始时间顺序追加, 从最新分区的文件末尾向前读, 用大小为limit的小顶堆容纳少量乱序行,
+        连续OUT_OF_ORDER_SLACK行都比堆中最旧的一行更旧时停止。
+        """
+        if limit <= 0:
+            return []
+        heap = []
+        seq = 0
+        for partition in reversed(self.partitions()):
+            older = 0
+            for row in iter_dicts_newest_first(self._table_file('conversations', partition)):
+                started_at = row['started_at']
+                if len(heap) < limit:
+                    heapq.heappush(heap, (started_at, seq, row))
+                    older = 0
+                elif started_at > heap[0][0]:
+                    heapq.heapreplace(heap, (started_at, seq, row))
+                    older = 0
+                else:
+                    older += 1
+                seq += 1
+                if older >= self.OUT_OF_ORDER_SLACK:
+                    break
+            # 更旧的分区中的对话都早于当前结果
+            if len(heap) >= limit:
+                break
+        
+        return [row for _, _, row in sorted(heap, reverse=True)]
     
     def get_conversations(self, limit: int = 100) -> List[Dict]:
         """获取对话列表"""
         conversations = []
-        if not self.conversations_file.exists():
-            return conversations
         
-        with open(self.conversations_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            
-        # 按开始时间倒序排序
-        rows.sort(key=lambda x: x['started_at'], reverse=True)
+        # 先读状态日志再读主文件, 与合并时"先替换主文件再清空日志"的顺序配合
+        status = self._read_status_journal()
         
-        for row in rows[:limit]:
+        for row in self._recent_conversation_rows(limit):
+            row = self._apply_status(row, status)
             duration_seconds = None
             if row['finished_at'] and row['started_at']:
                 try:
@@ -168,7 +433,7 @@ class CSVStorage:
                 'id': int(row['id']),
                 'run_uuid': row['run_uuid'],
                 'question_id': int(row['question_id']) if row['question_id'] else None,
-                'question_text': row['question_text'],
+                'question_text': self._blobs.resolve(row['question_text']),
                 'started_at': row['started_at'] if row['started_at'] else None,
                 'finished_at': row['finished_at'] if row['finished_at'] else None,
                 'duration_seconds': duration_seconds
@@ -180,13 +445,26 @@ class CSVStorage:
         """获取对话详情"""
         # 找到对话
         conversation = None
-        if self.conversations_file.exists():
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['run_uuid'] == run_uuid:
-                        conversation = row
-                        break
+        status = self._read_status_journal()
+        located = self._row_index.lookup(run_uuid)
+        offsets = None
+        partition = ''
+        if located:
+            # 通过偏移索引直接定位各表中的行
+            conversation_id, offsets = located
+            for row in self._rows_for_conversation('conversations', conversation_id, offsets):
+                if row['run_uuid'] == run_uuid:
+                    conversation = self._apply_status(row, status)
+        else:
+            for partition in reversed(self.partitions()):
+                with open_data_text(self._table_file('conversations', partition)) as f:
+                    reader = csv.DictReader(f)
+                    for row in reader:
+                        if row['run_uuid'] == run_uuid:
+                            conversation = self._apply_status(row, status)
+                            break
+                if conversation:
+                    break
         
         if not conversation:
             return None
@@ -195,93 +473,69 @@ class CSVStorage:
         
         # 获取消息
         messages = []
-        if self.messages_file.exists():
-            with open(self.messages_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row['conversation_id']) == conversation_id:
-                        messages.append({
-                            'id': int(row['id']),
-                            'role': row['role'],
-                            'content': row['content_md'],
-                            'scraped_at': row['scraped_at']
-                        })
+        for row in self._rows_for_conversation('messages', conversation_id, offsets, partition):
+            messages.append({
+                'id': int(row['id']),
+                'role': row['role'],
+                'content': self._blobs.resolve(row['content_md']),
+                'scraped_at': row['scraped_at']
+            })
         
         # 获取网页搜索
         web_searches = []
-        if self.web_searches_file.exists():
-            with open(self.web_searches_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row['conversation_id']) == conversation_id:
-                        web_searches.append({
-                            'id': int(row['id']),
-                            'url': row['url'],
-                            'title': row['title'],
-                            'fetched_at': row['fetched_at']
-                        })
+        for row in self._rows_for_conversation('web_searches', conversation_id, offsets, partition):
+            web_searches.append({
+                'id': int(row['id']),
+                'url': row['url'],
+                'title': row['title'],
+                'fetched_at': row['fetched_at']
+            })
         
         # 获取文件
         artifacts = []
-        if self.artifacts_file.exists():
-            with open(self.artifacts_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row['conversation_id']) == conversation_id:
-                        artifacts.append({
-                            'id': int(row['id']),
-                            'type': row['type'],
-                            'path': row['path'],
-                            'created_at': row['created_at']
-                        })
+        for row in self._rows_for_conversation('artifacts', conversation_id, offsets, partition):
+            artifacts.append({
+                'id': int(row['id']),
+                'type': row['type'],
+                'path': row['path'],
+                'created_at': row['created_at']
+            })
         
         # 获取思考过程
         reasoning = []
-        if self.reasoning_file.exists():
-            with open(self.reasoning_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row['conversation_id']) == conversation_id:
-                        reasoning.append({
-                            'id': int(row['id']),
-                            'reasoning_content': row['reasoning_content'],
-                            'created_at': row['created_at']
-                        })
+        for row in self._rows_for_conversation('reasoning', conversation_id, offsets, partition):
+            reasoning.append({
+                'id': int(row['id']),
+                'reasoning_content': self._blobs.resolve(row['reasoning_content']),
+                'created_at': row['created_at']
+            })
         
         # 获取搜索查询
         search_queries = []
-        if self.search_queries_file.exists():
-            with open(self.search_queries_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row['conversation_id']) == conversation_id:
-                        search_queries.append({
-                            'id': int(row['id']),
-                            'query_text': row['query_text'],
-                            'created_at': row['created_at']
-                        })
+        for row in self._rows_for_conversation('search_queries', conversation_id, offsets, partition):
+            search_queries.append({
+                'id': int(row['id']),
+                'query_text': row['query_text'],
+                'created_at': row['created_at']
+            })
         
         # 获取访问网站
         visited_sites = []
-        if self.visited_sites_file.exists():
-            with open(self.visited_sites_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if int(row['conversation_id']) == conversation_id:
-                        visited_sites.append({
-                            'id': int(row['id']),
-                            'site_url': row['site_url'],
-                            'site_title': row['site_title'],
-                            'site_description': row['site_description'],
-                            'created_at': row['created_at']
-                        })
+        for row in self._rows_for_conversation('visited_sites', conversation_id, offsets, partition):
+            visited_sites.append({
+                'id': int(row['id']),
+                'site_url': row['site_url'],
+                'site_title': row['site_title'],
+                'site_description': row['site_description'],
+                'created_at': row['created_at']
+            })
         
         return {
             'id': conversation_id,
             'run_uuid': conversation['run_uuid'],
             'question': {
                 'id': int(conversation['question_id']) if conversation['question_id'] else None,
-                'text': conversation['question_text'],
+                'text': self._blobs.resolve(conversation['question_text']),
                 'cooldown_min': 1440  # 默认值
             },
             'started_at': conversation['started_at'],
@@ -295,73 +549,349 @@ class CSVStorage:
         }
     
     def get_stats(self) -> Dict:
-        """获取统计信息"""
-        total_conversations = 0
-        successful_conversations = 0
-        total_messages = 0
-        total_web_searches = 0
-        
-        # 统计对话
-        if self.conversations_file.exists():
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    total_conversations += 1
-                    if row['finished_at']:
-                        successful_conversations += 1
-        
-        # 统计消息
-        if self.messages_file.exists():
-            with open(self.messages_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                total_messages = sum(1 for _ in reader)
-        
-        # 统计网页搜索
-        if self.web_searches_file.exists():
-            with open(self.web_searches_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                total_web_searches = sum(1 for _ in reader)
+        """获取统计信息(读取增量维护的计数器)"""
+        with self._write_lock:
+            self._reload_stats_if_changed()
+            rows = dict(self._stats['rows'])
+            successful_conversations = self._stats['finished_conversations']
+        total_conversations = rows.get('conversations', 0)
         
         return {
             'total_conversations': total_conversations,
             'successful_conversations': successful_conversations,
             'success_rate': successful_conversations / total_conversations if total_conversations > 0 else 0,
-            'total_messages': total_messages,
-            'total_web_searches': total_web_searches,
-            'total_questions': 5  # 默认问题数量
+            'total_messages': rows.get('messages', 0),
+            'total_web_searches': rows.get('web_searches', 0),
+            'total_questions': self._count_questions()
         }
     
+    def rebuild_stats(self) -> Dict:
+        """从原始CSV文件重新计算统计计数器"""
+        with self._write_lock:
+            rows = {table: 0 for table in self.TABLE_HEADERS}
+            for csv_file in self._data_files():
+                if resolve_data_file(csv_file):
+                    with open_data_text(csv_file) as f:
+                        reader = csv.DictReader(f)
+                        rows[csv_file.stem] += sum(1 for _ in reader)
+            
+            # 统计已完成的对话
+            finished_conversations = 0
+            status = self._read_status_journal()
+            for partition in self.partitions():
+                with open_data_text(self._table_file('conversations', partition)) as f:
+                    reader = csv.DictReader(f)
+                    for row in reader:
+                        if self._apply_status(row, status)['finished_at']:
+                            finished_conversations += 1
+            
+            self._stats = {'rows': rows, 'finished_conversations': finished_conversations}
+            self._save_stats()
+            return self._stats
+    
+    def _search_documents(self):
+        """全部需要检索的正文: (conversation_id, 子表, 正文), 按分区顺序流式读取"""
+        for partition in self.partitions():
+            for table, field in SEARCH_SOURCES.items():
+                csv_file = self._table_file(table, partition)
+                if not resolve_data_file(csv_file):
+                    continue
+                with open_data_text(csv_file) as f:
+                    for row in csv.DictReader(f):
+                        try:
+                            conversation_id = int(row.get('conversation_id', ''))
+                        except ValueError:
+                            continue
+                        text = self._blobs.resolve(row.get(field) or '')
+                        if table == 'reasoning':
+                            text = text.replace('\\n', '\n').replace('\\r', '\r')
+                        yield conversation_id, table, text
+    
+    def rebuild_search_index(self):
+        """从原始CSV重建全文检索的倒排索引"""
+        with self._write_lock:
+            self._search_index.rebuild(self._search_documents())
+    
+    def _index_finished_run(self, conversation_id: int, finished_at: str):
+        """运行完成时更新派生索引: 耗时计入时间序列, 引用的URL计入域名汇总, 从回答中提取排名实体"""
+        offsets = self._row_index.lookup_id(conversation_id) or {}
+        conversation = next(iter(self._rows_for_conversation('conversations', conversation_id, offsets)), None)
+        if conversation is None:
+            return
+        self._run_timeseries.append_finished(conversation['started_at'], finished_at)
+        day, question_id = conversation['started_at'][:10], conversation['question_id']
+        urls = [row['url'] for row in self._rows_for_conversation('web_searches', conversation_id, offsets)]
+        urls += [row['site_url'] for row in self._rows_for_conversation('visited_sites', conversation_id, offsets)]
+        self._domain_rollup.append(day, question_id, urls)
+        answers = [self._blobs.resolve(row['content_md'])
+                   for row in self._rows_for_conversation('messages', conversation_id, offsets) if row['role'] == 'assistant']
+        self._entity_index.append(conversation_id, question_id, day, answers)
+    
+    def _finished_runs(self):
+        """全部已完成的运行: (开始日期, question_id, [引用的URL]), 按分区读取"""
+        status = self._read_status_journal()
+        for partition in self.partitions():
+            urls: Dict[str, List[str]] = {}
+            for table, field in (('web_searches', 'url'), ('visited_sites', 'site_url')):
+                csv_file = self._table_file(table, partition)
+                if not resolve_data_file(csv_file):
+                    continue
+                with open_data_text(csv_file) as f:
+                    for row in csv.DictReader(f):
+                        urls.setdefault(row['conversation_id'], []).append(row[field])
+            csv_file = self._table_file('conversations', partition)
+            if not resolve_data_file(csv_file):
+                continue
+            with open_data_text(csv_file) as f:
+                for row in csv.DictReader(f):
+                    if self._apply_status(row, status)['finished_at']:
+                        yield row['started_at'][:10], row['question_id'], urls.get(row['id'], [])
+    
+    def rebuild_domain_rollup(self):
+        """从原始CSV重建按(问题, 域名, 日期)的引用汇总"""
+        with self._write_lock:
+            self._domain_rollup.rebuild(self._finished_runs())
+    
+    def _entity_runs(self):
+        """全部已完成的运行: (conversation_id, question_id, 开始日期, 排名实体), 按分区读取
+        
+        回答在读取时即解析, 每个分区只在内存中保留各对话最后一条有实体的回答解析出的实体。
+        """
+        status = self._read_status_journal()
+        for partition in self.partitions():
+            entities_of: Dict[str, List] = {}
+            csv_file = self._table_file('messages', partition)
+            if resolve_data_file(csv_file):
+                with open_data_text(csv_file) as f:
+                    for row in csv.DictReader(f):
+                        if row['role'] != 'assistant':
+                            continue
+                        entities = extract_entities(self._blobs.resolve(row['content_md']))
+                        if entities:
+                            entities_of[row['conversation_id']] = entities
+            csv_file = self._table_file('conversations', partition)
+            if not resolve_data_file(csv_file):
+                continue
+            with open_data_text(csv_file) as f:
+                for row in csv.DictReader(f):
+                    if self._apply_status(row, status)['finished_at']:
+                        yield int(row['id']), row['question_id'], row['started_at'][:10], entities_of.get(row['id'], [])
+    
+    def rebuild_entity_index(self):
+        """从原始CSV重新提取全部已完成运行的排名实体"""
+        with self._write_lock:
+            self._entity_index.rebuild(self._entity_runs())
+    
+    def _run_times(self):
+        """全部运行的(started_at, finished_at), 按分区读取"""
+        status = self._read_status_journal()
+        for partition in self.partitions():
+            csv_file = self._table_file('conversations', partition)
+            if not resolve_data_file(csv_file):
+                continue
+            with open_data_text(csv_file) as f:
+                for row in csv.DictReader(f):
+                    row = self._apply_status(row, status)
+                    yield row['started_at'], row['finished_at']
+    
+    def rebuild_run_timeseries(self):
+        """从原始CSV重建按小时的运行时间序列"""
+        with self._write_lock:
+            self._run_timeseries.rebuild(self._run_times())
+    
+    def _update_stats(self, rows: Optional[Dict[str, int]] = None, finished: int = 0):
+        """追加数据后更新计数器并持久化, rows为 表名 -> 新增行数"""
+        with self._write_lock:
+            self._reload_stats_if_changed()
+            for table, count in (rows or {}).items():
+                self._stats['rows'][table] = self._stats['rows'].get(table, 0) + count
+            self._stats['finished_conversations'] += finished
+            self._save_stats()
+    
+    def _save_stats(self):
+        write_json_atomic(self.stats_file, self._stats)
+        self._stats_mtime = os.stat(self.stats_file).st_mtime_ns
+    
+    def _reload_stats_if_changed(self):
+        """统计文件被外部重建(如 python -m app.maintenance rebuild-stats)后重新加载"""
+        try:
+            mtime = os.stat(self.stats_file).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._stats_mtime:
+            stats = read_json(self.stats_file)
+            if isinstance(stats, dict) and 'rows' in stats:
+                self._stats = stats
+            self._stats_mtime = mtime
+    
+    def _count_questions(self) -> int:
+        """问题池中的问题数量"""
+        return len(get_registry(self.questions_file))
+    
+    def _data_files(self) -> List[Path]:
+        """所有分区中的数据表文件"""
+        return [self._table_file(table, partition) for partition in self.partitions() for table in self.TABLE_HEADERS]
+    
+    def _rows_for_conversation(self, table: str, conversation_id: int, offsets: Optional[Dict[str, List[int]]], partition: str = ''):
+        """读取某个对话在一张表中的行: 有索引时按偏移直接读取, 否则扫描对话所在分区的表文件
+        
+        按偏移读到的行都核对id; 合并状态日志重写conversations.csv之后、取代旧偏移的索引项追加之前,
+        旧偏移指向别的行, 此时扫描索引中的对话文件。
+        """
+        if offsets is not None:
+            key = 'id' if table == 'conversations' else 'conversation_id'
+            files = [file for file in offsets if PurePosixPath(file).name == f"{table}.csv"]
+            rows = []
+            for file in files:
+                rows.extend(row for row in read_rows_at(self.data_dir / file, offsets[file])
+                            if row.get(key) == str(conversation_id))
+            if table == 'conversations' and files and not rows:
+                for file in files:
+                    with open_data_text(self.data_dir / file) as f:
+                        rows.extend(row for row in csv.DictReader(f) if row['id'] == str(conversation_id))
+            return rows
+        
+        csv_file = self._table_file(table, partition)
+        if not resolve_data_file(csv_file):
+            return []
+        with open_data_text(csv_file) as f:
+            reader = csv.DictReader(f)
+            return [row for row in reader if int(row['conversation_id']) == conversation_id]
+    
+    def _append_row(self, csv_file: Path, row: List, conversation_id: int, run_uuid: str = ''):
+        """追加一行数据"""
+        with self._write_lock:
+            self._append_rows(csv_file, [row], conversation_id, run_uuid, fsync=self.fsync_policy == 'always')
+            self._update_stats({csv_file.stem: 1})
+    
+    def _append_rows(self, csv_file: Path, rows: List[List], conversation_id: int, run_uuid: str = '', fsync: bool = False):
+        """打开一次文件追加多行, 并记录每行在文件中的偏移"""
+        with self._write_lock:
+            entries = []
+            records = []
+            with open(csv_file, 'ab') as f:
+                offset = f.tell()
+                for row in rows:
+                    record = format_record(row)
+                    entries.append((conversation_id, offset, run_uuid))
+                    records.append(record)
+                    offset += len(record)
+                f.write(b''.join(records))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._row_index.append(csv_file, entries)
+    
     def _get_next_id(self, csv_file: Path) -> int:
         """获取下一个ID"""
-        max_id = 0
-        if csv_file.exists():
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        current_id = int(row['id'])
-                        max_id = max(max_id, current_id)
-                    except:
-                        pass
-        return max_id + 1
-    
-    def _update_conversation_field(self, conversation_id: int, field: str, value: str):
-        """更新对话字段"""
-        if not self.conversations_file.exists():
-            return
+        return self._id_allocator.allocate(csv_file.stem)
+    
+    def _append_status(self, conversation_id: int, field: str, value: str):
+        """追加一条对话状态更新"""
+        recorded_at = datetime.now(timezone.utc).isoformat()
+        with self._write_lock:
+            with open(self.status_journal_file, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow([conversation_id, field, value, recorded_at])
+            self._journal_entries += 1
+            if self._journal_entries >= self.JOURNAL_COMPACT_THRESHOLD:
+                self.compact_status_journal()
+    
+    def _read_status_journal(self) -> Dict[int, Dict[str, str]]:
+        """读取状态日志, 返回 conversation_id -> {字段: 最新值}"""
+        status: Dict[int, Dict[str, str]] = {}
+        if not self.status_journal_file.exists():
+            return status
         
-        # 读取所有行
-        rows = []
-        with open(self.conversations_file, 'r', encoding='utf-8') as f:
+        with open(self.status_journal_file, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
             for row in reader:
-                if int(row['id']) == conversation_id:
-                    row[field] = value
-                rows.append(row)
-        
-        # 重写文件
-        with open(self.conversations_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
\ No newline at end of file
+                try:
+                    conversation_id = int(row['conversation_id'])
+                except (TypeError, ValueError):
+                    continue
+                status.setdefault(conversation_id, {})[row['field']] = row['value']
+        return status
+    
+    @staticmethod
+    def _apply_status(row: Dict, status: Dict[int, Dict[str, str]]) -> Dict:
+        """把状态日志中的更新合并到对话行"""
+        try:
+            updates = status.get(int(row['id']))
+        except (TypeError, ValueError):
+            return row
+        if updates:
+            row.update({field: value for field, value in updates.items() if field in row})
+        return row
+    
+    def compact_status_journal(self):
+        """把状态日志合并回各分区的conversations.csv并清空日志"""
+        with self._write_lock:
+            status = self._read_status_journal()
+            by_partition: Dict[str, Dict[int, Dict[str, str]]] = {}
+            for conversation_id, updates in status.items():
+                by_partition.setdefault(self._conversation_partition(conversation_id), {})[conversation_id] = updates
+            
+            retained: Dict[int, Dict[str, str]] = {}
+            for partition, updates in by_partition.items():
+                conversations_file = self._table_file('conversations', partition)
+                if not conversations_file.exists():
+                    # 已归档的分区不再改写, 这些更新继续留在日志中
+                    retained.update(updates)
+                    continue
+                tmp_file = conversations_file.with_name(conversations_file.name + '.tmp')
+                entries = []
+                with open(conversations_file, 'r', encoding='utf-8') as src, open(tmp_file, 'wb') as dst:
+                    reader = csv.DictReader(src)
+                    dst.write(format_record(reader.fieldnames))
+                    for row in reader:
+                        row = self._apply_status(row, updates)
+                        entries.append((int(row['id']), dst.tell(), row['run_uuid']))
+                        dst.write(format_record([row[field] for field in reader.fieldnames]))
+                os.replace(tmp_file, conversations_file)
+                # 重写后的行偏移改变, 为变化了的行追加索引项
+                self._row_index.replace_file(conversations_file, entries)
+            
+            self._reset_status_journal()
+            if retained:
+                recorded_at = datetime.now(timezone.utc).isoformat()
+                with open(self.status_journal_file, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    for conversation_id, updates in retained.items():
+                        for field, value in updates.items():
+                            writer.writerow([conversation_id, field, value, recorded_at])
+            # 保留的条数不计入, 以免每次追加都触发合并
+            self._journal_entries = 0
+    
+    def archive_partitions(self, codec: str = 'gzip') -> List[str]:
+        """压缩已关闭的分区(不是当前分区, 且一段时间内没有写入), 返回本次归档的分区
+        
+        归档后的文件仍可透明读取; 行偏移索引记录的是未压缩数据中的位置, 按偏移读取时流式跳过。
+        """
+        if codec not in self.ARCHIVE_CODECS:
+            raise ValueError(f"Unknown archive codec: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed, archiving with gzip instead")
+            codec = 'gzip'
+        
+        archived = []
+        with self._write_lock:
+            # 先把状态日志合并进分区文件, 归档后的分区不再被改写
+            self.compact_status_journal()
+            # 重启时只从未归档文件的末尾恢复ID, 归档前先让边车文件记录的下限覆盖这些ID
+            self._id_allocator.checkpoint()
+            now = time.time()
+            for partition in self.partitions():
+                if partition == self._current_partition:
+                    continue
+                csv_files = [self._table_file(table, partition) for table in self.TABLE_HEADERS]
+                csv_files = [csv_file for csv_file in csv_files if csv_file.exists()]
+                if not csv_files:
+                    continue
+                if any(now - csv_file.stat().st_mtime < self.ARCHIVE_MIN_AGE_SEC for csv_file in csv_files):
+                    continue
+                for csv_file in csv_files:
+                    compress_file(csv_file, codec)
+                archived.append(partition or '.')
+                logger.info(f"Archived partition {partition or '.'} with {codec}")
+        return archived
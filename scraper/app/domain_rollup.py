@@ -0,0 +1,81 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+
+from .csv_files import AppendOnlyCSVWriter
+
+# 常见的二级公共后缀, 这些后缀下的可注册域名取三段(如 bbc.co.uk)
+SECOND_LEVEL_SUFFIXES = {
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn', 'ac.cn',
+    'com.hk', 'org.hk', 'edu.hk', 'gov.hk', 'com.tw', 'org.tw', 'edu.tw', 'gov.tw', 'com.mo',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp', 'go.jp', 'co.kr', 'or.kr', 'ac.kr', 'go.kr',
+    'com.sg', 'edu.sg', 'gov.sg', 'com.my', 'com.ph', 'co.th', 'in.th', 'com.vn', 'co.id', 'co.in',
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au', 'co.nz',
+    'com.br', 'com.mx', 'com.ar', 'com.tr', 'co.za',
+}
+
+
+def registrable_domain(url: str) -> str:
+    """URL的可注册域名, 如 www.tabelog.com -> tabelog.com, news.bbc.co.uk -> bbc.co.uk; 无法解析时返回空串
+
+    不依赖完整的公共后缀列表, 只识别常见的二级公共后缀, 足以按站点归并引用。
+    """
+    try:
+        host = urlsplit(url if '://' in url else '//' + url).hostname
+    except ValueError:
+        return ''
+    if not host:
+        return ''
+    host = host.rstrip('.')
+    if ':' in host or host.replace('.', '').isdigit():
+        # IP地址原样返回
+        return host
+    labels = host.split('.')
+    count = 3 if '.'.join(labels[-2:]) in SECOND_LEVEL_SUFFIXES else 2
+    return '.'.join(labels[-count:])
+
+
+def citation_counts(urls: Iterable[str]) -> Dict[str, int]:
+    """一次运行中各域名被引用的次数, 同一个URL只计一次"""
+    counts = Counter(registrable_domain(url) for url in set(urls) if url)
+    counts.pop('', None)
+    return dict(counts)
+
+
+def rollup_entries(day: str, question_id, urls: Iterable[str]) -> List[Tuple[str, object, str, int, int]]:
+    """一次完成的运行对汇总的增量: 引用的每个域名一行, 另加一行domain为空的合计
+
+    [(日期, question_id, 域名, 运行数, 引用数)], 合计行的运行数为1, 引用数为所有域名的引用数之和。
+    """
+    counts = citation_counts(urls)
+    entries = [(day, question_id, domain, 1, citations) for domain, citations in counts.items()]
+    entries.append((day, question_id, '', 1, sum(counts.values())))
+    return entries
+
+
+class DomainRollup(AppendOnlyCSVWriter):
+    """按(问题, 可注册域名, 日期)汇总的引用数(data/_meta/domain_rollup.csv)
+
+    只追加的CSV(day, question_id, domain, runs, citations), 每完成一次运行追加一组增量,
+    读者按键累加; day为运行开始的UTC日期。看板读取汇总, 不再扫描原始的搜索和访问记录。
+    """
+
+    HEADER = ['day', 'question_id', 'domain', 'runs', 'citations']
+
+    def append(self, day: str, question_id, urls: Iterable[str]):
+        """记录一次完成的运行引用的URL"""
+        entries = rollup_entries(day, question_id, urls)
+        with self._lock:
+            self._append(entries)
+
+    def rebuild(self, runs: Iterable[Tuple[str, object, List[str]]]):
+        """由全部完成的运行[(日期, question_id, [URL])]重写汇总"""
+        totals: Dict[Tuple[str, object, str], List[int]] = {}
+        for day, question_id, urls in runs:
+            for _, _, domain, run_count, citations in rollup_entries(day, question_id, urls):
+                total = totals.setdefault((day, question_id, domain), [0, 0])
+                total[0] += run_count
+                total[1] += citations
+        with self._lock:
+            self._write_all((day, question_id, domain, runs, citations)
+                            for (day, question_id, domain), (runs, citations) in totals.items())
@@ -0,0 +1,123 @@
+import json
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVWriter
+
+# 有序列表项: "1. xxx", "2) xxx", "3、xxx", 最多缩进3个空格
+LIST_ITEM = re.compile(r'^ {0,3}(\d{1,3})[.)．、]\s*(.*\S)\s*$')
+# 列表项下的子项: "   - 地址：xxx"
+SUB_ITEM = re.compile(r'^\s+[-*+•]\s+(.*\S)\s*$')
+# 行内Markdown标记: 链接只保留文字, 去掉强调和代码标记
+MARKDOWN_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+MARKDOWN_EMPHASIS = re.compile(r'[*_`]+')
+# 名称与说明之间的分隔: " - ", " — ", "：", ":"
+NAME_SEPARATOR = re.compile(r'\s+[-–—]\s+|[：:]')
+
+MAX_NAME_LENGTH = 100
+MAX_ATTRIBUTES = 10
+
+
+def _plain(text: str) -> str:
+    """去掉行内Markdown标记"""
+    return MARKDOWN_EMPHASIS.sub('', MARKDOWN_LINK.sub(r'\1', text)).strip()
+
+
+def _entity_name(text: str) -> str:
+    """列表项的实体名: 有加粗时取第一个加粗片段, 否则取分隔符之前的部分"""
+    bold = re.match(r'\*\*(.+?)\*\*', text) or re.match(r'__(.+?)__', text)
+    name = _plain(bold.group(1)) if bold else NAME_SEPARATOR.split(_plain(text), 1)[0]
+    return name.strip(' ：:，,。.;；')[:MAX_NAME_LENGTH]
+
+
+def entity_key(name: str) -> str:
+    """归并同一实体的键: 半角、小写、合并空白"""
+    return ' '.join(unicodedata.normalize('NFKC', name).lower().split())
+
+
+def extract_entities(markdown: str) -> List[Tuple[int, str, Dict[str, str]]]:
+    """从回答中的第一个有序列表提取排名实体: [(名次, 名称, {属性: 值})]
+
+    名次按列表项的顺序从1开始, 列表项下"键：值"形式的子项作为属性。列表之后出现不缩进的
+    其他内容(如"**总结：**")或另一个从1开始的列表时停止; 同一实体重复出现时只保留第一次。
+    """
+    entities: List[Tuple[int, str, Dict[str, str]]] = []
+    seen = set()
+    attributes: Optional[Dict[str, str]] = None
+    expected = 1
+    for line in (markdown or '').splitlines():
+        if not line.strip():
+            continue
+        item = LIST_ITEM.match(line)
+        if item:
+            number = int(item.group(1))
+            if number != expected:
+                if entities and number == 1:
+                    break
+                continue
+            expected += 1
+            name = _entity_name(item.group(2))
+            key = entity_key(name)
+            if not key or key in seen:
+                attributes = None
+                continue
+            seen.add(key)
+            attributes = {}
+            entities.append((len(entities) + 1, name, attributes))
+            continue
+        sub_item = SUB_ITEM.match(line)
+        if sub_item:
+            if attributes is not None and len(attributes) < MAX_ATTRIBUTES:
+                parts = re.split(r'[：:]', _plain(sub_item.group(1)), 1)
+                if len(parts) == 2 and parts[0].strip() and parts[1].strip():
+                    attributes.setdefault(parts[0].strip(), parts[1].strip())
+            continue
+        if entities and not line[0].isspace():
+            break
+    return entities
+
+
+def ranked_entities(answers: Iterable[str]) -> List[Tuple[int, str, Dict[str, str]]]:
+    """一次运行的排名实体, 取最后一条能提取出实体的回答"""
+    found: List[Tuple[int, str, Dict[str, str]]] = []
+    for answer in answers:
+        entities = extract_entities(answer)
+        if entities:
+            found = entities
+    return found
+
+
+def entity_rows(conversation_id: int, question_id, day: str, entities: List[Tuple[int, str, Dict[str, str]]]) -> List[Tuple]:
+    """一次完成的运行在实体表中的行: 每个实体一行, 另加一行名次为0、实体为空的运行标记
+
+    [(conversation_id, question_id, 日期, 名次, 实体键, 名称, 属性JSON)], 运行标记用于计算出现率的分母,
+    没有提取出实体的运行也会写入。
+    """
+    rows = [(conversation_id, question_id, day, 0, '', '', '')]
+    for position, name, attributes in entities:
+        rows.append((conversation_id, question_id, day, position, entity_key(name), name,
+                     json.dumps(attributes, ensure_ascii=False, separators=(',', ':')) if attributes else ''))
+    return rows
+
+
+class EntityIndex(AppendOnlyCSVWriter):
+    """从回答中提取的排名实体(data/_meta/ranked_entities.csv)
+
+    只追加的CSV, 每完成一次运行解析一次回答并追加entity_rows; API按问题建立索引,
+    查询时不再解析Markdown。SQLite存储把同样的行写入ranked_entities表。
+    """
+
+    HEADER = ['conversation_id', 'question_id', 'day', 'position', 'entity', 'name', 'attributes']
+
+    def append(self, conversation_id: int, question_id, day: str, answers: Iterable[str]):
+        """解析一次完成的运行的回答并记录其中的排名实体"""
+        rows = entity_rows(conversation_id, question_id, day, ranked_entities(answers))
+        with self._lock:
+            self._append(rows)
+
+    def rebuild(self, runs: Iterable[Tuple[int, object, str, List[Tuple[int, str, Dict[str, str]]]]]):
+        """由全部完成的运行[(conversation_id, question_id, 日期, 已提取的实体)]重写实体表"""
+        with self._lock:
+            self._write_all(row for conversation_id, question_id, day, entities in runs
+                            for row in entity_rows(conversation_id, question_id, day, entities))
@@ -0,0 +1,109 @@
+"""CSV存储维护命令
+
+用法: python -m app.maintenance <命令> [--data-dir /app/data] [--url http://localhost:8080]
+
+命令发给运行中的scraper进程(POST /maintenance/<命令>), 在它的写线程中与抓取的写入串行执行,
+内存中的ID分配器、行索引等状态随之更新; 连不上scraper(没有运行)时才在本进程中直接执行。
+"""
+import argparse
+import urllib.error
+import urllib.request
+
+from loguru import logger
+
+from .config import settings
+from .csv_storage import CSVStorage
+from .sqlite_storage import SQLiteStorage
+
+
+def rebuild_stats(storage: CSVStorage):
+    """从原始CSV重新计算 /stats 使用的计数器"""
+    stats = storage.rebuild_stats()
+    logger.info(f"Rebuilt stats: {stats}")
+
+
+def compact_journal(storage: CSVStorage):
+    """把对话状态日志合并回conversations.csv"""
+    storage.compact_status_journal()
+    logger.info("Compacted conversation status journal")
+
+
+def archive(storage: CSVStorage):
+    """压缩已关闭的分区"""
+    archived = storage.archive_partitions(settings.csv_archive_codec)
+    logger.info(f"Archived partitions: {archived}")
+
+
+def rebuild_search(storage: CSVStorage):
+    """从原始正文重建 /search 使用的倒排索引"""
+    storage.rebuild_search_index()
+    logger.info("Rebuilt search index")
+
+
+def rebuild_domains(storage: CSVStorage):
+    """从已完成的运行重建 /rankings/domains 使用的引用汇总"""
+    storage.rebuild_domain_rollup()
+    logger.info("Rebuilt domain citation rollup")
+
+
+def rebuild_entities(storage: CSVStorage):
+    """从已完成运行的回答重新提取 /rankings/entities 使用的排名实体"""
+    storage.rebuild_entity_index()
+    logger.info("Rebuilt ranked entity index")
+
+
+def rebuild_timeseries(storage: CSVStorage):
+    """从全部运行重建 /metrics/runs/timeseries 使用的按小时汇总"""
+    storage.rebuild_run_timeseries()
+    logger.info("Rebuilt run timeseries")
+
+
+def import_sqlite(storage: CSVStorage):
+    """把CSV数据一次性导入SQLite数据库(可重复执行, 已导入的行会跳过)"""
+    SQLiteStorage(settings.sqlite_path).import_csv(storage.data_dir)
+
+
+COMMANDS = {
+    'rebuild-stats': rebuild_stats,
+    'rebuild-search': rebuild_search,
+    'rebuild-domains': rebuild_domains,
+    'rebuild-entities': rebuild_entities,
+    'rebuild-timeseries': rebuild_timeseries,
+    'compact-journal': compact_journal,
+    'import-sqlite': import_sqlite,
+    'archive': archive,
+}
+
+
+def run_in_scraper(url: str, command: str) -> bool:
+    """在运行中的scraper进程里执行命令, scraper没有运行时返回False"""
+    request = urllib.request.Request(f"{url.rstrip('/')}/maintenance/{command}", method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            logger.info(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        raise SystemExit(f"Scraper rejected {command}: {e.code} {e.read().decode('utf-8', 'replace')}")
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, ConnectionRefusedError):
+            return False
+        raise SystemExit(f"Cannot reach the scraper at {url}: {e.reason}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PandaRank CSV storage maintenance")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--data-dir', default="/app/data")
+    parser.add_argument('--url', default="http://localhost:8080", help="Running scraper to execute the command in")
+    args = parser.parse_args()
+
+    if run_in_scraper(args.url, args.command):
+        return
+    # scraper没有运行, 数据目录没有其他写入者
+    logger.info("Scraper is not running, executing the command in this process")
+    storage = CSVStorage(args.data_dir, partition_format=settings.csv_partition_format)
+    COMMANDS[args.command](storage)
+
+
+if __name__ == "__main__":
+    main()
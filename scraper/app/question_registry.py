@@ -0,0 +1,101 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+from loguru import logger
+
+# 有libyaml时使用C实现的解析器, 速度快一个数量级
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class QuestionRegistry:
+    """geo_questions.yaml中的问题池
+
+    文件只在修改时间或大小变化时重新解析, 解析后按id和分类建立索引, 查询都是字典查找。
+    重新加载时一次替换全部索引, 读取不需要加锁。api/app/question_registry.py与本文件相同。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # (文件指纹, 问题列表, id索引, 分类索引)
+        self._state = (None, [], {}, {})
+
+    def _fingerprint(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        fingerprint = self._fingerprint()
+        state = self._state
+        if state[0] == fingerprint:
+            return state
+        with self._lock:
+            state = self._state
+            if state[0] == fingerprint:
+                return state
+            questions = []
+            if fingerprint is not None:
+                try:
+                    with open(self.path, 'rb') as f:
+                        data = yaml.load(f, Loader=SafeLoader) or []
+                except yaml.YAMLError as e:
+                    # 文件可能正在编辑, 保留上次的问题, 下次修改后再解析
+                    logger.error(f"Failed to parse {self.path}: {e}")
+                    self._state = (fingerprint,) + state[1:]
+                    return self._state
+                questions = [q for q in data if isinstance(q, dict)]
+            by_id = {}
+            by_category = {}
+            for question in questions:
+                by_id.setdefault(question.get('id'), question)
+                by_category.setdefault(question.get('category'), []).append(question)
+            self._state = (fingerprint, questions, by_id, by_category)
+            return self._state
+
+    @property
+    def version(self):
+        """文件指纹, 问题池变化时改变"""
+        return self._load()[0]
+
+    def all(self) -> List[Dict]:
+        """全部问题, 按文件中的顺序"""
+        return self._load()[1]
+
+    def get(self, question_id) -> Optional[Dict]:
+        """按id查找问题, 不存在时返回None"""
+        return self._load()[2].get(question_id)
+
+    def by_category(self, category: str) -> List[Dict]:
+        """某个分类中的问题"""
+        return self._load()[3].get(category, [])
+
+    def categories(self) -> List[str]:
+        return [category for category in self._load()[3] if category is not None]
+
+    def first(self) -> Optional[Dict]:
+        """文件中的第一个问题, 问题池为空时返回None"""
+        questions = self.all()
+        return questions[0] if questions else None
+
+    def __len__(self):
+        return len(self.all())
+
+
+_registries: Dict[Path, QuestionRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path) -> QuestionRegistry:
+    """同一个文件在进程内共享一个QuestionRegistry"""
+    path = Path(path)
+    registry = _registries.get(path)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(path, QuestionRegistry(path))
+    return registry
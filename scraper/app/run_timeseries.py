@@ -0,0 +1,71 @@
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .csv_files import AppendOnlyCSVWriter
+
+# 耗时直方图相邻两格的比例, 格内取值的相对误差不超过(GAMMA - 1) / (GAMMA + 1), 约1%;
+# api/app/run_timeseries.py按同一比例把格号换算回秒数
+GAMMA = 1.02
+
+
+def duration_bin(seconds: float) -> int:
+    """耗时所在的直方图格号: 第i格覆盖(GAMMA^(i-1), GAMMA^i]秒"""
+    return math.ceil(math.log(max(seconds, 0.001)) / math.log(GAMMA))
+
+
+def run_hour(timestamp: str) -> str:
+    """ISO时间戳所在的UTC小时, 如 2025-07-08T09"""
+    return timestamp[:13]
+
+
+def run_duration(started_at: str, finished_at: str) -> Optional[float]:
+    """运行耗时(秒), 时间戳缺失或无法解析时返回None"""
+    try:
+        return (datetime.fromisoformat(finished_at) - datetime.fromisoformat(started_at)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def finished_entry(started_at: str, finished_at: str) -> Tuple[str, int, int, str]:
+    """一次完成的运行对时间序列的增量, 按开始时间所在的小时计"""
+    duration = run_duration(started_at, finished_at)
+    return run_hour(started_at), 0, 1, '' if duration is None else str(duration_bin(duration))
+
+
+class RunTimeseries(AppendOnlyCSVWriter):
+    """按小时汇总的运行数、完成数和耗时直方图(data/_meta/run_timeseries.csv)
+
+    只追加的CSV(hour, started, finished, duration_bin): 创建运行时追加(小时, 1, 0, ''),
+    完成时追加(开始的小时, 0, 1, 耗时格号), 读者按小时累加; duration_bin非空时finished同时计入
+    该格。直方图可以直接相加, 任意长的时间范围和任意宽的桶都由小时汇总合并得到。
+    """
+
+    HEADER = ['hour', 'started', 'finished', 'duration_bin']
+
+    def append_started(self, started_at: str):
+        """记录一次新创建的运行"""
+        with self._lock:
+            self._append([(run_hour(started_at), 1, 0, '')])
+
+    def append_finished(self, started_at: str, finished_at: str):
+        """记录一次完成的运行及其耗时"""
+        with self._lock:
+            self._append([finished_entry(started_at, finished_at)])
+
+    def rebuild(self, runs: Iterable[Tuple[str, str]]):
+        """由全部运行[(started_at, finished_at)]重写汇总, 未完成的运行finished_at为空"""
+        started: Dict[str, int] = {}
+        finished: Dict[Tuple[str, str], int] = {}
+        for started_at, finished_at in runs:
+            if not started_at:
+                continue
+            hour = run_hour(started_at)
+            started[hour] = started.get(hour, 0) + 1
+            if finished_at:
+                key = (hour, finished_entry(started_at, finished_at)[3])
+                finished[key] = finished.get(key, 0) + 1
+        entries: List[Tuple] = [(hour, count, 0, '') for hour, count in sorted(started.items())]
+        entries += [(hour, 0, count, bin) for (hour, bin), count in sorted(finished.items())]
+        with self._lock:
+            self._write_all(entries)
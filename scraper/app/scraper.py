@@ -1,7 +1,7 @@
 import asyncio
 import uuid
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 import json
 
@@ -217,48 +217,48 @@ OPENAI_PWD=your_password
     
     async def submit_prompt_csv(self, conversation_id: int, prompt_text: str, storage) -> Dict:
         """Submit a prompt and capture the response (CSV version)"""
-        # Navigate to new chat
-        await self.page.goto("https://chat.openai.com", wait_until="networkidle")
-        await asyncio.sleep(2)
-        
-        # Store browsing events
-        self.browsing_events = []
-        
-        # Find and fill the prompt textarea
-        logger.info("查找输入框...")
-        textarea = await self.page.wait_for_selector('textarea[placeholder*="Message"]')
-        logger.info("找到输入框，填入文本")
-        await textarea.fill(prompt_text)
-        
-        # Submit the prompt
-        logger.info("按下Enter键提交")
-        await self.page.press('textarea[placeholder*="Message"]', 'Enter')
-        
-        # Wait for response to complete
-        logger.info("等待响应完成...")
-        await self._wait_for_response_completion()
-        
-        # Capture the assistant's response
-        logger.info("提取助手响应...")
-        response_text = await self._extract_assistant_response()
-        logger.info(f"响应长度: {len(response_text)} 字符")
-        
-        # Save assistant message to CSV
-        storage.add_message(conversation_id, "assistant", response_text)
-        
-        # Save browsing events to CSV
-        for event in self.browsing_events:
-            storage.add_web_search(
-                conversation_id,
-                event.get('url', ''),
-                event.get('title', '')
-            )
-        
-        # 抓取思考过程和搜索信息
-        await self._capture_reasoning_and_search_info_csv(conversation_id, storage)
-        
-        # Capture artifacts (simplified for CSV)
-        await self._capture_artifacts_csv(conversation_id, storage)
+        # 本次运行的结果随抓取逐步加入, 最后一次性写入; 中途失败时已抓到的部分也会写入
+        records = {"messages": [("user", prompt_text)]}
+        try:
+            # Navigate to new chat
+            await self.page.goto("https://chat.openai.com", wait_until="networkidle")
+            await asyncio.sleep(2)
+            
+            # Store browsing events
+            self.browsing_events = []
+            
+            # Find and fill the prompt textarea
+            logger.info("查找输入框...")
+            textarea = await self.page.wait_for_selector('textarea[placeholder*="Message"]')
+            logger.info("找到输入框，填入文本")
+            await textarea.fill(prompt_text)
+            
+            # Submit the prompt
+            logger.info("按下Enter键提交")
+            await self.page.press('textarea[placeholder*="Message"]', 'Enter')
+            
+            # Wait for response to complete
+            logger.info("等待响应完成...")
+            await self._wait_for_response_completion()
+            
+            # Capture the assistant's response
+            logger.info("提取助手响应...")
+            response_text = await self._extract_assistant_response()
+            logger.info(f"响应长度: {len(response_text)} 字符")
+            
+            records["messages"].append(("assistant", response_text))
+            records["web_searches"] = [
+                (event.get('url', ''), event.get('title', ''))
+                for event in self.browsing_events
+            ]
+            
+            # 抓取思考过程和搜索信息
+            records.update(await self._capture_reasoning_and_search_info_csv(conversation_id))
+            
+            # Capture artifacts (simplified for CSV)
+            records["artifacts"] = await self._capture_artifacts_csv(conversation_id)
+        finally:
+            await storage.add_run_records(conversation_id, **records)
         
         return {
             "response": response_text,
@@ -405,27 +405,35 @@ OPENAI_PWD=your_password
         
         logger.info(f"Captured artifacts for conversation {conversation_id}")
     
-    async def _capture_artifacts_csv(self, conversation_id: int, storage):
-        """Capture screenshots and HTML content (CSV version)"""
+    async def _capture_artifacts_csv(self, conversation_id: int) -> List[Tuple[str, str]]:
+        """Capture screenshots and HTML content (CSV version), returns [(type, path)]"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         conv_dir = self.artifacts_dir / str(conversation_id)
-        conv_dir.mkdir(exist_ok=True)
-        
-        # Capture screenshot
-        screenshot_path = conv_dir / f"screenshot_{timestamp}.png"
-        await self.page.screenshot(path=str(screenshot_path), full_page=True)
-        storage.add_artifact(conversation_id, "screenshot", str(screenshot_path))
-        
-        # Capture HTML
-        html_content = await self.page.content()
-        html_path = conv_dir / f"page_{timestamp}.html"
-        html_path.write_text(html_content)
-        storage.add_artifact(conversation_id, "html", str(html_path))
+        artifacts = []
+        try:
+            conv_dir.mkdir(exist_ok=True)
+            
+            # Capture screenshot
+            screenshot_path = conv_dir / f"screenshot_{timestamp}.png"
+            await self.page.screenshot(path=str(screenshot_path), full_page=True)
+            artifacts.append(("screenshot", str(screenshot_path)))
+            
+            # Capture HTML
+            html_content = await self.page.content()
+            html_path = conv_dir / f"page_{timestamp}.html"
+            html_path.write_text(html_content)
+            artifacts.append(("html", str(html_path)))
+            
+            logger.info(f"Captured artifacts for conversation {conversation_id}")
+        except Exception as e:
+            # 截图失败不影响已抓取的回答和搜索信息
+            logger.warning(f"Failed to capture artifacts: {e}")
         
-        logger.info(f"Captured artifacts for conversation {conversation_id}")
+        return artifacts
     
-    async def _capture_reasoning_and_search_info_csv(self, conversation_id: int, storage):
-        """抓取思考过程和搜索信息 (CSV版本)"""
+    async def _capture_reasoning_and_search_info_csv(self, conversation_id: int) -> Dict:
+        """抓取思考过程和搜索信息 (CSV版本), 返回可直接传给storage.add_run_records的记录"""
+        records = {"reasoning": [], "search_queries": [], "visited_sites": []}
         try:
             # 等待页面完全加载
             await asyncio.sleep(3)
@@ -433,29 +441,27 @@ OPENAI_PWD=your_password
             # 尝试查找和点击思考过程按钮
             reasoning_content = await self._extract_reasoning_process()
             if reasoning_content:
-                storage.add_reasoning(conversation_id, reasoning_content)
+                records["reasoning"].append(reasoning_content)
                 logger.info(f"Captured reasoning process for conversation {conversation_id}")
             
             # 抓取搜索查询和访问网站
             search_info = await self._extract_search_information()
             
-            # 保存搜索查询
-            for query in search_info.get('queries', []):
-                storage.add_search_query(conversation_id, query)
+            # 搜索查询
+            records["search_queries"] = list(search_info.get('queries', []))
             
-            # 保存访问网站
-            for site in search_info.get('sites', []):
-                storage.add_visited_site(
-                    conversation_id,
-                    site.get('url', ''),
-                    site.get('title', ''),
-                    site.get('description', '')
-                )
+            # 访问网站
+            records["visited_sites"] = [
+                (site.get('url', ''), site.get('title', ''), site.get('description', ''))
+                for site in search_info.get('sites', [])
+            ]
             
             logger.info(f"Captured {len(search_info.get('queries', []))} search queries and {len(search_info.get('sites', []))} visited sites")
             
         except Exception as e:
             logger.warning(f"Failed to capture reasoning/search info: {e}")
+        
+        return records
     
     async def _extract_reasoning_process(self) -> str:
         """提取思考过程"""
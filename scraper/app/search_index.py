@@ -0,0 +1,64 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+from .csv_files import AppendOnlyCSVWriter
+
+# 中日韩文字(统一表意文字及扩展A、兼容表意文字、假名、韩文音节)连续的一段, 或拉丁字母数字组成的单词
+TOKEN_PATTERN = re.compile(r'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]+)|([0-9a-z]+)')
+
+# 建立索引的子表及其正文字段
+SEARCH_SOURCES = {
+    'messages': 'content_md',
+    'reasoning': 'reasoning_content',
+    'search_queries': 'query_text',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """切分检索词: 中日韩文字取相邻两字(只有一个字时取单字), 拉丁字母和数字按单词, 统一为半角小写
+
+    api/app/search_index.py用同一规则切分查询, 两处必须保持一致。
+    """
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(unicodedata.normalize('NFKC', text or '').lower()):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def postings(conversation_id: int, source: str, texts: Iterable[str]) -> List[Tuple[str, int, str, int]]:
+    """一个对话在一张子表中新增正文的倒排项: [(检索词, conversation_id, 子表, 词频)]"""
+    counts = Counter(token for text in texts for token in tokenize(text))
+    return [(token, conversation_id, source, tf) for token, tf in counts.items()]
+
+
+class SearchIndex(AppendOnlyCSVWriter):
+    """全文检索的倒排索引(data/_meta/search_postings.csv)
+
+    只追加的CSV(token, conversation_id, source, tf), 正文写入数据文件后追加对应的倒排项;
+    同一个对话的同一个词可以有多行, 读者按(对话, 子表)累加词频。API增量读取新追加的行,
+    查询只访问查询词的倒排项, 与语料总量无关。
+    """
+
+    HEADER = ['token', 'conversation_id', 'source', 'tf']
+
+    def append(self, conversation_id: int, source: str, texts: Iterable[str]):
+        """为一个对话在一张子表中新写入的正文追加倒排项"""
+        entries = postings(conversation_id, source, texts)
+        if not entries:
+            return
+        with self._lock:
+            self._append(entries)
+
+    def rebuild(self, documents: Iterable[Tuple[int, str, str]]):
+        """由全部正文[(conversation_id, 子表, 正文)]重写整个索引"""
+        with self._lock:
+            self._write_all(entry for conversation_id, source, text in documents
+                            for entry in postings(conversation_id, source, [text]))
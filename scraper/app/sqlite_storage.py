@@ -0,0 +1,435 @@
+import csv
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+from loguru import logger
+
+from .domain_rollup import rollup_entries
+from .entity_index import entity_rows, extract_entities, ranked_entities
+from .question_registry import get_registry
+from .run_timeseries import finished_entry, run_hour
+from .search_index import SEARCH_SOURCES, postings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id            INTEGER PRIMARY KEY,
+    run_uuid      TEXT NOT NULL,
+    question_id   INTEGER,
+    question_text TEXT,
+    started_at    TEXT,
+    finished_at   TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    role            TEXT,
+    content_md      TEXT,
+    scraped_at      TEXT
+);
+CREATE TABLE IF NOT EXISTS web_searches (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    url             TEXT,
+    title           TEXT,
+    fetched_at      TEXT
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    type            TEXT,
+    path            TEXT,
+    created_at      TEXT
+);
+CREATE TABLE IF NOT EXISTS reasoning (
+    id                INTEGER PRIMARY KEY,
+    conversation_id   INTEGER NOT NULL,
+    reasoning_content TEXT,
+    created_at        TEXT
+);
+CREATE TABLE IF NOT EXISTS search_queries (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    query_text      TEXT,
+    created_at      TEXT
+);
+CREATE TABLE IF NOT EXISTS visited_sites (
+    id               INTEGER PRIMARY KEY,
+    conversation_id  INTEGER NOT NULL,
+    site_url         TEXT,
+    site_title       TEXT,
+    site_description TEXT,
+    created_at       TEXT
+);
+-- 全文检索的倒排项, 同一个词在同一对话中可以有多行, 读取时累加词频
+CREATE TABLE IF NOT EXISTS search_postings (
+    token           TEXT NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    source          TEXT NOT NULL,
+    tf              INTEGER NOT NULL
+);
+-- 按(问题, 可注册域名, 日期)汇总的引用数, domain为空的行是该问题当天完成的运行数与引用总数
+CREATE TABLE IF NOT EXISTS domain_rollup (
+    question_id INTEGER NOT NULL,
+    domain      TEXT NOT NULL,
+    day         TEXT NOT NULL,
+    runs        INTEGER NOT NULL,
+    citations   INTEGER NOT NULL,
+    PRIMARY KEY (question_id, domain, day)
+);
+-- 按小时汇总的运行数和完成数, duration_bin非空的行是该小时完成的运行在耗时直方图这一格中的数量
+CREATE TABLE IF NOT EXISTS run_timeseries (
+    hour         TEXT NOT NULL,
+    duration_bin TEXT NOT NULL,
+    started      INTEGER NOT NULL,
+    finished     INTEGER NOT NULL,
+    PRIMARY KEY (hour, duration_bin)
+);
+-- 从回答中提取的排名实体, 每次运行另有一行position为0、entity为空的运行标记
+CREATE TABLE IF NOT EXISTS ranked_entities (
+    conversation_id INTEGER NOT NULL,
+    question_id     INTEGER,
+    day             TEXT NOT NULL,
+    position        INTEGER NOT NULL,
+    entity          TEXT NOT NULL,
+    name            TEXT NOT NULL,
+    attributes      TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_run_uuid ON conversations(run_uuid);
+CREATE INDEX IF NOT EXISTS idx_conversations_started_at ON conversations(started_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_finished_at ON conversations(finished_at);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_web_searches_conversation_id ON web_searches(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_conversation_id ON artifacts(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_reasoning_conversation_id ON reasoning(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_search_queries_conversation_id ON search_queries(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_visited_sites_conversation_id ON visited_sites(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_search_postings_token ON search_postings(token);
+CREATE INDEX IF NOT EXISTS idx_ranked_entities_question ON ranked_entities(question_id, day);
+"""
+
+# 固定的参数化语句, sqlite3按SQL文本缓存预编译结果
+INSERT_CONVERSATION = "INSERT INTO conversations (run_uuid, question_id, question_text, started_at, finished_at) VALUES (?, ?, ?, ?, NULL)"
+FINISH_CONVERSATION = "UPDATE conversations SET finished_at = ? WHERE id = ?"
+INSERT_MESSAGE = "INSERT INTO messages (conversation_id, role, content_md, scraped_at) VALUES (?, ?, ?, ?)"
+INSERT_WEB_SEARCH = "INSERT INTO web_searches (conversation_id, url, title, fetched_at) VALUES (?, ?, ?, ?)"
+INSERT_ARTIFACT = "INSERT INTO artifacts (conversation_id, type, path, created_at) VALUES (?, ?, ?, ?)"
+INSERT_REASONING = "INSERT INTO reasoning (conversation_id, reasoning_content, created_at) VALUES (?, ?, ?)"
+INSERT_SEARCH_QUERY = "INSERT INTO search_queries (conversation_id, query_text, created_at) VALUES (?, ?, ?)"
+INSERT_VISITED_SITE = "INSERT INTO visited_sites (conversation_id, site_url, site_title, site_description, created_at) VALUES (?, ?, ?, ?, ?)"
+INSERT_POSTING = "INSERT INTO search_postings (token, conversation_id, source, tf) VALUES (?, ?, ?, ?)"
+UPSERT_DOMAIN_ROLLUP = (
+    "INSERT INTO domain_rollup (day, question_id, domain, runs, citations) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (question_id, domain, day) DO UPDATE SET runs = runs + excluded.runs, citations = citations + excluded.citations"
+)
+INSERT_ENTITY = "INSERT INTO ranked_entities (conversation_id, question_id, day, position, entity, name, attributes) VALUES (?, ?, ?, ?, ?, ?, ?)"
+UPSERT_RUN_TIMESERIES = (
+    "INSERT INTO run_timeseries (hour, started, finished, duration_bin) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (hour, duration_bin) DO UPDATE SET started = started + excluded.started, finished = finished + excluded.finished"
+)
+HAS_TABLE = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+
+SELECT_CONVERSATIONS = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations ORDER BY started_at DESC LIMIT ?"
+SELECT_CONVERSATION_BY_ID = "SELECT question_id, started_at, finished_at FROM conversations WHERE id = ?"
+SELECT_CITED_URLS = "SELECT url FROM web_searches WHERE conversation_id = ? UNION ALL SELECT site_url FROM visited_sites WHERE conversation_id = ?"
+SELECT_ANSWERS = "SELECT content_md FROM messages WHERE conversation_id = ? AND role = 'assistant' ORDER BY id"
+SELECT_CONVERSATION_BY_UUID = "SELECT id, run_uuid, question_id, question_text, started_at, finished_at FROM conversations WHERE run_uuid = ?"
+SELECT_MESSAGES = "SELECT id, role, content_md, scraped_at FROM messages WHERE conversation_id = ? ORDER BY id"
+SELECT_WEB_SEARCHES = "SELECT id, url, title, fetched_at FROM web_searches WHERE conversation_id = ? ORDER BY id"
+SELECT_ARTIFACTS = "SELECT id, type, path, created_at FROM artifacts WHERE conversation_id = ? ORDER BY id"
+SELECT_REASONING = "SELECT id, reasoning_content, created_at FROM reasoning WHERE conversation_id = ? ORDER BY id"
+SELECT_SEARCH_QUERIES = "SELECT id, query_text, created_at FROM search_queries WHERE conversation_id = ? ORDER BY id"
+SELECT_VISITED_SITES = "SELECT id, site_url, site_title, site_description, created_at FROM visited_sites WHERE conversation_id = ? ORDER BY id"
+
+
+class SQLiteStorage:
+    """嵌入式SQLite存储(WAL模式), 方法与CSVStorage一致
+
+    WAL模式下API的读连接不会与scraper的写事务互相阻塞。
+    """
+
+    def __init__(self, db_path: str = "/app/data/pandarank.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True)
+
+        # 问题池, 用于统计问题数量
+        self.questions_file = self.db_path.parent / "geo_questions.yaml"
+
+        # 写线程与事件循环线程共用一个连接, 由锁串行化
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, cached_statements=64)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        has_search_postings = self._conn.execute(HAS_TABLE, ('search_postings',)).fetchone() is not None
+        has_domain_rollup = self._conn.execute(HAS_TABLE, ('domain_rollup',)).fetchone() is not None
+        has_ranked_entities = self._conn.execute(HAS_TABLE, ('ranked_entities',)).fetchone() is not None
+        has_run_timeseries = self._conn.execute(HAS_TABLE, ('run_timeseries',)).fetchone() is not None
+        self._conn.executescript(SCHEMA)
+
+        # 升级前创建的数据库没有这些派生表, 从已有数据补建
+        if not has_search_postings:
+            self.rebuild_search_index()
+        if not has_domain_rollup:
+            self.rebuild_domain_rollup()
+        if not has_ranked_entities:
+            self.rebuild_entity_index()
+        if not has_run_timeseries:
+            self.rebuild_run_timeseries()
+
+    def create_conversation(self, run_uuid: str, question_id: int, question_text: str) -> int:
+        """创建新对话记录"""
+        started_at = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(INSERT_CONVERSATION, (run_uuid, question_id, question_text, started_at))
+            self._conn.execute(UPSERT_RUN_TIMESERIES, (run_hour(started_at), 1, 0, ''))
+        return cursor.lastrowid
+
+    def finish_conversation(self, conversation_id: int):
+        """标记对话完成"""
+        finished_at = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            conversation = self._conn.execute(SELECT_CONVERSATION_BY_ID, (conversation_id,)).fetchone()
+            self._conn.execute(FINISH_CONVERSATION, (finished_at, conversation_id))
+            # 第一次完成时更新时间序列和域名汇总并提取排名实体, 与完成标记在同一事务中
+            if conversation is not None and not conversation['finished_at']:
+                self._conn.execute(UPSERT_RUN_TIMESERIES, finished_entry(conversation['started_at'], finished_at))
+                day, question_id = conversation['started_at'][:10], conversation['question_id']
+                urls = [row[0] for row in self._conn.execute(SELECT_CITED_URLS, (conversation_id, conversation_id))]
+                self._conn.executemany(UPSERT_DOMAIN_ROLLUP, rollup_entries(day, question_id, urls))
+                answers = [row[0] for row in self._conn.execute(SELECT_ANSWERS, (conversation_id,))]
+                self._conn.executemany(INSERT_ENTITY, entity_rows(conversation_id, question_id, day, ranked_entities(answers)))
+
+    def add_message(self, conversation_id: int, role: str, content: str):
+        """添加消息"""
+        self.add_run_records(conversation_id, messages=[(role, content)])
+
+    def add_web_search(self, conversation_id: int, url: str, title: str):
+        """添加网页搜索记录"""
+        self.add_run_records(conversation_id, web_searches=[(url, title)])
+
+    def add_artifact(self, conversation_id: int, artifact_type: str, path: str):
+        """添加文件记录"""
+        self.add_run_records(conversation_id, artifacts=[(artifact_type, path)])
+
+    def add_reasoning(self, conversation_id: int, reasoning_content: str):
+        """添加思考过程记录"""
+        self.add_run_records(conversation_id, reasoning=[reasoning_content])
+
+    def add_search_query(self, conversation_id: int, query_text: str):
+        """添加搜索查询记录"""
+        self.add_run_records(conversation_id, search_queries=[query_text])
+
+    def add_visited_site(self, conversation_id: int, site_url: str, site_title: str = "", site_description: str = ""):
+        """添加访问网站记录"""
+        self.add_run_records(conversation_id, visited_sites=[(site_url, site_title, site_description)])
+
+    def add_run_records(
+        self,
+        conversation_id: int,
+        messages: Optional[List[Tuple[str, str]]] = None,
+        web_searches: Optional[List[Tuple[str, str]]] = None,
+        reasoning: Optional[List[str]] = None,
+        search_queries: Optional[List[str]] = None,
+        visited_sites: Optional[List[Tuple[str, str, str]]] = None,
+        artifacts: Optional[List[Tuple[str, str]]] = None
+    ):
+        """在一个事务中写入一次运行的全部结果, 参数格式同CSVStorage.add_run_records"""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(INSERT_MESSAGE, [(conversation_id, role, content, now) for role, content in messages or []])
+            self._conn.executemany(INSERT_WEB_SEARCH, [(conversation_id, url, title, now) for url, title in web_searches or []])
+            self._conn.executemany(INSERT_REASONING, [(conversation_id, content, now) for content in reasoning or []])
+            self._conn.executemany(INSERT_SEARCH_QUERY, [(conversation_id, query_text, now) for query_text in search_queries or []])
+            self._conn.executemany(INSERT_VISITED_SITE, [(conversation_id, url, title, description, now) for url, title, description in visited_sites or []])
+            self._conn.executemany(INSERT_ARTIFACT, [(conversation_id, artifact_type, path, now) for artifact_type, path in artifacts or []])
+            self._conn.executemany(INSERT_POSTING, postings(conversation_id, 'messages', [content for _, content in messages or []]))
+            self._conn.executemany(INSERT_POSTING, postings(conversation_id, 'reasoning', reasoning or []))
+            self._conn.executemany(INSERT_POSTING, postings(conversation_id, 'search_queries', search_queries or []))
+
+    def rebuild_search_index(self):
+        """从已有正文重建全文检索的倒排项"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM search_postings")
+            for table, field in SEARCH_SOURCES.items():
+                for conversation_id, text in self._conn.execute(f"SELECT conversation_id, {field} FROM {table}"):
+                    self._conn.executemany(INSERT_POSTING, postings(conversation_id, table, [text or '']))
+
+    def rebuild_domain_rollup(self):
+        """从已完成的运行重建按(问题, 域名, 日期)的引用汇总"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM domain_rollup")
+            urls: Dict[int, List[str]] = {}
+            for conversation_id, url in self._conn.execute(
+                "SELECT conversation_id, url FROM web_searches UNION ALL SELECT conversation_id, site_url FROM visited_sites"
+            ):
+                urls.setdefault(conversation_id, []).append(url)
+            finished = self._conn.execute(
+                "SELECT id, question_id, started_at FROM conversations WHERE finished_at IS NOT NULL"
+            ).fetchall()
+            for conversation_id, question_id, started_at in finished:
+                entries = rollup_entries((started_at or '')[:10], question_id, urls.get(conversation_id, []))
+                self._conn.executemany(UPSERT_DOMAIN_ROLLUP, entries)
+
+    def rebuild_entity_index(self):
+        """从已完成运行的回答重新提取排名实体"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ranked_entities")
+            # 每个对话只保留最后一条有实体的回答解析出的实体, 不在内存中保留回答原文
+            entities_of: Dict[int, List] = {}
+            for conversation_id, content in self._conn.execute(
+                "SELECT conversation_id, content_md FROM messages WHERE role = 'assistant' ORDER BY id"
+            ):
+                entities = extract_entities(content or '')
+                if entities:
+                    entities_of[conversation_id] = entities
+            finished = self._conn.execute(
+                "SELECT id, question_id, started_at FROM conversations WHERE finished_at IS NOT NULL"
+            ).fetchall()
+            for conversation_id, question_id, started_at in finished:
+                rows = entity_rows(conversation_id, question_id, (started_at or '')[:10], entities_of.get(conversation_id, []))
+                self._conn.executemany(INSERT_ENTITY, rows)
+
+    def rebuild_run_timeseries(self):
+        """从全部运行重建按小时的运行时间序列"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM run_timeseries")
+            for started_at, finished_at in self._conn.execute("SELECT started_at, finished_at FROM conversations").fetchall():
+                if not started_at:
+                    continue
+                self._conn.execute(UPSERT_RUN_TIMESERIES, (run_hour(started_at), 1, 0, ''))
+                if finished_at:
+                    self._conn.execute(UPSERT_RUN_TIMESERIES, finished_entry(started_at, finished_at))
+
+    def get_conversations(self, limit: int = 100) -> List[Dict]:
+        """获取对话列表"""
+        with self._lock:
+            rows = self._conn.execute(SELECT_CONVERSATIONS, (limit,)).fetchall()
+
+        conversations = []
+        for row in rows:
+            duration_seconds = None
+            if row['finished_at'] and row['started_at']:
+                try:
+                    start = datetime.fromisoformat(row['started_at'])
+                    finish = datetime.fromisoformat(row['finished_at'])
+                    duration_seconds = (finish - start).total_seconds()
+                except ValueError:
+                    pass
+
+            conversations.append({
+                'id': row['id'],
+                'run_uuid': row['run_uuid'],
+                'question_id': row['question_id'],
+                'question_text': row['question_text'],
+                'started_at': row['started_at'],
+                'finished_at': row['finished_at'],
+                'duration_seconds': duration_seconds
+            })
+
+        return conversations
+
+    def get_conversation_details(self, run_uuid: str) -> Optional[Dict]:
+        """获取对话详情"""
+        with self._lock:
+            conversation = self._conn.execute(SELECT_CONVERSATION_BY_UUID, (run_uuid,)).fetchone()
+            if not conversation:
+                return None
+
+            conversation_id = conversation['id']
+            messages = self._conn.execute(SELECT_MESSAGES, (conversation_id,)).fetchall()
+            web_searches = self._conn.execute(SELECT_WEB_SEARCHES, (conversation_id,)).fetchall()
+            artifacts = self._conn.execute(SELECT_ARTIFACTS, (conversation_id,)).fetchall()
+            reasoning = self._conn.execute(SELECT_REASONING, (conversation_id,)).fetchall()
+            search_queries = self._conn.execute(SELECT_SEARCH_QUERIES, (conversation_id,)).fetchall()
+            visited_sites = self._conn.execute(SELECT_VISITED_SITES, (conversation_id,)).fetchall()
+
+        return {
+            'id': conversation_id,
+            'run_uuid': conversation['run_uuid'],
+            'question': {
+                'id': conversation['question_id'],
+                'text': conversation['question_text'],
+                'cooldown_min': 1440  # 默认值
+            },
+            'started_at': conversation['started_at'],
+            'finished_at': conversation['finished_at'],
+            'messages': [
+                {'id': row['id'], 'role': row['role'], 'content': row['content_md'], 'scraped_at': row['scraped_at']}
+                for row in messages
+            ],
+            'web_searches': [dict(row) for row in web_searches],
+            'artifacts': [dict(row) for row in artifacts],
+            'reasoning': [dict(row) for row in reasoning],
+            'search_queries': [dict(row) for row in search_queries],
+            'visited_sites': [dict(row) for row in visited_sites]
+        }
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            total_conversations, successful_conversations = self._conn.execute(
+                "SELECT COUNT(*), COUNT(finished_at) FROM conversations"
+            ).fetchone()
+            total_messages = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            total_web_searches = self._conn.execute("SELECT COUNT(*) FROM web_searches").fetchone()[0]
+
+        return {
+            'total_conversations': total_conversations,
+            'successful_conversations': successful_conversations,
+            'success_rate': successful_conversations / total_conversations if total_conversations > 0 else 0,
+            'total_messages': total_messages,
+            'total_web_searches': total_web_searches,
+            'total_questions': self._count_questions()
+        }
+
+    def _count_questions(self) -> int:
+        """问题池中的问题数量"""
+        return len(get_registry(self.questions_file))
+
+    def import_csv(self, data_dir: str) -> Dict[str, int]:
+        """一次性导入数据目录中所有分区的CSV (保留原ID, 已存在的行跳过), 返回每张表导入的行数"""
+        # 延迟导入, 避免两个存储模块互相依赖
+        from .csv_files import open_data_text, resolve_data_file
+        from .csv_storage import CSVStorage
+
+        csv_storage = CSVStorage(data_dir)
+        status = csv_storage._read_status_journal()
+        imported = {}
+        with self._lock, self._conn:
+            for table, columns in CSVStorage.TABLE_HEADERS.items():
+                placeholders = ', '.join('?' for _ in columns)
+                sql = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+                before = self._conn.total_changes
+                for partition in csv_storage.partitions():
+                    csv_file = csv_storage._table_file(table, partition)
+                    if not resolve_data_file(csv_file):
+                        continue
+                    with open_data_text(csv_file) as f:
+                        reader = csv.DictReader(f)
+                        rows = []
+                        for row in reader:
+                            if table == 'conversations':
+                                row = csv_storage._apply_status(row, status)
+                                row['question_text'] = csv_storage._blobs.resolve(row['question_text'])
+                            if table == 'messages':
+                                row['content_md'] = csv_storage._blobs.resolve(row['content_md'])
+                            if table == 'reasoning':
+                                # CSV中的思考过程把换行编码成了\\n, 数据库里保存原文
+                                reasoning_content = csv_storage._blobs.resolve(row['reasoning_content'])
+                                row['reasoning_content'] = reasoning_content.replace('\\n', '\n').replace('\\r', '\r')
+                            rows.append([row.get(column) or None for column in columns])
+                    self._conn.executemany(sql, rows)
+                imported[table] = self._conn.total_changes - before
+
+        # 导入的数据没有派生表中的行, 导入后重建
+        self.rebuild_search_index()
+        self.rebuild_domain_rollup()
+        self.rebuild_entity_index()
+        self.rebuild_run_timeseries()
+        logger.info(f"Imported CSV data from {data_dir}: {imported}")
+        return imported
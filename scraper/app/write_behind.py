@@ -0,0 +1,120 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+class WriteBehindStorage:
+    """把存储后端(CSVStorage / SQLiteStorage)的写操作交给专用写线程执行, 协程不再直接做磁盘I/O
+
+    写请求进入有界队列: 队列满时调用方在await中等待(背压), 事件循环不会被阻塞。
+    finish_conversation 入队即返回; create_conversation 和 add_run_records 等待写入完成, 写入失败时
+    抛出异常。入队即返回的写操作按conversation_id记录, flush(conversation_id) 只等待该运行的写操作
+    并抛出其中第一个失败, 并发的运行互不影响; flush() 等待此前入队的所有写操作。
+    读方法直接委托给底层存储。
+    """
+
+    _STOP = object()
+
+    def __init__(self, storage, max_pending: int = 1000):
+        self.storage = storage
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        # conversation_id -> 入队即返回、尚未由flush()报告的写操作; 只在事件循环中访问
+        self._unflushed: Dict[int, List[Future]] = {}
+        self._thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """写线程: 按入队顺序执行写操作"""
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            func, args, kwargs, future = item
+            try:
+                result = func(*args, **kwargs) if func else None
+            except Exception as e:
+                logger.error(f"Write-behind storage call {getattr(func, '__name__', func)} failed: {e}")
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    async def _submit(self, func, *args, **kwargs) -> Future:
+        """入队一个写操作, 队列满时在线程池中等待空位"""
+        future: Future = Future()
+        item = (func, args, kwargs, future)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.debug("Write-behind queue is full, waiting for the writer thread")
+            await asyncio.get_running_loop().run_in_executor(None, self._queue.put, item)
+        return future
+
+    async def create_conversation(self, run_uuid: str, question_id: int, question_text: str) -> int:
+        """创建新对话记录, 等待写入完成后返回ID"""
+        future = await self._submit(self.storage.create_conversation, run_uuid, question_id, question_text)
+        return await asyncio.wrap_future(future)
+
+    async def finish_conversation(self, conversation_id: int):
+        """标记对话完成(入队后返回, 失败由flush(conversation_id)报告)"""
+        future = await self._submit(self.storage.finish_conversation, conversation_id)
+        self._unflushed.setdefault(conversation_id, []).append(future)
+
+    async def add_run_records(self, conversation_id: int, **records: Optional[List]):
+        """写入一次运行的全部结果, 等待写入完成"""
+        future = await self._submit(self.storage.add_run_records, conversation_id, **records)
+        await asyncio.wrap_future(future)
+
+    async def archive_partitions(self, codec: str = 'gzip') -> List[str]:
+        """在写线程中归档已关闭的分区, 与写入串行执行"""
+        future = await self._submit(self.storage.archive_partitions, codec)
+        return await asyncio.wrap_future(future)
+
+    async def run(self, func, *args):
+        """在写线程中执行func(底层存储, *args)并等待结果, 用于维护命令与写入串行执行"""
+        future = await self._submit(func, self.storage, *args)
+        return await asyncio.wrap_future(future)
+
+    async def flush(self, conversation_id: Optional[int] = None):
+        """等待写操作完成, 其中有写操作失败时抛出第一个失败
+
+        指定conversation_id时只等待该运行入队即返回的写操作, 不等待其他运行排在前面的写入;
+        不指定时等待此前入队的全部写操作, 并报告所有运行的失败。
+        """
+        if conversation_id is None:
+            await asyncio.wrap_future(await self._submit(None))
+            futures = [future for pending in self._unflushed.values() for future in pending]
+            self._unflushed.clear()
+        else:
+            futures = self._unflushed.pop(conversation_id, [])
+        error = None
+        for future in futures:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    async def close(self):
+        """写完队列中剩余的数据并停止写线程"""
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._queue.put, self._STOP)
+        await loop.run_in_executor(None, self._thread.join)
+
+    def pending(self) -> int:
+        """队列中等待写入的操作数"""
+        return self._queue.qsize()
+
+    def get_conversations(self, limit: int = 100) -> List[Dict]:
+        return self.storage.get_conversations(limit)
+
+    def get_conversation_details(self, run_uuid: str) -> Optional[Dict]:
+        return self.storage.get_conversation_details(run_uuid)
+
+    def get_stats(self) -> Dict:
+        return self.storage.get_stats()
@@ -0,0 +1,60 @@
+from app.csv_files import AppendOnlyCSVWriter, format_record, iter_rows_reverse, parse_record
+
+
+def write_rows(path, rows):
+    with open(path, 'wb') as f:
+        for row in rows:
+            f.write(format_record(row))
+
+
+def test_format_and_parse_record_round_trip():
+    row = ['1', 'a,b', 'say "hi"', '第一行\n第二行', '']
+    assert parse_record(format_record(row)) == row
+
+
+def test_iter_rows_reverse_returns_rows_newest_first_without_header(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    rows = [['id', 'content'], ['1', 'plain'], ['2', 'multi\nline "quoted"\n'], ['3', '中文']]
+    write_rows(csv_file, rows)
+
+    found = list(iter_rows_reverse(csv_file))
+
+    assert [row for _, row in found] == rows[:0:-1]
+    data = csv_file.read_bytes()
+    for offset, row in found:
+        assert data[offset:].startswith(format_record(row))
+
+
+def test_iter_rows_reverse_handles_rows_across_blocks(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    rows = [['id', 'content']] + [[str(i), 'x' * 50 + '\n' + 'y' * i] for i in range(1, 40)]
+    write_rows(csv_file, rows)
+
+    assert [row for _, row in iter_rows_reverse(csv_file, block_size=16)] == rows[:0:-1]
+
+
+def test_iter_rows_reverse_header_only(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    write_rows(csv_file, [['id', 'content']])
+
+    assert list(iter_rows_reverse(csv_file)) == []
+
+
+class Totals(AppendOnlyCSVWriter):
+    HEADER = ['key', 'value']
+
+
+def test_append_only_writer_appends_after_header_and_rewrites(tmp_path):
+    totals = Totals(tmp_path / 'totals.csv')
+    assert not totals.exists()
+
+    with totals._lock:
+        totals._append([('a', 1), ('b', 2)])
+        totals._append([('a', 3)])
+    assert totals.path.read_bytes() == b'key,value\r\na,1\r\nb,2\r\na,3\r\n'
+
+    inode = totals.path.stat().st_ino
+    with totals._lock:
+        totals._write_all([('a', 4), ('b', 2)])
+    assert totals.path.read_bytes() == b'key,value\r\na,4\r\nb,2\r\n'
+    assert totals.path.stat().st_ino != inode
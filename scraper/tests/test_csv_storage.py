@@ -0,0 +1,187 @@
+import csv
+import json
+import uuid
+
+from app.csv_storage import CSVStorage, IdAllocator
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def create_runs(storage, count):
+    runs = []
+    for i in range(count):
+        run_uuid = str(uuid.uuid4())
+        conversation_id = storage.create_conversation(run_uuid, 1, f'question {i}')
+        storage.add_run_records(conversation_id, messages=[('user', f'question {i}'), ('assistant', 'answer ' * i)])
+        runs.append((run_uuid, conversation_id))
+    return runs
+
+
+def test_status_journal_is_applied_before_and_after_compaction(tmp_path):
+    storage = CSVStorage(str(tmp_path))
+    runs = create_runs(storage, 4)
+    finished_uuid, finished_id = runs[1]
+
+    storage.finish_conversation(finished_id)
+
+    # 完成时间先只写入状态日志, 读取时合并
+    conversations_file = next(tmp_path.glob('*/conversations.csv'))
+    assert all(row['finished_at'] == '' for row in read_csv(conversations_file))
+    finished_at = storage.get_conversation_details(finished_uuid)['finished_at']
+    assert finished_at
+
+    storage.compact_status_journal()
+
+    assert read_csv(storage.status_journal_file) == []
+    rows = {int(row['id']): row for row in read_csv(conversations_file)}
+    assert rows[finished_id]['finished_at'] == finished_at
+    assert all(rows[conversation_id]['finished_at'] == '' for _, conversation_id in runs if conversation_id != finished_id)
+
+    # 合并后行偏移改变, 按索引读取的详情和重新打开的存储仍然正确
+    for storage in (storage, CSVStorage(str(tmp_path))):
+        for run_uuid, conversation_id in runs:
+            details = storage.get_conversation_details(run_uuid)
+            assert details['run_uuid'] == run_uuid
+            assert bool(details['finished_at']) == (conversation_id == finished_id)
+
+
+def test_compaction_appends_row_index_entries(tmp_path):
+    storage = CSVStorage(str(tmp_path))
+    runs = create_runs(storage, 3)
+    index_file = tmp_path / '_meta' / 'row_index.csv'
+    before = index_file.read_bytes()
+
+    storage.finish_conversation(runs[0][1])
+    storage.compact_status_journal()
+
+    after = index_file.read_bytes()
+    assert after.startswith(before)
+    # 第一行变长, 只为偏移改变了的后两行追加索引项
+    appended = list(csv.reader(after[len(before):].decode('utf-8').splitlines()))
+    assert [int(row[1]) for row in appended] == [runs[1][1], runs[2][1]]
+
+
+def rewrite_without_index(conversations_file, conversation_id, field, value):
+    """像合并状态日志那样重写conversations.csv, 但不追加取代旧偏移的索引项"""
+    rows = read_csv(conversations_file)
+    tmp_file = conversations_file.with_name('conversations.csv.tmp')
+    with open(tmp_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        for row in rows:
+            if row['id'] == str(conversation_id):
+                row[field] = value
+            writer.writerow(row)
+    tmp_file.replace(conversations_file)
+
+
+def test_stale_conversation_offsets_fall_back_to_a_scan(tmp_path):
+    storage = CSVStorage(str(tmp_path))
+    runs = create_runs(storage, 3)
+    conversations_file = next(tmp_path.glob('*/conversations.csv'))
+
+    rewrite_without_index(conversations_file, runs[0][1], 'question_text', '东京最好吃的拉面店是哪几家？')
+
+    for run_uuid, conversation_id in runs:
+        details = storage.get_conversation_details(run_uuid)
+        assert (details['id'], details['run_uuid']) == (conversation_id, run_uuid)
+        offsets = storage._row_index.lookup_id(conversation_id)
+        assert [row['run_uuid'] for row in storage._rows_for_conversation('conversations', conversation_id, offsets)] \
+            == [run_uuid]
+
+
+def test_prompts_are_stored_as_blobs_regardless_of_length(tmp_path):
+    storage = CSVStorage(str(tmp_path))
+    run_uuids = []
+    for _ in range(2):
+        run_uuid = str(uuid.uuid4())
+        conversation_id = storage.create_conversation(run_uuid, 1, '东京拉面')
+        storage.add_run_records(conversation_id, messages=[('user', '东京拉面'), ('assistant', '一兰')])
+        run_uuids.append(run_uuid)
+    partition = storage._current_partition
+
+    conversations = read_csv(storage._table_file('conversations', partition))
+    messages = read_csv(storage._table_file('messages', partition))
+    assert {row['question_text'] for row in conversations} == {storage._blobs.put('东京拉面', always=True)} == {
+        row['content_md'] for row in messages if row['role'] == 'user'}
+    assert next(iter({row['question_text'] for row in conversations})).startswith(storage._blobs.PREFIX)
+    assert {row['content_md'] for row in messages if row['role'] == 'assistant'} == {'一兰'}
+    assert len(list((tmp_path / '_blobs').rglob('*.txt'))) == 1
+
+    details = storage.get_conversation_details(run_uuids[0])
+    assert details['question']['text'] == '东京拉面'
+    assert [message['content'] for message in details['messages']] == ['东京拉面', '一兰']
+    assert storage.get_conversations()[0]['question_text'] == '东京拉面'
+
+
+def test_finishing_again_after_restart_does_not_double_count(tmp_path):
+    storage = CSVStorage(str(tmp_path))
+    (_, first), (_, second) = create_runs(storage, 2)
+    storage.finish_conversation(first)
+    storage.finish_conversation(second)
+    storage.compact_status_journal()
+
+    restarted = CSVStorage(str(tmp_path))
+    restarted.finish_conversation(first)
+    restarted.finish_conversation(second)
+    restarted.finish_conversation(second)
+
+    assert restarted.get_stats()['successful_conversations'] == 2
+    timeseries = read_csv(tmp_path / '_meta' / 'run_timeseries.csv')
+    assert sum(int(row['finished']) for row in timeseries) == 2
+
+
+def test_id_allocator_reserves_ids_in_blocks(tmp_path):
+    state_file = tmp_path / 'ids.json'
+    allocator = IdAllocator(state_file)
+
+    assert [allocator.allocate('messages') for _ in range(3)] == [1, 2, 3]
+    assert allocator.allocate('messages', 5) == 4
+    # 第一次分配时预留一整块, 之后在块内分配不再写文件
+    assert json.loads(state_file.read_text()) == {'messages': 1 + IdAllocator.BLOCK_SIZE}
+
+
+def test_id_allocator_reclaims_unused_reservation_on_restart(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    csv_file.write_text('id,conversation_id\r\n1,1\r\n2,1\r\n3,1\r\n', encoding='utf-8')
+    allocator = IdAllocator(tmp_path / 'ids.json')
+    assert allocator.allocate('messages', 3) == 1
+
+    restarted = IdAllocator(tmp_path / 'ids.json')
+    restarted.recover('messages', csv_file)
+
+    assert restarted.allocate('messages') == 4
+
+
+def test_id_allocator_checkpoint_covers_ids_missing_from_tails(tmp_path):
+    # 写入了已归档文件的ID不在任何未归档文件的末尾, 只能由边车文件的下限保证不重复
+    allocator = IdAllocator(tmp_path / 'ids.json')
+    allocator.allocate('messages', 10)
+    allocator.checkpoint()
+
+    assert IdAllocator(tmp_path / 'ids.json').allocate('messages') == 11
+
+
+def test_id_allocator_recovers_from_csv_tail(tmp_path):
+    csv_file = tmp_path / 'messages.csv'
+    csv_file.write_text('id,conversation_id\r\n5,1\r\n7,1\r\n6,1\r\n', encoding='utf-8')
+    allocator = IdAllocator(tmp_path / 'ids.json')
+
+    allocator.recover('messages', csv_file)
+
+    assert allocator.allocate('messages') == 8
+
+
+def test_restart_continues_ids_without_gaps(tmp_path):
+    storage = CSVStorage(str(tmp_path))
+    (_, first), = create_runs(storage, 1)
+
+    restarted = CSVStorage(str(tmp_path))
+    (_, second), = create_runs(restarted, 1)
+
+    assert second == first + 1
+    messages = read_csv(restarted._table_file('messages', restarted._current_partition))
+    assert [int(row['id']) for row in messages] == [1, 2, 3, 4]
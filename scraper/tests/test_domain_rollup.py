@@ -0,0 +1,32 @@
+import csv
+
+from app.domain_rollup import DomainRollup, registrable_domain, rollup_entries
+
+
+def test_registrable_domain():
+    assert registrable_domain('https://www.tabelog.com/tokyo/') == 'tabelog.com'
+    assert registrable_domain('https://news.bbc.co.uk/food') == 'bbc.co.uk'
+    assert registrable_domain('tabelog.com/osaka') == 'tabelog.com'
+    assert registrable_domain('http://127.0.0.1:8000/') == '127.0.0.1'
+    assert registrable_domain('') == ''
+
+
+def test_rollup_entries_count_each_url_once_and_add_a_total():
+    urls = ['https://tabelog.com/a', 'https://tabelog.com/a', 'https://www.tabelog.com/b', 'https://retty.me/c', '']
+
+    entries = rollup_entries('2025-07-08', 3, urls)
+
+    assert sorted(entries) == [('2025-07-08', 3, '', 1, 3), ('2025-07-08', 3, 'retty.me', 1, 1),
+                               ('2025-07-08', 3, 'tabelog.com', 1, 2)]
+
+
+def test_rebuild_merges_runs_of_the_same_day(tmp_path):
+    rollup = DomainRollup(tmp_path / 'domain_rollup.csv')
+
+    rollup.rebuild([('2025-07-08', 3, ['https://tabelog.com/a']), ('2025-07-08', 3, ['https://tabelog.com/b'])])
+    rollup.append('2025-07-09', 3, [])
+
+    with open(rollup.path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [DomainRollup.HEADER, ['2025-07-08', '3', 'tabelog.com', '2', '2'], ['2025-07-08', '3', '', '2', '2'],
+                    ['2025-07-09', '3', '', '1', '0']]
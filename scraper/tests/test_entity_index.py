@@ -0,0 +1,60 @@
+import json
+
+from app.entity_index import entity_key, entity_rows, extract_entities, ranked_entities
+
+
+ANSWER = """以下是东京最值得一试的拉面店：
+
+1. **Nakiryu（鳴龍）** - 米其林一星担担面
+   - 地址：东京都丰岛区
+   - 人均：1200日元
+2. [Konjiki Hototogisu](https://example.com)：蛤蜊汤底
+3) Tsuta — 已搬迁
+4. **nakiryu（鳴龍）** 重复出现
+
+**总结：** 以上都需要排队。
+1. 不属于排名的列表
+"""
+
+
+def test_extract_entities_reads_first_ordered_list():
+    entities = extract_entities(ANSWER)
+
+    assert [(position, name) for position, name, _ in entities] == [
+        (1, 'Nakiryu（鳴龍）'),
+        (2, 'Konjiki Hototogisu'),
+        (3, 'Tsuta'),
+    ]
+
+
+def test_extract_entities_collects_sub_item_attributes():
+    _, _, attributes = extract_entities(ANSWER)[0]
+
+    assert attributes == {'地址': '东京都丰岛区', '人均': '1200日元'}
+
+
+def test_extract_entities_without_list():
+    assert extract_entities('没有列表的回答') == []
+    assert extract_entities('') == []
+
+
+def test_extract_entities_skips_out_of_order_numbers():
+    entities = extract_entities('1. Alpha\n3. Gamma\n2. Beta\n')
+
+    assert [name for _, name, _ in entities] == ['Alpha', 'Beta']
+
+
+def test_entity_key_merges_width_case_and_spaces():
+    assert entity_key('ＡＦＵＲＩ  Ramen') == entity_key('afuri ramen') == 'afuri ramen'
+
+
+def test_ranked_entities_uses_last_answer_with_a_list():
+    assert [name for _, name, _ in ranked_entities(['1. First', '1. Second', 'no list'])] == ['Second']
+
+
+def test_entity_rows_include_run_marker():
+    rows = entity_rows(5, 2, '2025-07-08', [(1, 'Tsuta', {'地址': '巢鸭'})])
+
+    assert rows[0] == (5, 2, '2025-07-08', 0, '', '', '')
+    assert rows[1][:6] == (5, 2, '2025-07-08', 1, 'tsuta', 'Tsuta')
+    assert json.loads(rows[1][6]) == {'地址': '巢鸭'}
@@ -0,0 +1,45 @@
+import asyncio
+import socket
+import sys
+import threading
+
+from app import maintenance
+from app.csv_storage import CSVStorage
+from app.write_behind import WriteBehindStorage
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_command_runs_locally_when_scraper_is_not_running(tmp_path, monkeypatch):
+    storage = CSVStorage(str(tmp_path))
+    conversation_id = storage.create_conversation('run-1', 1, 'question')
+    storage.finish_conversation(conversation_id)
+    monkeypatch.setattr(sys, 'argv', [
+        'maintenance', 'compact-journal', '--data-dir', str(tmp_path), '--url', f'http://127.0.0.1:{unused_port()}'
+    ])
+
+    maintenance.main()
+
+    assert storage.status_journal_file.read_text(encoding='utf-8').strip() == 'conversation_id,field,value,recorded_at'
+
+
+def test_maintenance_runs_on_the_writer_thread_in_order(tmp_path):
+    calls = []
+
+    class Storage:
+        def add_run_records(self, conversation_id, **records):
+            calls.append(('write', threading.current_thread().name))
+
+    async def main():
+        writer = WriteBehindStorage(Storage())
+        await writer.add_run_records(1, messages=[])
+        await writer.run(lambda storage: calls.append(('maintenance', threading.current_thread().name)))
+        await writer.close()
+
+    asyncio.run(main())
+
+    assert calls == [('write', 'csv-writer'), ('maintenance', 'csv-writer')]
@@ -0,0 +1,35 @@
+import csv
+
+from app.run_timeseries import RunTimeseries, duration_bin
+
+
+def read_entries(timeseries):
+    with open(timeseries.path, newline='') as f:
+        return list(csv.reader(f))[1:]
+
+
+def test_duration_bin_relative_error():
+    for seconds in (0.5, 42, 300, 3600):
+        assert 1.02 ** (duration_bin(seconds) - 1) < seconds <= 1.02 ** duration_bin(seconds)
+
+
+def test_append_started_and_finished_by_start_hour(tmp_path):
+    timeseries = RunTimeseries(tmp_path / 'run_timeseries.csv')
+
+    timeseries.append_started('2025-07-08T09:59:00+00:00')
+    timeseries.append_finished('2025-07-08T09:59:00+00:00', '2025-07-08T10:04:00+00:00')
+    timeseries.append_finished('2025-07-08T09:59:00+00:00', '')
+
+    assert read_entries(timeseries) == [['2025-07-08T09', '1', '0', ''], ['2025-07-08T09', '0', '1', str(duration_bin(300))],
+                                        ['2025-07-08T09', '0', '1', '']]
+
+
+def test_rebuild_merges_runs(tmp_path):
+    timeseries = RunTimeseries(tmp_path / 'run_timeseries.csv')
+
+    timeseries.rebuild([('2025-07-08T09:00:00+00:00', '2025-07-08T09:05:00+00:00'),
+                        ('2025-07-08T09:30:00+00:00', '2025-07-08T09:35:00+00:00'),
+                        ('2025-07-08T10:00:00+00:00', '')])
+
+    assert read_entries(timeseries) == [['2025-07-08T09', '2', '0', ''], ['2025-07-08T10', '1', '0', ''],
+                                        ['2025-07-08T09', '0', '2', str(duration_bin(300))]]
@@ -0,0 +1,32 @@
+from app.search_index import postings, tokenize
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert tokenize('东京拉面') == ['东京', '京拉', '拉面']
+
+
+def test_tokenize_keeps_single_cjk_character():
+    assert tokenize('面') == ['面']
+
+
+def test_tokenize_lowercases_latin_words_and_numbers():
+    assert tokenize('Best Ramen 2025!') == ['best', 'ramen', '2025']
+
+
+def test_tokenize_normalizes_full_width_characters():
+    assert tokenize('ＲＡＭＥＮ　１２３') == ['ramen', '123']
+
+
+def test_tokenize_mixed_text():
+    assert tokenize('Tokyo拉面店top10') == ['tokyo', '拉面', '面店', 'top10']
+
+
+def test_tokenize_empty():
+    assert tokenize('') == []
+    assert tokenize(None) == []
+
+
+def test_postings_count_term_frequency_per_conversation():
+    entries = postings(7, 'messages', ['ramen ramen', 'Ramen 拉面'])
+
+    assert sorted(entries) == [('ramen', 7, 'messages', 3), ('拉面', 7, 'messages', 1)]
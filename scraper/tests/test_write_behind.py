@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.write_behind import WriteBehindStorage
+
+
+class FakeStorage:
+    def __init__(self):
+        self.finished = []
+        self.release = threading.Event()
+
+    def finish_conversation(self, conversation_id):
+        if conversation_id == 1:
+            raise OSError('disk full')
+        self.finished.append(conversation_id)
+
+    def add_run_records(self, conversation_id, **records):
+        # 模拟一次很慢的写入
+        self.release.wait(5)
+
+
+def test_flush_reports_only_the_failures_of_its_own_run():
+    async def scenario():
+        storage = WriteBehindStorage(FakeStorage())
+        await storage.finish_conversation(1)
+        await storage.finish_conversation(2)
+
+        await storage.flush(2)
+        with pytest.raises(OSError):
+            await storage.flush(1)
+        # 失败只报告一次
+        await storage.flush(1)
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_flush_does_not_wait_for_writes_of_other_runs():
+    async def scenario():
+        backend = FakeStorage()
+        storage = WriteBehindStorage(backend)
+        await storage.finish_conversation(2)
+        slow = asyncio.ensure_future(storage.add_run_records(3))
+        await asyncio.sleep(0)
+
+        await asyncio.wait_for(storage.flush(2), 1)
+        assert backend.finished == [2]
+        assert not slow.done()
+
+        backend.release.set()
+        await slow
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_flush_without_run_waits_for_everything_and_reports_all_failures():
+    async def scenario():
+        storage = WriteBehindStorage(FakeStorage())
+        storage.storage.release.set()
+        await storage.finish_conversation(1)
+        await storage.add_run_records(3)
+
+        with pytest.raises(OSError):
+            await storage.flush()
+        await storage.flush(1)
+        await storage.close()
+
+    asyncio.run(scenario())